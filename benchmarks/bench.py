@@ -0,0 +1,218 @@
+"""
+Benchmark of the phases of the analysis
+
+Each contract is analyzed --repeat times, and the best time of each phase is kept:
+- convert: conversion of the bytecode (convert_bytecode)
+- basic_blocks: disassembly, split in basic blocks and static edges
+- functions: recovery of the functions from the dispatcher
+- vsa: value-set analysis of all the functions (the time of each function is reported as well)
+- export: export of the graphs in the dot format, to memory (the filesystem is too noisy)
+
+The results are compared to a JSON baseline, and the script fails if a phase is slower than the
+baseline by more than --threshold (relative) and --min-delta (absolute, in ms).
+
+Usage:
+    python benchmarks/bench.py                       # shipped contracts, compared to the baseline
+    python benchmarks/bench.py my_corpus/            # additional contracts (files or directories)
+    python benchmarks/bench.py --update-baseline     # record the baseline
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+from evm_cfg_builder.cfg.cfg import CFG, convert_bytecode
+from evm_cfg_builder.cfg.export import cfg_graphs, get_exporter
+from evm_cfg_builder.cfg.function import Function
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+SHIPPED_CONTRACTS = [
+    os.path.join(ROOT, "tests", "fomo3d.evm"),
+    os.path.join(ROOT, "tests", "recurse.evm"),
+    os.path.join(ROOT, "examples", "token-runtime.evm"),
+]
+PHASES = ["convert", "basic_blocks", "functions", "vsa", "export"]
+
+
+def _timed(func: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def _export_to_memory(cfg: CFG) -> None:
+    exporter = get_exporter("dot")
+    out = io.StringIO()
+    exporter.begin(out)
+    for graph in cfg_graphs(cfg):
+        exporter.write_graph(out, cfg, graph)
+    exporter.end(out)
+
+
+def bench_once(bytecode: str) -> Dict[str, Any]:
+    """
+    Run the phases once
+    Returns:
+        dict: phase -> time in ms, and "vsa_functions": selector -> time in ms
+    """
+    times: Dict[str, Any] = {}
+    times["convert"] = _timed(lambda: convert_bytecode(bytecode))
+
+    cfg = CFG(bytecode, analyze=False)
+    times["basic_blocks"] = _timed(cfg.compute_basic_blocks)
+    times["functions"] = _timed(cfg.create_functions)
+
+    # Same order as CFG.create_cfgs: the dispatcher is analyzed last
+    functions = sorted(cfg.functions, key=lambda f: f.key == Function.DISPATCHER_ID)
+    vsa_functions = {}
+    for function in functions:
+        # The names depend on the known signatures: use the selectors
+        name = function.name if function.hash_id < 0 else hex(function.hash_id)
+        vsa_functions[name] = _timed(partial(cfg.compute_function_cfg, function))
+    times["vsa"] = sum(vsa_functions.values())
+    times["vsa_functions"] = vsa_functions
+
+    times["export"] = _timed(partial(_export_to_memory, cfg))
+    return times
+
+
+def bench_contract(path: str, repeat: int) -> Dict[str, Any]:
+    """
+    Return the best time of each phase over repeat runs
+    """
+    with open(path, encoding="utf-8") as f:
+        bytecode = f.read().strip()
+    best: Dict[str, Any] = {}
+    for _ in range(repeat):
+        times = bench_once(bytecode)
+        for phase in PHASES:
+            best[phase] = min(best.get(phase, times[phase]), times[phase])
+        vsa_functions = best.setdefault("vsa_functions", {})
+        for name, elapsed in times["vsa_functions"].items():
+            vsa_functions[name] = min(vsa_functions.get(name, elapsed), elapsed)
+    best["total"] = sum(best[phase] for phase in PHASES)
+    return {key: _round(value) for key, value in best.items()}
+
+
+def _round(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: round(v, 3) for k, v in value.items()}
+    return round(value, 3)
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    threshold: float,
+    min_delta: float,
+) -> List[str]:
+    """
+    Return the regressions of the results compared to the baseline
+    """
+    regressions = []
+    for name, times in results.items():
+        if name not in baseline:
+            continue
+        for phase in PHASES + ["total"]:
+            base = baseline[name].get(phase)
+            if base is None:
+                continue
+            delta = times[phase] - base
+            if delta > min_delta and times[phase] > base * (1 + threshold):
+                regressions.append(
+                    f"{name} {phase}: {times[phase]:.1f} ms (baseline {base:.1f} ms, "
+                    f"+{delta / base * 100 if base else float('inf'):.0f}%)"
+                )
+    return regressions
+
+
+def _contracts(paths: List[str]) -> List[str]:
+    contracts = []
+    for path in paths:
+        if os.path.isdir(path):
+            contracts += sorted(
+                os.path.join(path, name)
+                for name in os.listdir(path)
+                if os.path.isfile(os.path.join(path, name))
+            )
+        else:
+            contracts.append(path)
+    return contracts
+
+
+def _load_baseline(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark of evm-cfg-builder")
+    parser.add_argument(
+        "contracts", nargs="*", help="Additional contracts (hex runtime bytecode), or directories"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per contract (default 5)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="Write the results in the baseline"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="Relative slowdown allowed (default 0.25)"
+    )
+    parser.add_argument(
+        "--min-delta", type=float, default=2.0, help="Absolute slowdown ignored, in ms (default 2)"
+    )
+    parser.add_argument("--output", default=None, help="Write the results in this JSON file")
+    args = parser.parse_args()
+
+    # The missing branches are logged as errors during the export
+    logging.getLogger("evm-cfg-builder").setLevel(logging.CRITICAL)
+
+    # Warm up (imports done on the first analysis)
+    bench_contract(SHIPPED_CONTRACTS[-1], 1)
+
+    results = {}
+    for path in SHIPPED_CONTRACTS + _contracts(args.contracts):
+        name = os.path.relpath(path, ROOT) if path.startswith(ROOT) else path
+        results[name] = bench_contract(path, args.repeat)
+        phases = " ".join(f"{phase}={results[name][phase]:.1f}" for phase in PHASES)
+        print(f"{name}: {phases} total={results[name]['total']:.1f} ms")
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    baseline = _load_baseline(args.baseline)
+    if baseline is None:
+        print(f"No baseline at {args.baseline}, run with --update-baseline")
+        return
+    regressions = compare(results, baseline["results"], args.threshold, args.min_delta)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if regressions:
+        sys.exit(1)
+    print("No regression")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Scaling of the value-set analysis on synthetic contracts
+
+One parameter of the generator (evm_cfg_builder.synthetic) varies, the others are fixed.
+For each value, the contract is generated and analyzed, and one CSV row is printed with:
+the size of the contract, the time of the analysis of the functions (best of --repeat runs),
+the peak of the memory allocated during the analysis (tracemalloc, in a separate run),
+and the number of functions whose CFG differs from the ground truth.
+
+Usage:
+    python benchmarks/scaling.py selectors 10 100 500
+    python benchmarks/scaling.py loop_nesting 0 1 2 3 --set call_depth=2 --set fan_in=4
+"""
+import argparse
+import csv
+import logging
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Tuple
+
+from evm_cfg_builder.cfg.cfg import CFG
+from evm_cfg_builder.synthetic import (
+    SyntheticContract,
+    SyntheticParameters,
+    compare_to_cfg,
+    generate,
+)
+
+COLUMNS = [
+    "bytes",
+    "basic_blocks",
+    "edges",
+    "vsa_ms",
+    "peak_kb",
+    "functions",
+    "functions_differing",
+]
+
+
+def _analyze(contract: SyntheticContract) -> Tuple[CFG, float]:
+    cfg = CFG(contract.bytecode, analyze=False)
+    cfg.create_functions()
+    start = time.perf_counter()
+    cfg.create_cfgs()
+    return cfg, (time.perf_counter() - start) * 1000
+
+
+def measure(parameters: SyntheticParameters, repeat: int) -> Dict[str, Any]:
+    """
+    Generate and analyze the contract
+    Returns:
+        dict: column -> value
+    """
+    contract = generate(parameters)
+    elapsed = min(_analyze(contract)[1] for _ in range(repeat))
+
+    tracemalloc.start()
+    try:
+        cfg, _ = _analyze(contract)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    differences = compare_to_cfg(contract, cfg)
+    return {
+        "bytes": len(contract.bytecode),
+        "basic_blocks": len(contract.basic_blocks),
+        "edges": len(contract.edges),
+        "vsa_ms": round(elapsed, 3),
+        "peak_kb": round(peak / 1024, 1),
+        "functions": len(contract.functions),
+        "functions_differing": len({difference.split(":")[0] for difference in differences}),
+    }
+
+
+def _parse_settings(settings: List[str]) -> Dict[str, int]:
+    fixed = {}
+    for setting in settings:
+        name, _, value = setting.partition("=")
+        fixed[name.replace("-", "_")] = int(value)
+    return fixed
+
+
+def main() -> None:
+    names = list(SyntheticParameters().to_json())
+    parser = argparse.ArgumentParser(description="Scaling of the analysis on synthetic contracts")
+    parser.add_argument("parameter", choices=names, help="Parameter varying")
+    parser.add_argument("values", nargs="+", type=int, help="Values of the parameter")
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="Value of another parameter (can be repeated)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per value (default 3)")
+    args = parser.parse_args()
+
+    # The missing branches are logged as errors
+    logging.getLogger("evm-cfg-builder").setLevel(logging.CRITICAL)
+
+    fixed = _parse_settings(args.set)
+    unknown = set(fixed) - set(names)
+    if unknown:
+        parser.error(f"Unknown parameters: {', '.join(sorted(unknown))}")
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow([args.parameter] + COLUMNS)
+    for value in args.values:
+        parameters = SyntheticParameters(**{**fixed, args.parameter: value})
+        row = measure(parameters, args.repeat)
+        writer.writerow([value] + [row[column] for column in COLUMNS])
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
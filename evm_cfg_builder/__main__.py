@@ -1,30 +1,39 @@
 import argparse
-import cProfile
+import contextlib
 import json
 import logging
 import os
-import pstats
 import sys
-from typing import Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
 from crytic_compile import cryticparser, CryticCompile, InvalidCompilation, is_supported
 from pkg_resources import require
 
+from evm_cfg_builder.batch import run_batch
+from evm_cfg_builder.cfg.budget import AnalysisBudget
+from evm_cfg_builder.cfg.cache import CFGCache
 from evm_cfg_builder.cfg.cfg import CFG
+from evm_cfg_builder.cfg.export import EXPORTERS, export_cfg
+from evm_cfg_builder.cfg.stats import stats_report
 from evm_cfg_builder.known_hashes.known_hashes import known_hashes
 
 logging.basicConfig()
 logger = logging.getLogger("evm-cfg-builder")
 
 
-def output_to_dot(d: str, filename: str, cfg: CFG) -> None:
+def output_to_dot(d: str, filename: str, cfg: CFG, args: argparse.Namespace) -> None:
     if not os.path.exists(d):
         os.makedirs(d)
     filename = os.path.basename(filename)
     filename = os.path.join(d, filename + "_")
-    cfg.output_to_dot(filename)
-    for function in cfg.functions:
-        function.output_to_dot(filename)
+    export_cfg(
+        cfg,
+        filename,
+        exporter=args.export_format,
+        single_file=args.export_single_file,
+        compress=args.export_gzip,
+        workers=args.workers,
+    )
 
 
 def parse_args() -> argparse.Namespace:
@@ -32,16 +41,44 @@ def parse_args() -> argparse.Namespace:
         description="evm-cfg-builder", usage="evm-cfg-builder contract.evm [flag]"
     )
 
-    parser.add_argument("filename", help="contract.evm")
+    parser.add_argument(
+        "filename",
+        help="contract.evm. With --batch: directory, JSONL file of {id, bytecode} or glob pattern",
+    )
 
     parser.add_argument(
         "--export-dot",
-        help="Export the functions to .dot files in the directory",
+        help="Export the functions to .dot files (see --export-format) in the directory",
         action="store",
         dest="dot_directory",
         default="crytic-export/evm",
     )
 
+    parser.add_argument(
+        "--export-format",
+        help="Format of the exported graphs (default dot)",
+        action="store",
+        dest="export_format",
+        choices=sorted(EXPORTERS),
+        default="dot",
+    )
+
+    parser.add_argument(
+        "--export-single-file",
+        help="Export all the graphs in a single file",
+        action="store_true",
+        dest="export_single_file",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--export-gzip",
+        help="Compress the exported graphs with gzip",
+        action="store_true",
+        dest="export_gzip",
+        default=False,
+    )
+
     parser.add_argument(
         "--disable-optimizations",
         help="Disable the CFG recovery optimizations",
@@ -58,6 +95,86 @@ def parse_args() -> argparse.Namespace:
         default=False,
     )
 
+    parser.add_argument(
+        "--workers",
+        help="Number of processes used to recover the CFGs of the functions"
+        " (with --batch: number of contracts analyzed in parallel) (default 1)",
+        action="store",
+        dest="workers",
+        type=int,
+        default=1,
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        help="Cache the analysis results in the directory",
+        action="store",
+        dest="cache_dir",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--batch",
+        help="Analyze many contracts, and write one JSON line per contract (no dot export)",
+        action="store_true",
+        dest="batch",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--batch-output",
+        help="File of the JSON lines written with --batch (default stdout)",
+        action="store",
+        dest="batch_output",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--timeout",
+        help="Timeout in seconds for the analysis of one contract, with --batch",
+        action="store",
+        dest="timeout",
+        type=float,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--function-timeout",
+        help="Time budget in seconds for the analysis of one function. Once exhausted,"
+        " the function is reported as incomplete, with the edges found so far",
+        action="store",
+        dest="function_timeout",
+        type=float,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--function-memory",
+        help="Memory budget in MB for the analysis of one function",
+        action="store",
+        dest="function_memory",
+        type=float,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--contract-timeout",
+        help="Time budget in seconds for the analysis of the functions of one contract",
+        action="store",
+        dest="contract_timeout",
+        type=float,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--contract-memory",
+        help="Memory budget in MB for the analysis of the functions of one contract",
+        action="store",
+        dest="contract_memory",
+        type=float,
+        default=None,
+    )
+
     parser.add_argument(
         "--export-abi",
         help="Export the contract's ABI",
@@ -74,10 +191,12 @@ def parse_args() -> argparse.Namespace:
     )
 
     parser.add_argument(
-        "--perf",
-        help=argparse.SUPPRESS,
-        action="store_true",
-        default=False,
+        "--stats",
+        help="Write the time of each phase and the counters of the analysis of each function"
+        " in a JSON file (not with --batch)",
+        action="store",
+        dest="stats_file",
+        default=None,
     )
 
     cryticparser.init(parser)
@@ -86,24 +205,50 @@ def parse_args() -> argparse.Namespace:
         parser.print_help(sys.stderr)
         sys.exit(1)
     args = parser.parse_args()
+    try:
+        args.budget = _budget(args)
+    except ValueError as e:
+        parser.error(str(e))
     return args
 
 
-def _run(bytecode: Optional[Union[str, bytes]], filename: str, args: argparse.Namespace) -> None:
+def _optimization_enabled(args: argparse.Namespace) -> bool:
+    return not args.disable_optimizations
+
+
+def _budget(args: argparse.Namespace) -> Optional[AnalysisBudget]:
+    limits = (
+        args.function_timeout,
+        args.function_memory,
+        args.contract_timeout,
+        args.contract_memory,
+    )
+    if all(limit is None for limit in limits):
+        return None
+    return AnalysisBudget(*limits)
+
 
-    optimization_enabled = False
-    if args.disable_optimizations:
-        optimization_enabled = True
+def _run(
+    bytecode: Optional[Union[str, bytes]], filename: str, args: argparse.Namespace
+) -> Dict[str, Any]:
+    """
+    Analyze the bytecode, and return the stats report of the analysis
+    """
 
     cfg = CFG(
-        bytecode, optimization_enabled=optimization_enabled, compute_cfgs=not args.disable_cfg
+        bytecode,
+        optimization_enabled=_optimization_enabled(args),
+        compute_cfgs=not args.disable_cfg,
+        workers=args.workers,
+        cache=CFGCache(args.cache_dir) if args.cache_dir else None,
+        budget=args.budget,
     )
 
     for function in cfg.functions:
         logger.info(function)
 
     if args.dot_directory:
-        output_to_dot(args.dot_directory, filename, cfg)
+        output_to_dot(args.dot_directory, filename, cfg, args)
 
     if args.export_abi:
         export = []
@@ -113,13 +258,34 @@ def _run(bytecode: Optional[Union[str, bytes]], filename: str, args: argparse.Na
                     "hash_id": hex(function.hash_id),
                     "start_addr": hex(function.start_addr),
                     "signature": function.name if function.name != hex(function.hash_id) else None,
-                    "attributes": function.attributes,
+                    "attributes": function.attributes if function.cfg_computed else [],
                 }
             )
 
         with open(args.export_abi, "w", encoding="utf-8") as f:
             json.dump(export, f)
 
+    return {"contract": filename, **stats_report(cfg)}
+
+
+def _run_batch(args: argparse.Namespace) -> None:
+    with contextlib.ExitStack() as stack:
+        output = sys.stdout
+        if args.batch_output:
+            output = stack.enter_context(open(args.batch_output, "w", encoding="utf-8"))
+        counts = run_batch(
+            args.filename,
+            output,
+            workers=args.workers,
+            timeout=args.timeout,
+            optimization_enabled=_optimization_enabled(args),
+            compute_cfgs=not args.disable_cfg,
+            cache_dir=args.cache_dir,
+            budget=args.budget,
+        )
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    logger.info(f"Batch done: {summary or 'no input'}")
+
 
 # pylint: disable=too-many-locals,too-many-nested-blocks
 def main() -> None:
@@ -128,12 +294,12 @@ def main() -> None:
     l.setLevel(logging.INFO)
     args = parse_args()
 
-    cp: Optional[cProfile.Profile] = None
-    if args.perf:
-        cp = cProfile.Profile()
-        cp.enable()
+    reports: List[Dict[str, Any]] = []
+
+    if args.batch:
+        _run_batch(args)
 
-    if is_supported(args.filename):
+    elif is_supported(args.filename):
         filename = args.filename
         del args.filename
         try:
@@ -145,10 +311,14 @@ def main() -> None:
                         for signature, hash_id in compilation_unit.hashes(contract).items():
                             known_hashes[hash_id] = signature
                         logger.info(f"Analyze {contract}")
-                        _run(bytecode_init, f"{key}-{filename}-{contract}-init", args)
+                        reports.append(
+                            _run(bytecode_init, f"{key}-{filename}-{contract}-init", args)
+                        )
                         runtime_bytecode = compilation_unit.bytecode_runtime(contract)
                         if runtime_bytecode:
-                            _run(runtime_bytecode, f"{key}-{filename}-{contract}-runtime", args)
+                            reports.append(
+                                _run(runtime_bytecode, f"{key}-{filename}-{contract}-runtime", args)
+                            )
                         else:
                             logger.info("Runtime bytecode not available")
         except InvalidCompilation as e:
@@ -158,12 +328,11 @@ def main() -> None:
         with open(args.filename, "rb") as f:
             bytecode = f.read()
         logger.info(f"Analyze {args.filename}")
-        _run(bytecode, args.filename, args)
+        reports.append(_run(bytecode, args.filename, args))
 
-    if args.perf and cp:
-        cp.disable()
-        stats = pstats.Stats(cp).sort_stats("cumtime")
-        stats.print_stats()
+    if args.stats_file and not args.batch:
+        with open(args.stats_file, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,249 @@
+"""
+Batch analysis of many contracts
+
+The inputs are read from a directory (every file is a contract), a glob pattern,
+or a JSONL file of {"id": .., "bytecode": ..} records. The contracts are analyzed in a
+pool of processes, and one JSON result per contract is written as soon as it is available
+(in completion order). A failure, a timeout or the death of the process analyzing a contract
+is reported in the result of the contract, and does not stop the batch.
+"""
+import glob
+import json
+import os
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from evm_cfg_builder.cfg.budget import AnalysisBudget
+from evm_cfg_builder.cfg.cache import CFGCache
+from evm_cfg_builder.cfg.cfg import CFG
+
+# (id, path of the file, JSONL record)
+# Only one of the path and the record is set
+BatchInput = Tuple[str, Optional[str], Optional[str]]
+
+
+class BatchTimeout(BaseException):
+    """Raised by the SIGALRM handler, at any point of the analysis
+
+    It derives from BaseException so that the handlers of the analysis (and their cleanup
+    on `except Exception`) do not catch it.
+    """
+
+
+def iter_inputs(source: str) -> Iterator[BatchInput]:
+    """
+    Iterate over the contracts of the source
+    The bytecodes are not read here, but by the process analyzing the contract
+    Args:
+        source (str): directory, JSONL file (.jsonl extension) or glob pattern
+    Returns:
+        iterator of BatchInput
+    """
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if os.path.isfile(path):
+                yield path, path, None
+    elif source.endswith(".jsonl") and os.path.isfile(source):
+        with open(source, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    yield f"{source}:{line_number}", None, line
+    else:
+        for path in sorted(glob.glob(source)):
+            if os.path.isfile(path):
+                yield path, path, None
+
+
+# Options of the analysis, set in each process by _init_worker
+_options: Dict[str, Any] = {}
+
+
+def _init_worker(
+    optimization_enabled: bool,
+    compute_cfgs: bool,
+    timeout: Optional[float],
+    cache_dir: Optional[str],
+    budget: Optional[AnalysisBudget],
+) -> None:
+    _options["optimization_enabled"] = optimization_enabled
+    _options["compute_cfgs"] = compute_cfgs
+    _options["timeout"] = timeout
+    _options["cache"] = CFGCache(cache_dir) if cache_dir else None
+    _options["budget"] = budget
+
+
+def _raise_timeout(_signum: int, _frame: Any) -> None:
+    raise BatchTimeout()
+
+
+def _cfg_to_json(cfg: CFG) -> Dict[str, Any]:
+    return {
+        "basic_blocks": len(cfg.basic_blocks),
+        "functions": [
+            {
+                "hash_id": hex(function.hash_id),
+                "start_addr": hex(function.start_addr),
+                "signature": function.name if function.name != hex(function.hash_id) else None,
+                # The CFGs not computed (compute_cfgs=False) are not computed for the output
+                "attributes": function.attributes if function.cfg_computed else [],
+                "basic_blocks": len(function.basic_blocks) if function.cfg_computed else 0,
+                "incomplete": function.incomplete_reason,
+            }
+            for function in cfg.functions
+        ],
+    }
+
+
+def analyze_input(batch_input: BatchInput) -> Dict[str, Any]:
+    """
+    Analyze one contract
+    Args:
+        batch_input (BatchInput)
+    Returns:
+        dict: JSON result. "status" is "ok", "error" or "timeout"
+    """
+    input_id, path, record = batch_input
+    result: Dict[str, Any] = {"id": input_id}
+    timeout: Optional[float] = _options.get("timeout")
+    # The timeout relies on SIGALRM, not available on Windows
+    use_alarm = timeout is not None and hasattr(signal, "setitimer")
+    previous_handler: Any = None
+    start = time.time()
+    # The alarm can fire at any point until it is disarmed, including in the handlers
+    # of the inner try: the outer try catches it
+    try:
+        try:
+            if use_alarm:
+                assert timeout is not None
+                previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+            bytecode: Any
+            if path is not None:
+                with open(path, "rb") as f:
+                    bytecode = f.read()
+            else:
+                assert record is not None
+                data = json.loads(record)
+                result["id"] = data.get("id", input_id)
+                bytecode = data["bytecode"]
+            cfg = CFG(
+                bytecode,
+                optimization_enabled=_options.get("optimization_enabled", True),
+                compute_cfgs=_options.get("compute_cfgs", True),
+                cache=_options.get("cache"),
+                budget=_options.get("budget"),
+            )
+            result["status"] = "ok"
+            result.update(_cfg_to_json(cfg))
+        except Exception as e:  # pylint: disable=broad-except,broad-exception-caught
+            result["status"] = "error"
+            result["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except BatchTimeout:
+        result = {"id": result["id"], "status": "timeout"}
+    finally:
+        if use_alarm:
+            # The timer fired, or was disarmed: restore the handler of the caller
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(
+                signal.SIGALRM, signal.SIG_DFL if previous_handler is None else previous_handler
+            )
+    result["time"] = round(time.time() - start, 3)
+    return result
+
+
+def _analyze_in_worker(initargs: Tuple[Any, ...], batch_input: BatchInput) -> Dict[str, Any]:
+    _init_worker(*initargs)
+    return analyze_input(batch_input)
+
+
+def _run_pool(
+    inputs: Iterator[BatchInput],
+    workers: int,
+    initargs: Tuple[Any, ...],
+    write: Callable[[Dict[str, Any]], None],
+) -> List[BatchInput]:
+    """
+    Analyze the inputs in a pool of processes, until the inputs are exhausted or a worker dies
+    Returns:
+        list(BatchInput): the inputs lost when a worker died (one of them killed it)
+    """
+    lost: List[BatchInput] = []
+    running: Dict["Future[Dict[str, Any]]", BatchInput] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # Bound the inputs submitted, so that few are lost if a worker dies
+            while not lost and len(running) < 2 * workers:
+                batch_input = next(inputs, None)
+                if batch_input is None:
+                    break
+                running[pool.submit(_analyze_in_worker, initargs, batch_input)] = batch_input
+            if not running:
+                return lost
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch_input = running.pop(future)
+                try:
+                    write(future.result())
+                except BrokenProcessPool:
+                    lost.append(batch_input)
+
+
+# pylint: disable=too-many-arguments
+def run_batch(
+    source: str,
+    output: TextIO,
+    *,
+    workers: int = 1,
+    timeout: Optional[float] = None,
+    optimization_enabled: bool = True,
+    compute_cfgs: bool = True,
+    cache_dir: Optional[str] = None,
+    budget: Optional[AnalysisBudget] = None,
+) -> Dict[str, int]:
+    """
+    Analyze all the contracts of the source, and write one JSON line per contract
+    If a worker process dies (out of memory, crash of the interpreter), the inputs it was
+    running are analyzed again, one per process: the input killing its process again is
+    reported as "crashed", and the batch goes on with a new pool
+    Args:
+        source (str): directory, JSONL file or glob pattern
+        output (TextIO): flushed after each result
+        workers (int): number of processes
+        timeout (float): timeout per contract, in seconds
+        optimization_enabled (bool)
+        compute_cfgs (bool)
+        cache_dir (str): directory of the CFGCache, if any
+        budget (AnalysisBudget): budgets of the analysis of each contract. Unlike the timeout,
+            an exhausted budget keeps the results found so far
+    Returns:
+        dict: number of results per status
+    """
+    initargs = (optimization_enabled, compute_cfgs, timeout, cache_dir, budget)
+    counts: Dict[str, int] = {}
+
+    def _write(result: Dict[str, Any]) -> None:
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+
+    inputs = iter_inputs(source)
+    if workers <= 1:
+        _init_worker(*initargs)
+        for batch_input in inputs:
+            _write(analyze_input(batch_input))
+        return counts
+
+    while True:
+        lost = _run_pool(inputs, workers, initargs, _write)
+        if not lost:
+            return counts
+        for batch_input in lost:
+            if _run_pool(iter([batch_input]), 1, initargs, _write):
+                _write({"id": batch_input[0], "status": "crashed"})
@@ -1,82 +1,153 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, TYPE_CHECKING
 
 from pyevmasm import Instruction
 
+if TYPE_CHECKING:
+    from evm_cfg_builder.cfg.cfg import CFG
+    from evm_cfg_builder.cfg.edges import EdgeTable
+    from evm_cfg_builder.cfg.instruction_store import InstructionStore
 
+
+# pylint: disable=too-many-instance-attributes
 class BasicBlock:
-    def __init__(self) -> None:
-        self._instructions: List[Instruction] = []
-        # incoming_basic_blocks and outgoing_basic_blocks are dict
-        # The key is the function hash
+    def __init__(
+        self,
+        store: "InstructionStore",
+        start_idx: int,
+        end_idx: int,
+        cfg: "CFG",
+    ) -> None:
+        """Initialize a basic block
+
+        The basic block is a view on the instructions between start_idx and end_idx
+        (both included) of the instruction store
+
+        :param store: Instructions of the bytecode
+        :param start_idx: Index of the first instruction
+        :param end_idx: Index of the last instruction
+        :param cfg: CFG owning the basic block. The edges are stored in its edge table,
+            and the CFG of a function is computed when its edges are first queried
+        """
+        self._store = store
+        self._cfg = cfg
+        self._start_idx = start_idx
+        self._end_idx = end_idx
+        # First and last Instruction, created when first requested
+        self._start: Optional[Instruction] = None
+        self._end: Optional[Instruction] = None
+        # The incoming and outgoing basic blocks are stored per function hash
         # It allows to compute the VSA only
         # On a specific function, to separate
         # the merging
-        self._incoming_basic_blocks: Dict[int, List["BasicBlock"]] = {}
-        self._outgoing_basic_blocks: Dict[int, List["BasicBlock"]] = {}
+        self._edges: "EdgeTable" = cfg.edges
+        self._edges.add_basic_block(self)
 
         # List of function keys that reaches the BB
         self.reacheable: List[int] = []
 
-    def add_instruction(self, instruction: Instruction) -> None:
-        self._instructions.append(instruction)
-
     def __repr__(self) -> str:
-        return f"<cfg BasicBlock@{hex(self.start.pc)}-{hex(self.end.pc)}>"
+        return f"<cfg BasicBlock@{hex(self.start_pc)}-{hex(self.end_pc)}>"
+
+    @property
+    def start_idx(self) -> int:
+        """Index of the first instruction in the instruction store."""
+        return self._start_idx
+
+    @property
+    def end_idx(self) -> int:
+        """Index of the last instruction in the instruction store."""
+        return self._end_idx
 
     @property
     def start(self) -> Instruction:
-        """First instruction of the basic block."""
-        return self._instructions[0]
+        """First instruction of the basic block.
+
+        The Instruction is created on the first access. Use start_pc if only the address is needed.
+        """
+        if self._start is None:
+            self._start = self._store.instruction_at(self._start_idx)
+        return self._start
 
     @property
     def end(self) -> Instruction:
-        """Last instruction of the basic block."""
-        return self._instructions[-1]
+        """Last instruction of the basic block.
+
+        The Instruction is created on the first access. Use end_pc or end_name if only the
+        address or the name is needed.
+        """
+        if self._end is None:
+            self._end = self._store.instruction_at(self._end_idx)
+        return self._end
+
+    @property
+    def start_pc(self) -> int:
+        """Address of the first instruction of the basic block."""
+        return self._store.pc_at(self._start_idx)
+
+    @property
+    def end_pc(self) -> int:
+        """Address of the last instruction of the basic block."""
+        return self._store.pc_at(self._end_idx)
+
+    @property
+    def end_name(self) -> str:
+        """Name of the last instruction of the basic block."""
+        return self._store.name_at(self._end_idx)
 
     @property
     def instructions(self) -> List[Instruction]:
-        return list(self._instructions)
+        """Instructions of the basic block. The Instructions are created on each call."""
+        return self._store.instructions(self._start_idx, self._end_idx + 1)
+
+    @property
+    def instruction_names(self) -> List[str]:
+        """Names of the instructions of the basic block, read from the instruction store."""
+        store = self._store
+        return [store.name_at(idx) for idx in range(self._start_idx, self._end_idx + 1)]
+
+    def _ensure_function_cfg(self, key: int) -> None:
+        function = self._cfg.get_function_by_key(key)
+        if function is not None and not function.cfg_computed:
+            self._cfg.ensure_function_cfg(function)
 
     def incoming_basic_blocks(self, key: int) -> List["BasicBlock"]:
-        return self._incoming_basic_blocks.get(key, [])
+        self._ensure_function_cfg(key)
+        return self._edges.incoming(key, self)
 
     def outgoing_basic_blocks(self, key: int) -> List["BasicBlock"]:
-        return self._outgoing_basic_blocks.get(key, [])
+        self._ensure_function_cfg(key)
+        return self._edges.outgoing(key, self)
 
     @property
     def incoming_basic_blocks_as_dict(self) -> Dict[int, List["BasicBlock"]]:
-        return self._incoming_basic_blocks
+        """
+        Copy of the incoming basic blocks, per function hash
+        """
+        return self._edges.incoming_as_dict(self)
 
     @property
     def outgoing_basic_blocks_as_dict(self) -> Dict[int, List["BasicBlock"]]:
-        return self._outgoing_basic_blocks
+        """
+        Copy of the outgoing basic blocks, per function hash
+        """
+        return self._edges.outgoing_as_dict(self)
 
     @property
     def all_incoming_basic_blocks(self) -> List["BasicBlock"]:
-        bbs_ = self._incoming_basic_blocks.values()
-        bbs = [bb for sublist in bbs_ for bb in sublist]
-        return list(set(bbs))
+        return self._edges.all_incoming(self)
 
     @property
     def all_outgoing_basic_blocks(self) -> List["BasicBlock"]:
-        bbs_ = self._outgoing_basic_blocks.values()
-        bbs = [bb for sublist in bbs_ for bb in sublist]
-        return list(set(bbs))
+        return self._edges.all_outgoing(self)
 
     def add_incoming_basic_block(self, father: "BasicBlock", key: int) -> None:
-        if not key in self._incoming_basic_blocks:
-            self._incoming_basic_blocks[key] = []
-        if father not in self._incoming_basic_blocks[key]:
-            self._incoming_basic_blocks[key].append(father)
+        self._edges.add_incoming(key, self, father)
 
     def add_outgoing_basic_block(self, son: "BasicBlock", key: int) -> None:
-        if not key in self._outgoing_basic_blocks:
-            self._outgoing_basic_blocks[key] = []
-        if son not in self._outgoing_basic_blocks[key]:
-            self._outgoing_basic_blocks[key].append(son)
+        self._edges.add_outgoing(key, self, son)
 
     def ends_with_jumpi(self) -> bool:
-        return self.end.name == "JUMPI"
+        return self.end_name == "JUMPI"
 
     def ends_with_jump_or_jumpi(self) -> bool:
-        return self.end.name in ("JUMP", "JUMPI")
+        return self.end_name in ("JUMP", "JUMPI")
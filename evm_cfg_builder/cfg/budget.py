@@ -0,0 +1,130 @@
+"""
+Time and memory budgets of the value-set analysis
+
+A budget limits the wall-clock time (in seconds) and the memory (in MB) used by the analysis of
+each function, and by the analysis of the whole contract. The memory used is the growth of the
+resident memory of the process since the start of the analysis.
+The value-set analysis checks its budget regularly: once it is exhausted, the analysis stops,
+the edges found so far are kept, and the function is marked as incomplete.
+The entry of a function is explored before the first check, so an incomplete function has at
+least one basic block.
+"""
+import os
+import sys
+import time
+from typing import Optional
+
+MB = 1024 * 1024
+
+
+def memory_usage() -> Optional[int]:
+    """
+    Return the resident memory of the process in bytes, None if unknown
+    Without /proc, the peak resident memory is returned
+    """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        # pylint: disable=import-outside-toplevel
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, in KB on the other platforms
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class AnalysisBudget:
+    """Budgets of the analysis of a contract. None: no limit
+
+    - function_time: seconds spent in the analysis of one function
+    - function_memory: MB allocated by the analysis of one function
+    - contract_time: seconds spent in the analysis of the contract
+    - contract_memory: MB allocated by the analysis of the contract
+    """
+
+    __slots__ = ("function_time", "function_memory", "contract_time", "contract_memory")
+
+    def __init__(
+        self,
+        function_time: Optional[float] = None,
+        function_memory: Optional[float] = None,
+        contract_time: Optional[float] = None,
+        contract_memory: Optional[float] = None,
+    ) -> None:
+        for name, value in (
+            ("function_time", function_time),
+            ("function_memory", function_memory),
+            ("contract_time", contract_time),
+            ("contract_memory", contract_memory),
+        ):
+            if value is not None and value < 0:
+                raise ValueError(f"{name} must not be negative")
+        self.function_time = function_time
+        self.function_memory = function_memory
+        self.contract_time = contract_time
+        self.contract_memory = contract_memory
+
+    def __repr__(self) -> str:
+        limits = ", ".join(f"{name}={getattr(self, name)}" for name in self.__slots__)
+        return f"<AnalysisBudget {limits}>"
+
+    def track_contract(self) -> "BudgetTracker":
+        return BudgetTracker("contract", self.contract_time, self.contract_memory)
+
+    def track_function(self, contract: Optional["BudgetTracker"]) -> "BudgetTracker":
+        """
+        Return the tracker of the analysis of a function, checking the contract tracker as well
+        """
+        return BudgetTracker("function", self.function_time, self.function_memory, contract)
+
+    def remaining(self, contract: Optional["BudgetTracker"]) -> "AnalysisBudget":
+        """
+        Return the budget left to another process: the time of the contract is reduced
+        by the time already spent
+        """
+        contract_time = self.contract_time
+        if contract is not None and contract_time is not None:
+            contract_time = max(contract_time - contract.elapsed, 0.0)
+        return AnalysisBudget(
+            self.function_time, self.function_memory, contract_time, self.contract_memory
+        )
+
+
+class BudgetTracker:
+    """Time and memory used since the creation of the tracker, compared to the limits"""
+
+    def __init__(
+        self,
+        scope: str,
+        time_limit: Optional[float],
+        memory_limit: Optional[float],
+        parent: Optional["BudgetTracker"] = None,
+    ) -> None:
+        self._scope = scope
+        self._start = time.perf_counter()
+        self._deadline = self._start + time_limit if time_limit is not None else None
+        self._memory_limit = int(memory_limit * MB) if memory_limit is not None else None
+        self._memory_start = memory_usage() if memory_limit is not None else None
+        self._parent = parent
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def exhausted(self) -> Optional[str]:
+        """
+        Return the budget exhausted ("function time", "contract memory", ..), None if there is none
+        """
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            return f"{self._scope} time"
+        if self._memory_limit is not None and self._memory_start is not None:
+            usage = memory_usage()
+            if usage is not None and usage - self._memory_start > self._memory_limit:
+                return f"{self._scope} memory"
+        if self._parent is not None:
+            return self._parent.exhausted()
+        return None
@@ -0,0 +1,269 @@
+"""
+On-disk cache of the analysis results
+
+An entry is keyed by the hash of the bytecode (after the metadata removal) and of the
+analysis options. It contains the functions, their attributes, and the CFG of each function
+(basic blocks, edges and reachable basic blocks). The basic blocks are rebuilt from the
+bytecode, so a cache hit does not run the function discovery nor the value-set analysis.
+
+The results of an analysis stopped by its budget are not stored.
+Entries are json files. When the directory exceeds its size limit, the least recently
+used entries are removed.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+from evm_cfg_builder.cfg.function import Function
+from evm_cfg_builder.cfg.parallel import FunctionCFG, export_function_cfg, import_function_cfg
+
+if TYPE_CHECKING:
+    from evm_cfg_builder.cfg.cfg import CFG
+
+logger = logging.getLogger("evm-cfg-builder")
+
+# To increase if the format of the entries, or the results of the analysis, change
+CACHE_VERSION = 5
+
+# 256 MB
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+def dump_cfg(cfg: "CFG", compute_cfgs: bool) -> Dict[str, Any]:
+    """
+    Return the analysis results of the cfg as a json-serializable dict
+    Args:
+        cfg (CFG)
+        compute_cfgs (bool): True if the CFGs of the functions were computed
+    Returns:
+        dict
+    """
+    functions = []
+    for function in cfg.functions:
+        function_cfg: Optional[List[Any]] = None
+        if compute_cfgs:
+            exported = export_function_cfg(cfg, function)
+            function_cfg = [exported.basic_blocks, exported.edges, exported.reachable]
+        functions.append(
+            {
+                "hash_id": function.hash_id,
+                "start_addr": function.start_addr,
+                # Reading the attributes of a function not analyzed yet would analyze it
+                "attributes": function.attributes if function.cfg_computed else [],
+                "cfg": function_cfg,
+            }
+        )
+    return {"version": CACHE_VERSION, "functions": functions}
+
+
+def _is_addr_list(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(addr, int) for addr in value)
+
+
+def check_entry(cfg: "CFG", data: Any) -> None:
+    """
+    Check the structure of the analysis results returned by dump_cfg, and that their
+    addresses are the start of basic blocks of the cfg
+    The basic blocks of the cfg are computed if needed, nothing else is modified
+    Args:
+        cfg (CFG)
+        data (any): decoded json entry
+    Raises:
+        ValueError: if the entry cannot be restored
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("functions"), list):
+        raise ValueError("no functions")
+    cfg.compute_basic_blocks()
+
+    def check_addrs(addrs: Any) -> None:
+        if not _is_addr_list(addrs):
+            raise ValueError(f"invalid addresses {addrs!r}")
+        for addr in addrs:
+            bb = cfg.get_basic_block_at(addr)
+            if bb is None or bb.start_pc != addr:
+                raise ValueError(f"no basic block starts at {addr}")
+
+    for function_data in data["functions"]:
+        if not isinstance(function_data, dict):
+            raise ValueError(f"invalid function {function_data!r}")
+        if not isinstance(function_data.get("hash_id"), int):
+            raise ValueError(f"invalid hash_id in {function_data!r}")
+        check_addrs([function_data.get("start_addr")])
+        attributes = function_data.get("attributes")
+        if not isinstance(attributes, list) or not all(isinstance(a, str) for a in attributes):
+            raise ValueError(f"invalid attributes {attributes!r}")
+        function_cfg = function_data.get("cfg", False)
+        if function_cfg is None:
+            continue
+        if not isinstance(function_cfg, list) or len(function_cfg) != 3:
+            raise ValueError(f"invalid cfg {function_cfg!r}")
+        basic_blocks, edges, reachable = function_cfg
+        check_addrs(basic_blocks)
+        check_addrs(reachable)
+        if not isinstance(edges, list):
+            raise ValueError(f"invalid edges {edges!r}")
+        for edge in edges:
+            if not isinstance(edge, list) or len(edge) != 3:
+                raise ValueError(f"invalid edges {edge!r}")
+            check_addrs([edge[0]])
+            check_addrs(edge[1])
+            check_addrs(edge[2])
+
+
+def restore_cfg(cfg: "CFG", data: Dict[str, Any]) -> None:
+    """
+    Restore the analysis results returned by dump_cfg, checked with check_entry
+    The cfg must not be analyzed yet
+    Args:
+        cfg (CFG)
+        data (dict)
+    """
+    cfg.compute_basic_blocks()
+    functions = []
+    for function_data in data["functions"]:
+        start_addr = function_data["start_addr"]
+        entry = cfg.get_basic_block_at(start_addr)
+        assert entry is not None and entry.start_pc == start_addr
+        function = Function(function_data["hash_id"], start_addr, entry, cfg)
+        cfg.add_function(function)
+        functions.append((function, function_data))
+    cfg.name_functions()
+
+    for function, function_data in functions:
+        if function_data["cfg"] is not None:
+            basic_blocks, edges, reachable = function_data["cfg"]
+            import_function_cfg(
+                cfg, function, FunctionCFG(function.key, basic_blocks, edges, reachable)
+            )
+        for attribute in function_data["attributes"]:
+            function.add_attributes(attribute)
+
+
+class CFGCache:
+    """Content-addressed cache of the analysis results, stored in a directory"""
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        """
+        :param directory: Directory of the entries, created if needed
+        :type directory: str
+        :param max_size: Maximum size of the entries (in bytes)
+        :type max_size: int
+        """
+        self._directory = directory
+        self._max_size = max_size
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    @staticmethod
+    def key(bytecode: bytes, optimization_enabled: bool, compute_cfgs: bool) -> str:
+        """
+        Return the key of the entry for a bytecode and the analysis options
+        """
+        h = hashlib.sha256()
+        h.update(f"{CACHE_VERSION}:{int(optimization_enabled)}:{int(compute_cfgs)}:".encode())
+        h.update(bytecode)
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}.json")
+
+    def load(self, cfg: "CFG", compute_cfgs: bool) -> bool:
+        """
+        Restore the analysis results of the cfg, if they are in the cache
+        Args:
+            cfg (CFG): cfg not analyzed yet
+            compute_cfgs (bool)
+        Returns:
+            bool: True if the results were found
+        """
+        path = self._path(self.key(cfg.bytecode or b"", cfg.optimization_enabled, compute_cfgs))
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning(f"Invalid cache entry {path}: {e}")
+            return False
+        if isinstance(data, dict) and data.get("version") != CACHE_VERSION:
+            return False
+        try:
+            check_entry(cfg, data)
+        except ValueError as e:
+            logger.warning(f"Invalid cache entry {path}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return False
+
+        restore_cfg(cfg, data)
+        # Update the access time, used for the eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return True
+
+    def store(self, cfg: "CFG", compute_cfgs: bool) -> None:
+        """
+        Save the analysis results of the cfg, and evict the oldest entries if needed
+        Args:
+            cfg (CFG): analyzed cfg
+            compute_cfgs (bool)
+        """
+        if any(function.incomplete for function in cfg.functions):
+            # Stopped by the budget: a larger budget would give other results
+            return
+        os.makedirs(self._directory, exist_ok=True)
+        path = self._path(self.key(cfg.bytecode or b"", cfg.optimization_enabled, compute_cfgs))
+        data = dump_cfg(cfg, compute_cfgs)
+        # Write in a temporary file first, so that concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        finally:
+            # Also on an exception that is not an OSError (e.g. the timeout of a batch)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache fits its size limit
+        """
+        entries = []
+        total_size = 0
+        with os.scandir(self._directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total_size += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self._max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def clear(self) -> None:
+        """
+        Remove all the entries
+        """
+        if not os.path.isdir(self._directory):
+            return
+        for name in os.listdir(self._directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self._directory, name))
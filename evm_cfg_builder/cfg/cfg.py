@@ -1,27 +1,27 @@
 import logging
 import re
-from typing import Optional, Union, Tuple, List, Dict
+import time
+from bisect import bisect_right
+from typing import Optional, Union, List, Dict, TYPE_CHECKING
 
-from pyevmasm import disassemble_all, Instruction
+from pyevmasm import Instruction
 
 from evm_cfg_builder.cfg.basic_block import BasicBlock
+from evm_cfg_builder.cfg.budget import AnalysisBudget, BudgetTracker
+from evm_cfg_builder.cfg.disassembler import BASIC_BLOCK_END
+from evm_cfg_builder.cfg.edges import EdgeTable
 from evm_cfg_builder.cfg.function import Function
+from evm_cfg_builder.cfg.instruction_store import InstructionStore
+from evm_cfg_builder.cfg.stats import CFGStats, StatsCallback
 from evm_cfg_builder.known_hashes.known_hashes import known_hashes
 
+if TYPE_CHECKING:
+    from evm_cfg_builder.cfg.cache import CFGCache
+    from evm_cfg_builder.value_analysis.block_effects import BlockEffects
+    from evm_cfg_builder.value_analysis.subroutines import Subroutines
 
 logger = logging.getLogger("evm-cfg-builder")
 
-BASIC_BLOCK_END = [
-    "STOP",
-    "SELFDESTRUCT",
-    "RETURN",
-    "REVERT",
-    "INVALID",
-    "SUICIDE",
-    "JUMP",
-    "JUMPI",
-]
-
 
 def convert_bytecode(bytecode: Optional[Union[str, bytes]]) -> Optional[bytes]:
     """
@@ -55,6 +55,7 @@ def convert_bytecode(bytecode: Optional[Union[str, bytes]]) -> Optional[bytes]:
     return bytecode
 
 
+# pylint: disable=too-many-instance-attributes,too-many-public-methods
 class CFG:
     """Implements the control flow graph (CFG) of an EVM bytecode."""
 
@@ -66,6 +67,11 @@ class CFG:
         analyze: bool = True,
         optimization_enabled: bool = True,
         compute_cfgs: bool = True,
+        *,
+        workers: int = 1,
+        cache: Optional["CFGCache"] = None,
+        stats_callback: Optional[StatsCallback] = None,
+        budget: Optional[AnalysisBudget] = None,
     ) -> None:
         """Initialize an EVM CFG.
 
@@ -75,27 +81,57 @@ class CFG:
         :type remove_metadata: bool
         :param analyze: Automatically analyze the bytecode
         :type analyze: bool
+        :param compute_cfgs: Compute the CFGs of all the functions. Otherwise the CFG of a function
+            is computed the first time its basic blocks, its attributes or its edges are queried
+        :type compute_cfgs: bool
+        :param workers: Number of processes used to compute the CFGs of the functions
+        :type workers: int
+        :param cache: Cache of the analysis results. On a hit, the analysis is not run
+        :type cache: None, CFGCache
+        :param stats_callback: Called at the end of each phase of the analysis (see CFGStats)
+        :type stats_callback: None, StatsCallback
+        :param budget: Time and memory budgets of the analysis. The analysis of a function stops
+            when a budget is exhausted, and the function is marked as incomplete
+        :type budget: None, AnalysisBudget
         """
         self._functions: Dict[int, Function] = {}
-        # __basic_blocks is a dict that matches
-        # an address to the basic block
-        # The address can be the first or the last
-        # instructions
-        self._basic_blocks: Dict[int, BasicBlock] = {}
-        self._instructions: Dict[int, Instruction] = {}
+        # Functions indexed by their key (hash_id)
+        self._functions_by_key: Dict[int, Function] = {}
+        # _basic_blocks is the list of basic blocks, sorted by start address
+        # _basic_blocks_starts contains the start address of each basic block, in the same order
+        # A basic block covers all the addresses from its start to the start of the next one
+        self._basic_blocks: List[BasicBlock] = []
+        self._basic_blocks_starts: List[int] = []
+        # Reverse index: functions that reach a basic block
+        self._functions_reaching: Dict[BasicBlock, List[Function]] = {}
+        # Edges of all the basic blocks, per function key
+        self._edges = EdgeTable()
+        self._instructions: InstructionStore = InstructionStore()
 
         self._optimization_enabled = optimization_enabled
+        self._stats = CFGStats(stats_callback)
+        self._budget = budget
+        # Started with the analysis of the first function
+        self._contract_budget: Optional[BudgetTracker] = None
+        # Effects of the basic blocks, and summaries of the internal subroutines,
+        # computed with the first function analyzed
+        self._block_effects: Optional["BlockEffects"] = None
+        self._subroutines: Optional["Subroutines"] = None
 
         assert isinstance(bytecode, (type(None), str, bytes))
 
-        self._bytecode = convert_bytecode(bytecode)
+        with self._stats.phase("convert"):
+            self._bytecode = convert_bytecode(bytecode)
 
-        if remove_metadata:
-            self.remove_metadata()
+            if remove_metadata:
+                self.remove_metadata()
         if analyze:
-            self.create_functions()
-            if compute_cfgs:
-                self.create_cfgs()
+            if cache is None or not cache.load(self, compute_cfgs):
+                self.create_functions()
+                if compute_cfgs:
+                    self.create_cfgs(workers)
+                if cache is not None:
+                    cache.store(self, compute_cfgs)
 
     def __repr__(self) -> str:
         return f"<CFG: {len(self.functions)} Functions, {len(self.basic_blocks)} Basic Blocks>"
@@ -113,13 +149,16 @@ class CFG:
         self.clear()
         self._bytecode = bytecode
 
+    @property
+    def optimization_enabled(self) -> bool:
+        return self._optimization_enabled
+
     @property
     def basic_blocks(self) -> List[BasicBlock]:
         """
-        Return the list of basic_block
+        Return the list of basic_block, sorted by start address
         """
-        bbs = self._basic_blocks.values()
-        return list(set(bbs))
+        return self._basic_blocks
 
     @property
     def entry_point(self) -> BasicBlock:
@@ -140,27 +179,117 @@ class CFG:
         """
         Return the list of instructions
         """
-        return list(self._instructions.values())
+        return self._instructions.instructions()
+
+    @property
+    def edges(self) -> EdgeTable:
+        """
+        Return the table of the edges between the basic blocks
+        """
+        return self._edges
+
+    @property
+    def block_effects(self) -> "BlockEffects":
+        """
+        Return the effects of the basic blocks on the stack, shared by the analysis of the functions
+        """
+        if self._block_effects is None:
+            # pylint: disable=import-outside-toplevel
+            from evm_cfg_builder.value_analysis.block_effects import BlockEffects
+
+            self._block_effects = BlockEffects(self)
+        return self._block_effects
+
+    @property
+    def subroutines(self) -> "Subroutines":
+        """
+        Return the summaries of the internal subroutines, shared by the analysis of the functions
+        """
+        if self._subroutines is None:
+            # pylint: disable=import-outside-toplevel
+            from evm_cfg_builder.value_analysis.subroutines import Subroutines
+
+            self._subroutines = Subroutines(self)
+        return self._subroutines
+
+    @property
+    def budget(self) -> Optional[AnalysisBudget]:
+        return self._budget
+
+    def remaining_budget(self) -> Optional[AnalysisBudget]:
+        """
+        Return the budget left for the analysis of the functions in other processes
+        """
+        if self._budget is None:
+            return None
+        return self._budget.remaining(self._track_contract_budget())
+
+    def _track_contract_budget(self) -> Optional[BudgetTracker]:
+        """
+        The budget of the contract starts with the analysis of the first function
+        """
+        if self._budget is not None and self._contract_budget is None:
+            self._contract_budget = self._budget.track_contract()
+        return self._contract_budget
+
+    @property
+    def stats(self) -> CFGStats:
+        """
+        Return the time of each phase of the analysis
+        """
+        return self._stats
+
+    @property
+    def instruction_store(self) -> InstructionStore:
+        """
+        Return the compact representation of the instructions
+        """
+        return self._instructions
 
-    def get_instruction_at(self, addr: int) -> Instruction:
+    def get_instruction_at(self, addr: int) -> Optional[Instruction]:
         """Return the instruction at the provided address.
 
         :param addr: Address of instruction
         :type addr: int
         """
-        return self._instructions.get(addr)
+        return self._instructions.get_instruction(addr)
 
     def get_basic_block_at(self, addr: int) -> Optional[BasicBlock]:
         """Return the basic block at the provided address.
 
-        The address is either the starting or ending instruction of the
-        basic block.
+        The address can be any address covered by the basic block
+        (the lookup is a binary search over the start addresses).
 
-        :param addr: Address of basic block start or end
+        :param addr: Address inside the basic block
         :type addr: int
         :return: BasicBlock, None -- the requested basic block
         """
-        return self._basic_blocks.get(addr)
+        idx = bisect_right(self._basic_blocks_starts, addr) - 1
+        if idx < 0 or addr >= self._instructions.code_end:
+            return None
+        return self._basic_blocks[idx]
+
+    def get_function_by_key(self, key: int) -> Optional[Function]:
+        """Return the function with the provided key (hash_id).
+
+        :param key: Key of the function
+        :type key: int
+        :return: Function, None -- the requested function
+        """
+        return self._functions_by_key.get(key)
+
+    def get_functions_reaching(self, basic_block: BasicBlock) -> List[Function]:
+        """Return the functions that reach the basic block.
+
+        The CFGs of the functions not computed yet (compute_cfgs=False) are computed first.
+
+        :param basic_block: The basic block
+        :type basic_block: BasicBlock
+        :return: list(Function) -- the functions reaching the basic block
+        """
+        for function in self.functions:
+            self.ensure_function_cfg(function)
+        return self._functions_reaching.get(basic_block, [])
 
     def get_function_at(self, addr: int) -> Optional[Function]:
         """Return the function at the provided address.
@@ -176,41 +305,127 @@ class CFG:
         Create the functions. The CFGs are not computed
         :return:
         """
-        self.compute_basic_blocks()
-        self.compute_functions(self._basic_blocks[0], True)
-        self.add_function(Function(Function.DISPATCHER_ID, 0, self._basic_blocks[0], self))
+        with self._stats.phase("basic_blocks"):
+            self.compute_basic_blocks()
+        with self._stats.phase("functions"):
+            self.compute_functions(self.entry_point, True)
+            self.add_function(Function(Function.DISPATCHER_ID, 0, self.entry_point, self))
 
+            self.name_functions()
+
+    def name_functions(self) -> None:
+        """
+        Name the functions with a known signature
+        :return:
+        """
         for function in self.functions:
             if function.hash_id in known_hashes:
                 function.name = known_hashes[function.hash_id]
 
-    def create_cfgs(self) -> None:
+    def create_cfgs(self, workers: int = 1) -> None:
         """
         Compute the CFGs
+
+        If workers > 1, the functions are analyzed in a pool of processes, and
+        the results are merged in the basic blocks. The dispatcher is always
+        analyzed last, in the current process, as its analysis depends on the
+        basic blocks reached by the other functions.
+        :param workers: Number of processes
+        :return:
+        """
+        functions = self.functions
+        if workers > 1:
+            # pylint: disable=import-outside-toplevel
+            from evm_cfg_builder.cfg.parallel import analyze_functions, import_function_cfg
+
+            others = [f for f in functions if f.key != Function.DISPATCHER_ID]
+            for function, function_cfg in analyze_functions(self, others, workers):
+                import_function_cfg(self, function, function_cfg)
+                self._compute_attributes(function)
+                if function.stats is not None:
+                    self._stats.record("vsa", function.stats.time, function)
+            functions = [f for f in functions if f.key == Function.DISPATCHER_ID]
+
+        for function in functions:
+            self.compute_function_cfg(function)
+
+    def ensure_function_cfg(self, function: Function) -> None:
+        """
+        Compute the CFG of a function, if it was not computed yet
+        The analysis of the dispatcher relies on the basic blocks reached by the other functions,
+        so their CFGs are computed first
+        :param function:
+        :return:
+        """
+        if function.cfg_computed:
+            return
+        if function.key == Function.DISPATCHER_ID:
+            for other in self.functions:
+                if other is not function:
+                    self.ensure_function_cfg(other)
+        self.compute_function_cfg(function)
+
+    def compute_function_cfg(self, function: Function) -> None:
+        """
+        Compute the CFG of a function, and its attributes
+        :param function:
         :return:
         """
         # pylint: disable=import-outside-toplevel
         from evm_cfg_builder.value_analysis.value_set_analysis import StackValueAnalysis
 
-        for function in self.functions:
+        budget: Optional[BudgetTracker] = None
+        if self._budget is not None:
+            budget = self._budget.track_function(self._track_contract_budget())
 
+        # The analysis queries the edges of the function: mark the CFG as computed first
+        function.cfg_computed = True
+        start = time.perf_counter()
+        try:
             vsa = StackValueAnalysis(
-                self, function.entry, function.hash_id, self._optimization_enabled
+                self,
+                function.entry,
+                function.hash_id,
+                enable_optimization=self._optimization_enabled,
+                budget=budget,
             )
             bbs = vsa.analyze()
 
-            function.basic_blocks = [self._basic_blocks[bb] for bb in bbs]
+            function.basic_blocks = [self._basic_block_starting_at(bb) for bb in bbs]
+        except Exception:
+            function.cfg_computed = False
+            raise
+        vsa.stats.time = time.perf_counter() - start
+        function.stats = vsa.stats
+        function.incomplete_reason = vsa.incomplete
+        if vsa.incomplete:
+            logger.warning(
+                f"Analysis of {function.name} stopped ({vsa.incomplete}): incomplete CFG"
+            )
+
+        self._compute_attributes(function)
+        self._stats.record("vsa", vsa.stats.time, function)
 
-            if function.hash_id != Function.DISPATCHER_ID:
-                function.check_payable()
-                function.check_view()
-                function.check_pure()
+    @staticmethod
+    def _compute_attributes(function: Function) -> None:
+        if function.hash_id != Function.DISPATCHER_ID:
+            function.check_payable()
+            function.check_view()
+            function.check_pure()
 
     def clear(self) -> None:
         self._functions = {}
-        self._basic_blocks = {}
-        self._instructions = {}
+        self._functions_by_key = {}
+        self._basic_blocks = []
+        self._basic_blocks_starts = []
+        self._functions_reaching = {}
+        self._edges = EdgeTable()
+        self._instructions = InstructionStore()
         self._bytecode = bytes()
+        self._stats.clear()
+        self._contract_budget = None
+        self._block_effects = None
+        self._subroutines = None
 
     def remove_metadata(self) -> None:
         """
@@ -238,161 +453,112 @@ class CFG:
         if self._basic_blocks:
             return
 
-        bb = BasicBlock()
-
-        for instruction in disassemble_all(self.bytecode):
-            self._instructions[instruction.pc] = instruction
-
-            if instruction.name == "JUMPDEST":
-                # JUMPDEST indicates a new BasicBlock. Set the end pc
-                # of the current block, and switch to a new one.
-                if bb.instructions:
-                    self._basic_blocks[bb.end.pc] = bb
+        store = InstructionStore(self.bytecode)
+        self._instructions = store
 
-                bb = BasicBlock()
+        for start_idx, end_idx in store.basic_blocks_bounds:
+            bb = BasicBlock(store, start_idx, end_idx, self)
+            self._basic_blocks.append(bb)
+            self._basic_blocks_starts.append(bb.start_pc)
 
-                self._basic_blocks[instruction.pc] = bb
+        self.compute_static_edges()
 
-            bb.add_instruction(instruction)
-
-            if bb.start.pc == instruction.pc:
-                self._basic_blocks[instruction.pc] = bb
-
-            if bb.end.name in BASIC_BLOCK_END:
-                self._basic_blocks[bb.end.pc] = bb
-                bb = BasicBlock()
+    def _basic_block_starting_at(self, addr: int) -> BasicBlock:
+        """
+        Return the basic block starting at addr. Raise a KeyError if no basic block starts at addr
+        """
+        bb = self.get_basic_block_at(addr)
+        if bb is None or bb.start_pc != addr:
+            raise KeyError(addr)
+        return bb
 
     def compute_functions(self, block: "BasicBlock", is_entry_block: bool = False) -> None:
         """
-        Create function from basic block
+        Create the functions called from the dispatcher starting at the basic block
         The heuristic skips the first basic block(s) as they are generated by solc.
         The heuristic checks for:
         - If the basic block contains CALLVALUE: Solidity 0.5.2 added a general 'payable'
         to contract (https://github.com/ethereum/solidity/releases/tag/v0.5.2). In that case nothing is executed
         (including no fallback function)
-        - If the basic block contains CALLDATASIZE (checked by is_jump_to_function), the fallback function is executed
+        - If the basic block contains CALLDATASIZE, the fallback function is executed
         (this was added at some point in Solidity 0.4.x, it might not be present in old versions
+        See evm_cfg_builder.cfg.dispatcher for the shapes of dispatcher recognized
         """
-        if is_entry_block:
-            if block.ends_with_jumpi():
-                ins = [i.name for i in block.instructions]
-                if "CALLVALUE" in ins:
-                    # last_push
-                    assert len(block.instructions) > 2
-                    push = block.instructions[-2]
-                    assert push.name.startswith("PUSH")
-                    destination = push.operand
-                    true_branch = self._basic_blocks[destination]
-                    self.compute_functions(true_branch)
-                    return
-
-        function_start, function_hash = is_jump_to_function(block)
-        if function_start:
-            # The disptacher can be a tree and not a list of comparison
-            # As a result, if GT is in the basic block, we are branching to
-            # a branch of the dispatcher tree rather than directy calling the funciton
-            if "GT" in [i.name for i in block.instructions]:
-                next_branch = self._basic_blocks[function_start]
-                self.compute_functions(next_branch)
-
-            else:
-                assert function_hash
-                new_function = Function(
-                    function_hash, function_start, self._basic_blocks[function_start], self
-                )
-
-                self._functions[function_start] = new_function
-
-            if block.ends_with_jumpi():
-                false_branch = self._basic_blocks[block.end.pc + 1]
-                self.compute_functions(false_branch)
+        # pylint: disable=import-outside-toplevel
+        from evm_cfg_builder.cfg.dispatcher import find_functions
+
+        for function_hash, function_start in find_functions(self, block, is_entry_block):
+            new_function = Function(
+                function_hash,
+                function_start,
+                self._basic_block_starting_at(function_start),
+                self,
+            )
+            self.add_function(new_function)
 
     def add_function(self, func: Function) -> None:
         assert isinstance(func, Function)
         self._functions[func.start_addr] = func
+        self._functions_by_key[func.key] = func
 
-    def compute_simple_edges(self, key: int) -> None:
-        for bb in self._basic_blocks.values():
+    def compute_static_edges(self) -> None:
+        """
+        Compute the edges that do not depend on the function, shared by all the functions
+        """
+        # Basic blocks are contiguous: the fallthrough of a basic block
+        # is the next one in self._basic_blocks
+        for bb, next_bb in zip(self._basic_blocks, self._basic_blocks[1:]):
+            end_name = bb.end_name
 
-            if bb.end.name == "JUMPI":
-                dst = self._basic_blocks[bb.end.pc + 1]
-                bb.add_outgoing_basic_block(dst, key)
-                dst.add_incoming_basic_block(bb, key)
+            if end_name == "JUMPI":
+                self._edges.add_static_edge(bb, next_bb)
 
             # A bb can be split in the middle if it has a JUMPDEST
             # Because another edge can target the JUMPDEST
-            if bb.end.name not in BASIC_BLOCK_END:
-                try:
-                    dst = self._basic_blocks[bb.end.pc + 1 + bb.end.operand_size]
-                except KeyError:
-                    continue
-                assert dst.start.name == "JUMPDEST"
-                bb.add_outgoing_basic_block(dst, key)
-                dst.add_incoming_basic_block(bb, key)
+            if end_name not in BASIC_BLOCK_END:
+                assert self._instructions.is_jumpdest(next_bb.start_pc)
+                self._edges.add_static_edge(bb, next_bb)
+
+    def compute_simple_edges(self, key: int) -> None:
+        """
+        Make the static edges visible for the function, until its reachable basic blocks are known
+        :param key: Key of the function
+        :return:
+        """
+        self._edges.open_scope(key)
 
     def compute_reachability(self, entry_point: "BasicBlock", key: int) -> None:
         bbs_saw = [entry_point]
+        bbs_saw_set = {entry_point}
 
         bbs_to_explore = [entry_point]
         while bbs_to_explore:
             bb = bbs_to_explore.pop()
             for son in bb.outgoing_basic_blocks(key):
-                if not son in bbs_saw:
+                if not son in bbs_saw_set:
                     bbs_saw.append(son)
+                    bbs_saw_set.add(son)
                     bbs_to_explore.append(son)
 
-        for bb in bbs_saw:
-            bb.reacheable.append(key)
+        self.add_reachable_basic_blocks(key, bbs_saw)
 
-        # clean son/fathers that are created by compute_simple_edges
-        # but are not reacheable
-        for bb in self._basic_blocks.values():
-            if not bb in bbs_saw:
-                if key in bb.incoming_basic_blocks_as_dict.keys():
-                    bb.incoming_basic_blocks_as_dict.pop(key)
-                if key in bb.outgoing_basic_blocks_as_dict.keys():
-                    bb.outgoing_basic_blocks_as_dict.pop(key)
+    def add_reachable_basic_blocks(self, key: int, bbs: List[BasicBlock]) -> None:
+        """
+        Mark the basic blocks as reachable by the function
+        The edges of the function are restricted to these basic blocks
+        :param key: Key of the function
+        :param bbs: Basic blocks reachable
+        :return:
+        """
+        self._edges.set_reachable(key, bbs)
+        function = self._functions_by_key.get(key)
+        for bb in bbs:
+            bb.reacheable.append(key)
+            if function is not None:
+                self._functions_reaching.setdefault(bb, []).append(function)
 
     def output_to_dot(self, base_filename: str) -> None:
+        # pylint: disable=import-outside-toplevel
+        from evm_cfg_builder.cfg.export import DotExporter, export_graphs, full_graph
 
-        with open(f"{base_filename}-FULL_GRAPH.dot", "w", encoding="utf-8") as f:
-            f.write("digraph{\n")
-            for basic_block in self.basic_blocks:
-                instructions_ = [f"{hex(ins.pc)}:{str(ins)}" for ins in basic_block.instructions]
-                instructions = "\n".join(instructions_)
-
-                f.write(f'{basic_block.start.pc}[label="{instructions}"]\n')
-
-                for son in basic_block.all_outgoing_basic_blocks:
-                    f.write(f"{basic_block.start.pc} -> {son.start.pc}\n")
-
-            f.write("\n}")
-
-
-def is_jump_to_function(block: BasicBlock) -> Tuple[Optional[int], Optional[int]]:
-    """
-        Heuristic:
-        Recent solc version add a first check if calldatasize <4 and jump in fallback
-    Args:
-        block (BasicBlock)
-    Returns:
-        (int): function hash, or None
-    """
-    has_calldata_size = False
-    last_pushed_value: Optional[int] = None
-    previous_last_pushed_value: Optional[int] = None
-    for i in block.instructions:
-        if i.name == "CALLDATASIZE":
-            has_calldata_size = True
-
-        if i.name.startswith("PUSH"):
-            previous_last_pushed_value = last_pushed_value
-            last_pushed_value = i.operand
-
-    if block.ends_with_jumpi() and has_calldata_size:
-        return last_pushed_value, -1
-
-    if block.ends_with_jumpi() and previous_last_pushed_value:
-        return last_pushed_value, previous_last_pushed_value
-
-    return None, None
+        export_graphs(self, f"{base_filename}-FULL_GRAPH.dot", [full_graph(self)], DotExporter())
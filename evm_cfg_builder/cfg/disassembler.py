@@ -0,0 +1,131 @@
+"""
+Single-pass EVM disassembler
+
+The bytecode is decoded with a 256-entry opcode table. One linear pass
+produces the instructions, the JUMPDEST bitmap, the PUSH operands and the basic block boundaries.
+The decoding follows pyevmasm.disassemble_all:
+- Unknown opcodes are decoded as INVALID
+- An instruction with a truncated operand (at the end of the bytecode) is dropped
+"""
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from pyevmasm import DEFAULT_FORK, Instruction, instruction_tables
+
+BASIC_BLOCK_END = [
+    "STOP",
+    "SELFDESTRUCT",
+    "RETURN",
+    "REVERT",
+    "INVALID",
+    "SUICIDE",
+    "JUMP",
+    "JUMPI",
+]
+
+JUMPDEST = 0x5B
+
+
+def _build_templates() -> List[Instruction]:
+    """
+    Build one pyevmasm Instruction per opcode value
+    Unknown opcodes are represented as INVALID, as done by pyevmasm.disassemble_one
+    """
+    instruction_table = instruction_tables[DEFAULT_FORK]
+    templates = []
+    for opcode in range(256):
+        instruction = instruction_table.get(opcode, None)
+        if instruction is None:
+            instruction = Instruction(
+                opcode, "INVALID", 0, 0, 0, 0, "Unspecified invalid instruction."
+            )
+        templates.append(instruction)
+    return templates
+
+
+INSTRUCTION_TEMPLATES: List[Instruction] = _build_templates()
+OPCODE_NAMES: List[str] = [ins.name for ins in INSTRUCTION_TEMPLATES]
+OPERAND_SIZES: bytes = bytes(ins.operand_size for ins in INSTRUCTION_TEMPLATES)
+# 1 if the opcode terminates a basic block
+ENDS_BASIC_BLOCK: bytes = bytes(int(name in BASIC_BLOCK_END) for name in OPCODE_NAMES)
+
+
+# pylint: disable=too-few-public-methods,too-many-instance-attributes
+class Disassembly:
+    """Result of the disassembly of a bytecode
+
+    Instructions are identified by their index (order in the bytecode).
+    - pcs, opcodes and next_pcs are flat arrays indexed by the instruction index
+    - operands maps the index of a PUSH to its operand
+    - jumpdests is a bitmap indexed by pc, set to 1 if a JUMPDEST starts at pc
+    - basic_blocks contains the (first, last) instruction indexes of each basic block
+    """
+
+    __slots__ = ("bytecode", "pcs", "opcodes", "next_pcs", "operands", "jumpdests", "basic_blocks")
+
+    def __init__(self, bytecode: bytes) -> None:
+        self.bytecode: bytes = bytecode
+        self.pcs: array = array("I")
+        self.opcodes: bytearray = bytearray()
+        self.next_pcs: array = array("I")
+        self.operands: Dict[int, int] = {}
+        self.jumpdests: bytearray = bytearray(len(bytecode))
+        self.basic_blocks: List[Tuple[int, int]] = []
+
+
+# pylint: disable=too-many-locals
+def disassemble(bytecode: Optional[bytes]) -> Disassembly:
+    """
+    Decode the bytecode in one linear pass
+    Args:
+        bytecode (bytes)
+    Returns:
+        Disassembly
+    """
+    disassembly = Disassembly(bytes(bytecode) if bytecode else b"")
+
+    code = memoryview(disassembly.bytecode)
+    size = len(code)
+    operand_sizes = OPERAND_SIZES
+    ends_basic_block = ENDS_BASIC_BLOCK
+    add_pc = disassembly.pcs.append
+    add_opcode = disassembly.opcodes.append
+    add_next_pc = disassembly.next_pcs.append
+    add_basic_block = disassembly.basic_blocks.append
+    operands = disassembly.operands
+    jumpdests = disassembly.jumpdests
+
+    pc = 0
+    idx = 0
+    # Index of the first instruction of the current basic block
+    start_idx = 0
+    while pc < size:
+        opcode = code[pc]
+        next_pc = pc + 1 + operand_sizes[opcode]
+        if next_pc > size:
+            break
+
+        if opcode == JUMPDEST:
+            jumpdests[pc] = 1
+            # JUMPDEST starts a new basic block
+            if start_idx < idx:
+                add_basic_block((start_idx, idx - 1))
+                start_idx = idx
+        elif next_pc - pc > 1:
+            operands[idx] = int.from_bytes(code[pc + 1 : next_pc], "big")
+
+        add_pc(pc)
+        add_opcode(opcode)
+        add_next_pc(next_pc)
+
+        if ends_basic_block[opcode]:
+            add_basic_block((start_idx, idx))
+            start_idx = idx + 1
+
+        pc = next_pc
+        idx += 1
+
+    if start_idx < idx:
+        add_basic_block((start_idx, idx - 1))
+
+    return disassembly
@@ -0,0 +1,286 @@
+"""
+Recovery of the functions from the dispatcher
+
+The dispatcher is walked iteratively from the entry point. The following shapes are recognized:
+- solc: chains of `PUSH4 selector EQ PUSH tag JUMPI`, the function is at the jump target
+- solc: splits of the selectors (GT/LT), both branches are followed
+- Vyper: chains of `PUSH4 selector EQ ISZERO PUSH tag JUMPI` or `PUSH4 selector XOR PUSH tag JUMPI`,
+the function is at the fallthrough and the next comparison at the jump target
+- Vyper: jump tables indexed by the low bits of the selector, stored in the data section.
+The sparse table holds the entry point of a chain of comparisons per bucket, the dense table
+holds the selectors and the entry points of the functions
+"""
+import logging
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+from evm_cfg_builder.cfg.function import Function
+
+if TYPE_CHECKING:
+    from evm_cfg_builder.cfg.basic_block import BasicBlock
+    from evm_cfg_builder.cfg.cfg import CFG
+    from evm_cfg_builder.cfg.instruction_store import InstructionStore
+
+logger = logging.getLogger("evm-cfg-builder")
+
+# (selector, start address of the function)
+DispatcherEntry = Tuple[int, int]
+
+# Shape of the chain being walked. The comparisons of a Vyper chain jump to the next comparison,
+# so only the blocks of the chain are followed in _VYPER mode
+_SOLC = 0
+_VYPER = 1
+
+# `PUSH1 2 PUSH1 mask DUP3 AND PUSH1 1 SHL PUSH2 table ADD PUSH1 0x1e CODECOPY PUSH1 0 MLOAD JUMP`
+_SPARSE_TABLE = (
+    "PUSH",
+    "PUSH",
+    "DUP3",
+    "AND",
+    "PUSH",
+    "SHL",
+    "PUSH",
+    "ADD",
+    "PUSH",
+    "CODECOPY",
+    "PUSH",
+    "MLOAD",
+    "JUMP",
+)
+# `PUSH1 5 PUSH1 5 PUSH1 mask DUP4 AND MUL PUSH2 table ADD PUSH1 0x1b CODECOPY PUSH1 0 MLOAD PUSH1 7`
+_DENSE_TABLE = (
+    "PUSH",
+    "PUSH",
+    "PUSH",
+    "DUP4",
+    "AND",
+    "MUL",
+    "PUSH",
+    "ADD",
+    "PUSH",
+    "CODECOPY",
+    "PUSH",
+    "MLOAD",
+    "PUSH",
+)
+# Bucket of the dense table: magic (2 bytes), offset of the entries (2 bytes), number of entries
+_DENSE_BUCKET_SIZE = 5
+# Entry of the dense table: selector (4 bytes), start address (2 bytes), flags
+_DENSE_ENTRY_SIZE = 7
+
+
+class _Block:
+    """Names and operands of the instructions of a basic block"""
+
+    def __init__(self, store: "InstructionStore", block: "BasicBlock") -> None:
+        indexes = range(block.start_idx, block.end_idx + 1)
+        self.names = [store.name_at(idx) for idx in indexes]
+        self.operands = [store.operand_at(idx) for idx in indexes]
+        self.fallthrough = block.end_pc + 1
+        self.ends_with_jumpi = self.names[-1] == "JUMPI"
+        pushed = [op for name, op in zip(self.names, self.operands) if name.startswith("PUSH")]
+        # Last pushed value (the destination of the jump), and the one before
+        self.last_pushed: Optional[int] = pushed[-1] if pushed else None
+        self.previous_pushed: Optional[int] = pushed[-2] if len(pushed) > 1 else None
+
+    def find(self, pattern: Tuple[str, ...]) -> Optional[List[int]]:
+        """
+        Return the operands of the first occurrence of pattern (PUSH matches any PUSHn)
+        """
+        size = len(pattern)
+        for start in range(len(self.names) - size + 1):
+            if all(
+                name.startswith(expected) if expected == "PUSH" else name == expected
+                for name, expected in zip(self.names[start : start + size], pattern)
+            ):
+                return [op or 0 for op in self.operands[start : start + size]]
+        return None
+
+    def compares_before_jump(self) -> Optional[str]:
+        """
+        Return the comparison deciding the final JUMPI: EQ, EQ ISZERO or XOR
+        """
+        if not self.ends_with_jumpi or len(self.names) < 4 or not self.names[-2].startswith("PUSH"):
+            return None
+        if self.names[-3] in ("EQ", "XOR"):
+            return self.names[-3]
+        if self.names[-3] == "ISZERO" and self.names[-4] == "EQ":
+            return "EQ ISZERO"
+        return None
+
+
+def _short_calldata_jumps(block: _Block) -> bool:
+    """
+    Return true if the final JUMPI of a CALLDATASIZE check is taken when the calldata is too short
+    (`PUSH1 4 CALLDATASIZE LT` or `CALLDATASIZE ISZERO`). Each following ISZERO negates the condition
+    """
+    idx = block.names.index("CALLDATASIZE") + 1
+    taken = True
+    if idx < len(block.names) and block.names[idx] == "LT":
+        idx += 1
+    elif idx < len(block.names) and block.names[idx] == "ISZERO":
+        idx += 1
+    else:
+        return True
+    while idx < len(block.names) and block.names[idx] == "ISZERO":
+        taken = not taken
+        idx += 1
+    return taken
+
+
+def _read_int(code: bytes, start: int, size: int) -> Optional[int]:
+    if start < 0 or start + size > len(code):
+        return None
+    return int.from_bytes(code[start : start + size], "big")
+
+
+def _sparse_table(cfg: "CFG", block: _Block) -> Optional[List[int]]:
+    """
+    Return the entry points of the buckets of a sparse jump table
+    """
+    operands = block.find(_SPARSE_TABLE)
+    if operands is None:
+        return None
+    size, mask, shift, table = operands[0], operands[1], operands[4], operands[6]
+    if size != 1 << shift:
+        return None
+    code = cfg.instruction_store.bytecode
+    buckets = []
+    for bucket in range(mask + 1):
+        start = _read_int(code, table + bucket * size, size)
+        if start is None:
+            return None
+        buckets.append(start)
+    return buckets
+
+
+def _dense_table(cfg: "CFG", block: _Block) -> Optional[List[DispatcherEntry]]:
+    """
+    Return the selectors and the entry points of the functions of a dense jump table
+    """
+    operands = block.find(_DENSE_TABLE)
+    if operands is None:
+        return None
+    bucket_size, mask, table, entry_size = operands[0], operands[2], operands[6], operands[12]
+    if bucket_size != _DENSE_BUCKET_SIZE or entry_size != _DENSE_ENTRY_SIZE:
+        return None
+    code = cfg.instruction_store.bytecode
+    entries = []
+    for bucket in range(mask + 1):
+        bucket_start = table + bucket * bucket_size
+        offset = _read_int(code, bucket_start + 2, 2)
+        count = _read_int(code, bucket_start + 4, 1)
+        if offset is None or count is None:
+            return None
+        for idx in range(count):
+            entry = _read_int(code, offset + idx * entry_size, entry_size)
+            if entry is None:
+                return None
+            entries.append((entry >> 24, (entry >> 8) & 0xFFFF))
+    return entries
+
+
+# pylint: disable=too-many-return-statements,too-many-branches
+def _visit(
+    cfg: "CFG", bb: "BasicBlock", mode: int, is_entry_block: bool, found: List[DispatcherEntry]
+) -> List[Tuple[int, int]]:
+    """
+    Add the functions called from the basic block to found
+    Return the (start address, mode) of the next blocks of the dispatcher, in the order of
+    exploration
+    """
+    block = _Block(cfg.instruction_store, bb)
+    target = block.last_pushed
+
+    if is_entry_block and block.ends_with_jumpi and "CALLVALUE" in block.names:
+        # Solidity 0.5.2 added a general 'payable' check: nothing is executed if it fails
+        # (https://github.com/ethereum/solidity/releases/tag/v0.5.2)
+        assert len(block.names) > 2 and block.names[-2].startswith("PUSH")
+        return [(block.operands[-2] or 0, _SOLC)]
+
+    buckets = _sparse_table(cfg, block)
+    if buckets is not None:
+        return [(start, _VYPER) for start in buckets]
+
+    entries = _dense_table(cfg, block)
+    if entries is not None:
+        found.extend(entries)
+        if block.ends_with_jumpi and target is not None:
+            fallback = target if block.names[-3] == "ISZERO" else block.fallthrough
+            found.append((Function.FALLBACK_ID, fallback))
+        return []
+
+    if not block.ends_with_jumpi:
+        return []
+
+    comparison = block.compares_before_jump()
+    if comparison in ("EQ ISZERO", "XOR"):
+        if block.previous_pushed is None or target is None:
+            return []
+        found.append((block.previous_pushed, block.fallthrough))
+        return [(target, _VYPER)]
+
+    if mode == _VYPER:
+        # A check of the call value between two comparisons, jumping to a revert
+        if "CALLVALUE" in block.names:
+            return [(block.fallthrough, _VYPER)]
+        return []
+
+    has_calldata_size = "CALLDATASIZE" in block.names
+    if has_calldata_size:
+        # Recent solc versions add a first check if calldatasize < 4 and jump in the fallback
+        if target and not _short_calldata_jumps(block):
+            found.append((Function.FALLBACK_ID, block.fallthrough))
+            return [(target, _SOLC)]
+        function_hash: Optional[int] = Function.FALLBACK_ID
+    else:
+        function_hash = block.previous_pushed
+
+    if not target or not function_hash:
+        return []
+
+    # The disptacher can be a tree and not a list of comparison
+    # As a result, if GT (or LT) is in the basic block, we are branching to
+    # a branch of the dispatcher tree rather than directy calling the function
+    if "GT" in block.names or ("LT" in block.names and not has_calldata_size):
+        return [(target, _SOLC), (block.fallthrough, _SOLC)]
+
+    found.append((function_hash, target))
+    return [(block.fallthrough, _SOLC)]
+
+
+def _basic_block_starting_at(cfg: "CFG", start: int) -> Optional["BasicBlock"]:
+    bb = cfg.get_basic_block_at(start)
+    if bb is None or bb.start_pc != start:
+        logger.debug(f"Dispatcher: no basic block at {hex(start)}")
+        return None
+    return bb
+
+
+def find_functions(
+    cfg: "CFG", block: "BasicBlock", is_entry_block: bool = False
+) -> List[DispatcherEntry]:
+    """
+    Walk the dispatcher from the basic block, without recursion
+    Args:
+        cfg (CFG)
+        block (BasicBlock): first block of the dispatcher
+        is_entry_block (bool): True if the block is the entry point of the contract
+    Returns:
+        list of (selector, start address): in the order of discovery. The fallback function
+        has the selector Function.FALLBACK_ID. The start addresses are basic blocks starts
+    """
+    found: List[DispatcherEntry] = []
+    visited = set()
+    worklist: List[Tuple["BasicBlock", int, bool]] = [(block, _SOLC, is_entry_block)]
+    while worklist:
+        bb, mode, is_entry = worklist.pop()
+        if (bb.start_pc, mode) in visited:
+            continue
+        visited.add((bb.start_pc, mode))
+        successors = _visit(cfg, bb, mode, is_entry, found)
+        for start, next_mode in reversed(successors):
+            next_bb = _basic_block_starting_at(cfg, start)
+            if next_bb is not None:
+                worklist.append((next_bb, next_mode, False))
+
+    return [entry for entry in found if _basic_block_starting_at(cfg, entry[1]) is not None]
@@ -0,0 +1,258 @@
+"""
+Edges of the CFG, shared by all the basic blocks of a contract
+
+The basic blocks are identified by an id (their order of registration). The edges are stored
+in two layers:
+- the static edges, which do not depend on the function: the fallthrough of a JUMPI, and
+the fallthrough of a basic block split by a JUMPDEST. They are computed once per contract,
+and each basic block has at most one static successor (the next basic block)
+- the dynamic edges (the jumps found by the analysis), stored per function key.
+For each basic block, the outgoing and the incoming edges are insertion-ordered sets of ids
+(dicts with None values): an insertion is O(1) with deduplication, and the neighbours are
+returned in the order in which the edges were added
+
+The static edges of a function are the static edges of the basic blocks in its scope: the outgoing
+edges of a basic block in the scope, and its incoming edges, even from a basic block out of
+the scope (the entry of a function keeps its edge from the dispatcher).
+The scope of a function is open (all the basic blocks) while it is analyzed, and restricted to
+its reachable basic blocks once the analysis is done.
+The union of the dynamic edges over the functions is maintained with a reference count per edge,
+so that the neighbours for all the functions are queried in O(degree) as well.
+"""
+from typing import Dict, Iterable, List, Optional, Set, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from evm_cfg_builder.cfg.basic_block import BasicBlock
+
+# id -> function key -> neighbours ids (ordered set)
+_Adjacency = List[Dict[int, Dict[int, None]]]
+# id -> neighbour id -> number of functions with the edge
+_Union = List[Dict[int, int]]
+
+_NO_EDGE = -1
+
+
+# pylint: disable=too-many-instance-attributes
+class EdgeTable:
+    """Edges of the basic blocks: static edges, and dynamic edges per function key"""
+
+    def __init__(self) -> None:
+        self._basic_blocks: List["BasicBlock"] = []
+        self._ids: Dict["BasicBlock", int] = {}
+        # Static successor and predecessor of each basic block (_NO_EDGE if none)
+        self._static_outgoing: List[int] = []
+        self._static_incoming: List[int] = []
+        # Scope of each function: None while the function is analyzed (all the basic blocks),
+        # then the ids of the basic blocks reachable
+        self._scopes: Dict[int, Optional[Set[int]]] = {}
+        self._open_scopes = 0
+        # Number of restricted scopes containing each basic block
+        self._scope_count: List[int] = []
+        self._outgoing: _Adjacency = []
+        self._incoming: _Adjacency = []
+        self._all_outgoing: _Union = []
+        self._all_incoming: _Union = []
+        # Ids of the basic blocks with dynamic edges, per function key
+        self._dynamic_ids: Dict[int, Dict[int, None]] = {}
+
+    def __len__(self) -> int:
+        return len(self._basic_blocks)
+
+    def add_basic_block(self, bb: "BasicBlock") -> int:
+        """
+        Register the basic block, if it is not registered yet
+        Returns:
+            int: id of the basic block
+        """
+        bb_id = self._ids.get(bb)
+        if bb_id is None:
+            bb_id = len(self._basic_blocks)
+            self._ids[bb] = bb_id
+            self._basic_blocks.append(bb)
+            self._static_outgoing.append(_NO_EDGE)
+            self._static_incoming.append(_NO_EDGE)
+            self._scope_count.append(0)
+            self._outgoing.append({})
+            self._incoming.append({})
+            self._all_outgoing.append({})
+            self._all_incoming.append({})
+        return bb_id
+
+    def basic_block(self, bb_id: int) -> "BasicBlock":
+        return self._basic_blocks[bb_id]
+
+    def id_of(self, bb: "BasicBlock") -> int:
+        return self._ids[bb]
+
+    def add_static_edge(self, src: "BasicBlock", dst: "BasicBlock") -> None:
+        """
+        Add an edge shared by all the functions
+        A basic block has at most one static successor, and one static predecessor
+        """
+        src_id = self.add_basic_block(src)
+        dst_id = self.add_basic_block(dst)
+        self._static_outgoing[src_id] = dst_id
+        self._static_incoming[dst_id] = src_id
+
+    def static_successor(self, bb: "BasicBlock") -> Optional["BasicBlock"]:
+        """
+        Return the static successor of the basic block, whatever the scopes. None if there is none
+        """
+        bb_id = self._ids.get(bb)
+        if bb_id is None or self._static_outgoing[bb_id] == _NO_EDGE:
+            return None
+        return self._basic_blocks[self._static_outgoing[bb_id]]
+
+    def open_scope(self, key: int) -> None:
+        """
+        Make the static edges of all the basic blocks visible for the function key
+        (while the function is analyzed)
+        """
+        self._close_scope(key)
+        self._scopes[key] = None
+        self._open_scopes += 1
+
+    def _close_scope(self, key: int) -> None:
+        if key not in self._scopes:
+            return
+        scope = self._scopes.pop(key)
+        if scope is None:
+            self._open_scopes -= 1
+        else:
+            for bb_id in scope:
+                self._scope_count[bb_id] -= 1
+
+    def set_reachable(self, key: int, bbs: Iterable["BasicBlock"]) -> None:
+        """
+        Restrict the scope of the function key to the basic blocks reachable
+        The dynamic edges of the other basic blocks are removed
+        """
+        scope = {self.add_basic_block(bb) for bb in bbs}
+        self._close_scope(key)
+        self._scopes[key] = scope
+        for bb_id in scope:
+            self._scope_count[bb_id] += 1
+        dynamic_ids = self._dynamic_ids.get(key, {})
+        for bb_id in [bb_id for bb_id in dynamic_ids if bb_id not in scope]:
+            self._remove(self._outgoing, self._all_outgoing, key, bb_id)
+            self._remove(self._incoming, self._all_incoming, key, bb_id)
+            del dynamic_ids[bb_id]
+
+    def _in_scope(self, key: int, bb_id: int) -> bool:
+        if key not in self._scopes:
+            return False
+        scope = self._scopes[key]
+        return scope is None or bb_id in scope
+
+    def _in_any_scope(self, bb_id: int) -> bool:
+        return self._open_scopes > 0 or self._scope_count[bb_id] > 0
+
+    @staticmethod
+    def _add(adjacency: _Adjacency, union: _Union, key: int, src: int, dst: int) -> None:
+        neighbours = adjacency[src].setdefault(key, {})
+        if dst not in neighbours:
+            neighbours[dst] = None
+            counts = union[src]
+            counts[dst] = counts.get(dst, 0) + 1
+
+    @staticmethod
+    def _remove(adjacency: _Adjacency, union: _Union, key: int, src: int) -> None:
+        neighbours = adjacency[src].pop(key, None)
+        if neighbours:
+            counts = union[src]
+            for dst in neighbours:
+                counts[dst] -= 1
+                if not counts[dst]:
+                    del counts[dst]
+
+    def add_outgoing(self, key: int, src: "BasicBlock", dst: "BasicBlock") -> None:
+        """
+        Add dst to the outgoing basic blocks of src, for the function key
+        """
+        src_id = self.add_basic_block(src)
+        dst_id = self.add_basic_block(dst)
+        if self._static_outgoing[src_id] != dst_id:
+            self._add(self._outgoing, self._all_outgoing, key, src_id, dst_id)
+            self._dynamic_ids.setdefault(key, {})[src_id] = None
+
+    def add_incoming(self, key: int, dst: "BasicBlock", src: "BasicBlock") -> None:
+        """
+        Add src to the incoming basic blocks of dst, for the function key
+        """
+        src_id = self.add_basic_block(src)
+        dst_id = self.add_basic_block(dst)
+        if self._static_incoming[dst_id] != src_id:
+            self._add(self._incoming, self._all_incoming, key, dst_id, src_id)
+            self._dynamic_ids.setdefault(key, {})[dst_id] = None
+
+    def add_edge(self, key: int, src: "BasicBlock", dst: "BasicBlock") -> None:
+        self.add_outgoing(key, src, dst)
+        self.add_incoming(key, dst, src)
+
+    def _ids_to_bbs(self, static: int, ids: Iterable[int]) -> List["BasicBlock"]:
+        bbs = self._basic_blocks
+        neighbours = [bbs[static]] if static != _NO_EDGE else []
+        neighbours += [bbs[idx] for idx in ids]
+        return neighbours
+
+    def outgoing(self, key: int, bb: "BasicBlock") -> List["BasicBlock"]:
+        bb_id = self._ids.get(bb)
+        if bb_id is None:
+            return []
+        static = self._static_outgoing[bb_id] if self._in_scope(key, bb_id) else _NO_EDGE
+        return self._ids_to_bbs(static, self._outgoing[bb_id].get(key, ()))
+
+    def incoming(self, key: int, bb: "BasicBlock") -> List["BasicBlock"]:
+        bb_id = self._ids.get(bb)
+        if bb_id is None:
+            return []
+        static = self._static_incoming[bb_id] if self._in_scope(key, bb_id) else _NO_EDGE
+        return self._ids_to_bbs(static, self._incoming[bb_id].get(key, ()))
+
+    def all_outgoing(self, bb: "BasicBlock") -> List["BasicBlock"]:
+        """
+        Outgoing basic blocks of bb, for all the functions
+        """
+        bb_id = self._ids.get(bb)
+        if bb_id is None:
+            return []
+        static = self._static_outgoing[bb_id] if self._in_any_scope(bb_id) else _NO_EDGE
+        return self._ids_to_bbs(static, self._all_outgoing[bb_id])
+
+    def all_incoming(self, bb: "BasicBlock") -> List["BasicBlock"]:
+        """
+        Incoming basic blocks of bb, for all the functions
+        """
+        bb_id = self._ids.get(bb)
+        if bb_id is None:
+            return []
+        static = self._static_incoming[bb_id] if self._in_any_scope(bb_id) else _NO_EDGE
+        return self._ids_to_bbs(static, self._all_incoming[bb_id])
+
+    def _keys_of(self, adjacency: _Adjacency, bb_id: int) -> List[int]:
+        keys = [key for key in self._scopes if self._in_scope(key, bb_id)]
+        keys += [key for key in adjacency[bb_id] if key not in self._scopes]
+        return keys
+
+    def outgoing_as_dict(self, bb: "BasicBlock") -> Dict[int, List["BasicBlock"]]:
+        bb_id = self._ids.get(bb)
+        if bb_id is None:
+            return {}
+        outgoing = {key: self.outgoing(key, bb) for key in self._keys_of(self._outgoing, bb_id)}
+        return {key: bbs for key, bbs in outgoing.items() if bbs}
+
+    def incoming_as_dict(self, bb: "BasicBlock") -> Dict[int, List["BasicBlock"]]:
+        bb_id = self._ids.get(bb)
+        if bb_id is None:
+            return {}
+        incoming = {key: self.incoming(key, bb) for key in self._keys_of(self._incoming, bb_id)}
+        return {key: bbs for key, bbs in incoming.items() if bbs}
+
+    def remove_key(self, key: int) -> None:
+        """
+        Remove all the edges of the function key
+        """
+        self._close_scope(key)
+        for bb_id in self._dynamic_ids.pop(key, {}):
+            self._remove(self._outgoing, self._all_outgoing, key, bb_id)
+            self._remove(self._incoming, self._all_incoming, key, bb_id)
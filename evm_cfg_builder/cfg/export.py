@@ -0,0 +1,328 @@
+"""
+Export of the CFGs (full graph, functions and dispatcher) to DOT, JSON lines or GraphML
+
+The exporters stream the graphs to a text output: each basic block and its edges are written
+as they are visited, and the labels are built from the instruction store.
+The graphs are written either in one file per graph (<base>-FULL_GRAPH, <base><function name>),
+possibly by a pool of processes, or in a single file (<base>-ALL_GRAPHS).
+The files can be compressed with gzip.
+"""
+import gzip
+import json
+import logging
+import multiprocessing
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple, Type, TYPE_CHECKING
+from xml.sax.saxutils import escape, quoteattr
+
+from evm_cfg_builder.cfg.function import Function
+
+if TYPE_CHECKING:
+    from evm_cfg_builder.cfg.basic_block import BasicBlock
+    from evm_cfg_builder.cfg.cfg import CFG
+
+logger = logging.getLogger("evm-cfg-builder")
+
+FULL_GRAPH_NAME = "FULL_GRAPH"
+ALL_GRAPHS_NAME = "ALL_GRAPHS"
+
+
+# pylint: disable=too-few-public-methods
+class ExportedGraph:
+    """Graph to export
+
+    - name: name of the graph
+    - basic_blocks: nodes of the graph
+    - key: the edges are the edges of the function key. None for the full graph (all the edges)
+    - calls: (node id, label) of additional nodes, the functions called by the dispatcher
+    """
+
+    __slots__ = ("name", "basic_blocks", "key", "calls")
+
+    def __init__(
+        self,
+        name: str,
+        basic_blocks: List["BasicBlock"],
+        key: Optional[int] = None,
+        calls: Optional[List[Tuple[int, str]]] = None,
+    ) -> None:
+        self.name = name
+        self.basic_blocks = basic_blocks
+        self.key = key
+        self.calls = calls or []
+
+    @property
+    def file_suffix(self) -> str:
+        """
+        Suffix of the file of the graph: the name of the function, or -FULL_GRAPH
+        """
+        return self.name if self.key is not None else f"-{self.name}"
+
+    def successors(self, bb: "BasicBlock") -> List["BasicBlock"]:
+        if self.key is None:
+            return bb.all_outgoing_basic_blocks
+        return bb.outgoing_basic_blocks(self.key)
+
+
+def full_graph(cfg: "CFG") -> ExportedGraph:
+    return ExportedGraph(FULL_GRAPH_NAME, cfg.basic_blocks)
+
+
+def function_graph(cfg: "CFG", function: Function) -> ExportedGraph:
+    calls = []
+    if function.key == Function.DISPATCHER_ID:
+        calls = [(f.start_addr, f"Call {f.name}") for f in cfg.functions if f != function]
+    return ExportedGraph(function.name, function.basic_blocks, function.key, calls)
+
+
+def cfg_graphs(cfg: "CFG") -> List[ExportedGraph]:
+    """
+    Return the full graph, and the graph of each function whose CFG is computed
+    The CFGs not computed yet (compute_cfgs=False) are not computed for the export
+    """
+    functions = [function for function in cfg.functions if function.cfg_computed]
+    return [full_graph(cfg)] + [function_graph(cfg, function) for function in functions]
+
+
+class GraphExporter(ABC):
+    """Base class of the exporters
+
+    The subclasses write the nodes and the edges, write_graph visits the graph
+    """
+
+    NAME = ""
+    EXTENSION = ""
+
+    def begin(self, out: TextIO) -> None:
+        """
+        Called once per file, before the first graph
+        """
+
+    def end(self, out: TextIO) -> None:
+        """
+        Called once per file, after the last graph
+        """
+
+    @abstractmethod
+    def begin_graph(self, out: TextIO, graph: ExportedGraph) -> None:
+        """
+        Called before the nodes of each graph
+        """
+
+    @abstractmethod
+    def end_graph(self, out: TextIO, graph: ExportedGraph) -> None:
+        """
+        Called after the nodes of each graph
+        """
+
+    @abstractmethod
+    def node(self, out: TextIO, graph: ExportedGraph, node_id: int, lines: Iterable[str]) -> None:
+        """
+        Write a node, labeled with the lines
+        """
+
+    @abstractmethod
+    def edge(self, out: TextIO, graph: ExportedGraph, src: int, dst: int) -> None:
+        """
+        Write an edge between two nodes
+        """
+
+    def write_graph(self, out: TextIO, cfg: "CFG", graph: ExportedGraph) -> None:
+        store = cfg.instruction_store
+        self.begin_graph(out, graph)
+        for bb in graph.basic_blocks:
+            lines = (
+                f"{hex(store.pc_at(idx))}:{store.text_at(idx)}"
+                for idx in range(bb.start_idx, bb.end_idx + 1)
+            )
+            self.node(out, graph, bb.start_pc, lines)
+
+            sons = graph.successors(bb)
+            for son in sons:
+                self.edge(out, graph, bb.start_pc, son.start_pc)
+
+            if graph.key is not None and not sons and bb.ends_with_jump_or_jumpi():
+                logger.error(f"Missing branches {graph.name}:{hex(bb.end_pc)}")
+        for node_id, label in graph.calls:
+            self.node(out, graph, node_id, [label])
+        self.end_graph(out, graph)
+
+
+class DotExporter(GraphExporter):
+    NAME = "dot"
+    EXTENSION = "dot"
+
+    def begin_graph(self, out: TextIO, graph: ExportedGraph) -> None:
+        out.write("digraph{\n")
+
+    def end_graph(self, out: TextIO, graph: ExportedGraph) -> None:
+        out.write("\n}\n")
+
+    def node(self, out: TextIO, graph: ExportedGraph, node_id: int, lines: Iterable[str]) -> None:
+        out.write(f'{node_id}[label="')
+        out.write("\n".join(lines))
+        out.write('"]\n')
+
+    def edge(self, out: TextIO, graph: ExportedGraph, src: int, dst: int) -> None:
+        out.write(f"{src} -> {dst}\n")
+
+
+class JsonLinesExporter(GraphExporter):
+    """One JSON object per line, for each node and each edge:
+    {"graph": name, "node": id, "label": [lines]} and {"graph": name, "edge": [src, dst]}
+    """
+
+    NAME = "jsonl"
+    EXTENSION = "jsonl"
+
+    def begin_graph(self, out: TextIO, graph: ExportedGraph) -> None:
+        out.write(json.dumps({"graph": graph.name, "key": graph.key}) + "\n")
+
+    def end_graph(self, out: TextIO, graph: ExportedGraph) -> None:
+        pass
+
+    def node(self, out: TextIO, graph: ExportedGraph, node_id: int, lines: Iterable[str]) -> None:
+        out.write(json.dumps({"graph": graph.name, "node": node_id, "label": list(lines)}) + "\n")
+
+    def edge(self, out: TextIO, graph: ExportedGraph, src: int, dst: int) -> None:
+        out.write(json.dumps({"graph": graph.name, "edge": [src, dst]}) + "\n")
+
+
+class GraphMLExporter(GraphExporter):
+    """GraphML document, with one graph element per graph
+    The ids of the nodes are prefixed with the name of their graph
+    """
+
+    NAME = "graphml"
+    EXTENSION = "graphml"
+
+    def begin(self, out: TextIO) -> None:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        out.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        out.write('<key id="label" for="node" attr.name="label" attr.type="string"/>\n')
+
+    def end(self, out: TextIO) -> None:
+        out.write("</graphml>\n")
+
+    def begin_graph(self, out: TextIO, graph: ExportedGraph) -> None:
+        out.write(f'<graph id={quoteattr(graph.name)} edgedefault="directed">\n')
+
+    def end_graph(self, out: TextIO, graph: ExportedGraph) -> None:
+        out.write("</graph>\n")
+
+    def node(self, out: TextIO, graph: ExportedGraph, node_id: int, lines: Iterable[str]) -> None:
+        out.write(f"<node id={quoteattr(f'{graph.name}:{node_id}')}>")
+        out.write('<data key="label">')
+        out.write(escape("\n".join(lines)))
+        out.write("</data></node>\n")
+
+    def edge(self, out: TextIO, graph: ExportedGraph, src: int, dst: int) -> None:
+        source = quoteattr(f"{graph.name}:{src}")
+        target = quoteattr(f"{graph.name}:{dst}")
+        out.write(f"<edge source={source} target={target}/>\n")
+
+
+EXPORTERS: Dict[str, Type[GraphExporter]] = {
+    exporter.NAME: exporter for exporter in (DotExporter, JsonLinesExporter, GraphMLExporter)
+}
+
+
+def get_exporter(name: str) -> GraphExporter:
+    if name not in EXPORTERS:
+        raise ValueError(f"Unknown export format {name} (available: {', '.join(EXPORTERS)})")
+    return EXPORTERS[name]()
+
+
+def _open(path: str, compress: bool) -> TextIO:
+    # pylint: disable=consider-using-with
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+def _filename(base_filename: str, suffix: str, exporter: GraphExporter, compress: bool) -> str:
+    path = f"{base_filename}{suffix}.{exporter.EXTENSION}"
+    return path + ".gz" if compress else path
+
+
+def export_graphs(
+    cfg: "CFG",
+    path: str,
+    graphs: List[ExportedGraph],
+    exporter: GraphExporter,
+    compress: bool = False,
+) -> None:
+    """
+    Write the graphs in one file
+    """
+    with _open(path, compress) as out:
+        exporter.begin(out)
+        for graph in graphs:
+            exporter.write_graph(out, cfg, graph)
+        exporter.end(out)
+
+
+# Exported CFG and graphs, inherited by the processes of the pool
+_worker_cfg: Optional["CFG"] = None
+_worker_graphs: List[ExportedGraph] = []
+
+
+def _export_in_worker(task: Tuple[int, str, str, bool]) -> str:
+    idx, path, exporter_name, compress = task
+    assert _worker_cfg is not None
+    export_graphs(_worker_cfg, path, [_worker_graphs[idx]], get_exporter(exporter_name), compress)
+    return path
+
+
+# pylint: disable=too-many-arguments
+def export_cfg(
+    cfg: "CFG",
+    base_filename: str,
+    *,
+    exporter: str = "dot",
+    single_file: bool = False,
+    compress: bool = False,
+    workers: int = 1,
+) -> List[str]:
+    """
+    Export the full graph and the graph of each function whose CFG is computed
+    Args:
+        cfg (CFG)
+        base_filename (str): prefix of the files
+        exporter (str): name of the exporter (see EXPORTERS)
+        single_file (bool): write all the graphs in <base_filename>-ALL_GRAPHS
+        compress (bool): compress the files with gzip (.gz extension)
+        workers (int): number of processes writing the files. Only used with one file per graph,
+            on the platforms supporting fork
+    Returns:
+        list(str): files written
+    """
+    # pylint: disable=global-statement
+    global _worker_cfg, _worker_graphs
+
+    graph_exporter = get_exporter(exporter)
+    graphs = cfg_graphs(cfg)
+
+    with cfg.stats.phase("export"):
+        if single_file:
+            path = _filename(base_filename, f"-{ALL_GRAPHS_NAME}", graph_exporter, compress)
+            export_graphs(cfg, path, graphs, graph_exporter, compress)
+            return [path]
+
+        paths = [
+            _filename(base_filename, graph.file_suffix, graph_exporter, compress)
+            for graph in graphs
+        ]
+        if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+            for graph, path in zip(graphs, paths):
+                export_graphs(cfg, path, [graph], graph_exporter, compress)
+            return paths
+
+        # The pool processes are forked: they share the CFG without serializing it
+        _worker_cfg, _worker_graphs = cfg, graphs
+        try:
+            tasks = [(idx, path, exporter, compress) for idx, path in enumerate(paths)]
+            with multiprocessing.get_context("fork").Pool(processes=workers) as pool:
+                return list(pool.imap(_export_in_worker, tasks))
+        finally:
+            _worker_cfg, _worker_graphs = None, []
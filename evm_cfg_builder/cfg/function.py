@@ -1,5 +1,8 @@
 import logging
-from typing import List, TYPE_CHECKING
+from typing import List, Optional, TYPE_CHECKING
+
+from evm_cfg_builder.cfg.graph import FunctionGraph, Loop
+from evm_cfg_builder.cfg.stats import AnalysisStats
 
 if TYPE_CHECKING:
     from evm_cfg_builder.cfg.cfg import CFG
@@ -8,7 +11,7 @@ if TYPE_CHECKING:
 logger = logging.getLogger("evm-cfg-builder")
 
 
-# pylint: disable=too-many-instance-attributes
+# pylint: disable=too-many-instance-attributes,too-many-public-methods
 class Function:
     DISPATCHER_ID = -2
     FALLBACK_ID = -1
@@ -26,6 +29,11 @@ class Function:
         self._basic_blocks: List["BasicBlock"] = []
         self._attributes: List[str] = []
         self._cfg: "CFG" = cfg
+        # True once the CFG of the function is computed (or being computed)
+        self._cfg_computed = False
+        self._graph: Optional[FunctionGraph] = None
+        self._stats: Optional[AnalysisStats] = None
+        self._incomplete_reason: Optional[str] = None
 
     def __repr__(self) -> str:
         return f"<cfg Function@{hex(self.start_addr)}>"
@@ -50,37 +58,107 @@ class Function:
     def name(self, n: str) -> None:
         self._name = n
 
+    @property
+    def cfg_computed(self) -> bool:
+        return self._cfg_computed
+
+    @cfg_computed.setter
+    def cfg_computed(self, computed: bool) -> None:
+        self._cfg_computed = computed
+
     @property
     def basic_blocks(self) -> List["BasicBlock"]:
         """
+        The CFG of the function is computed on the first access, if it was not computed yet
         Returns
             list(BasicBlock)
         """
+        if not self._cfg_computed:
+            self._cfg.ensure_function_cfg(self)
         return self._basic_blocks
 
     @basic_blocks.setter
     def basic_blocks(self, bbs: List["BasicBlock"]) -> None:
         self._basic_blocks = bbs
+        self._cfg_computed = True
+        self._graph = None
+
+    @property
+    def stats(self) -> Optional[AnalysisStats]:
+        """
+        Counters of the value-set analysis of the function
+        None if the function was not analyzed in this process (or was loaded from the cache)
+        """
+        return self._stats
+
+    @stats.setter
+    def stats(self, stats: Optional[AnalysisStats]) -> None:
+        self._stats = stats
+
+    @property
+    def incomplete(self) -> bool:
+        """
+        True if the analysis of the function stopped before the fixpoint (see incomplete_reason)
+        The CFG only contains the edges found before the stop
+        """
+        return self._incomplete_reason is not None
+
+    @property
+    def incomplete_reason(self) -> Optional[str]:
+        """
+        Why the analysis stopped: the budget exhausted ("function time", "contract memory", ..),
+        or "iterations". None if the analysis is complete
+        """
+        return self._incomplete_reason
+
+    @incomplete_reason.setter
+    def incomplete_reason(self, reason: Optional[str]) -> None:
+        self._incomplete_reason = reason
 
     @property
     def entry(self) -> "BasicBlock":
         return self._entry
 
+    @property
+    def graph(self) -> FunctionGraph:
+        """
+        Reachability, dominators, post-dominators and loops of the CFG of the function
+        Computed on the first access
+        Returns
+            FunctionGraph
+        """
+        if self._graph is None:
+            self._graph = FunctionGraph(self.entry, self.basic_blocks, self.key)
+        return self._graph
+
+    def dominators(self, bb: "BasicBlock") -> List["BasicBlock"]:
+        return self.graph.dominators(bb)
+
+    def post_dominators(self, bb: "BasicBlock") -> List["BasicBlock"]:
+        return self.graph.post_dominators(bb)
+
+    @property
+    def loops(self) -> List[Loop]:
+        return self.graph.loops
+
     @property
     def attributes(self) -> List[str]:
         """
+        The CFG of the function is computed on the first access, if it was not computed yet
         Returns
             list(str)
         """
+        if not self._cfg_computed:
+            self._cfg.ensure_function_cfg(self)
         return self._attributes
 
     def add_attributes(self, attr: str) -> None:
-        if not attr in self.attributes:
+        if not attr in self._attributes:
             self._attributes.append(attr)
 
     def check_payable(self) -> None:
         entry = self.entry
-        if any(ins.name == "CALLVALUE" for ins in entry.instructions):
+        if "CALLVALUE" in entry.instruction_names:
             return
         self.add_attributes("payable")
 
@@ -96,7 +174,7 @@ class Function:
         ]
 
         for bb in self.basic_blocks:
-            if any(ins.name in changing_state_ops for ins in bb.instructions):
+            if any(name in changing_state_ops for name in bb.instruction_names):
                 return
 
         self.add_attributes("view")
@@ -146,58 +224,31 @@ class Function:
         ]
 
         for bb in self.basic_blocks:
-            if any(ins.name in state_ops for ins in bb.instructions):
+            if any(name in state_ops for name in bb.instruction_names):
                 return
 
         self.add_attributes("pure")
 
     def __str__(self) -> str:
+        """
+        The CFG of the function is not computed: a function not analyzed yet has no basic block
+        """
         attrs = ""
-        if self.attributes:
-            attrs = ", " + ",".join(self.attributes)
-        return f"{self.name}, {len(self.basic_blocks)} #bbs {attrs}"
+        if self._attributes:
+            attrs = ", " + ",".join(self._attributes)
+        return f"{self.name}, {len(self._basic_blocks)} #bbs {attrs}"
 
     def output_to_dot(self, base_filename: str) -> None:
+        # pylint: disable=import-outside-toplevel
+        from evm_cfg_builder.cfg.export import DotExporter, export_graphs, function_graph
 
-        if self.key == Function.DISPATCHER_ID:
-            self.output_dispatcher_to_dot(base_filename)
-            return
-
-        with open(f"{base_filename}{self.name}.dot", "w", encoding="utf-8") as f:
-            f.write("digraph{\n")
-            for basic_block in self.basic_blocks:
-                instructions_ = [f"{hex(ins.pc)}:{str(ins)}" for ins in basic_block.instructions]
-                instructions = "\n".join(instructions_)
-
-                f.write(f'{basic_block.start.pc}[label="{instructions}"]\n')
-
-                for son in basic_block.outgoing_basic_blocks(self.key):
-                    f.write(f"{basic_block.start.pc} -> {son.start.pc}\n")
-
-                if not basic_block.outgoing_basic_blocks(self.key):
-                    if basic_block.ends_with_jump_or_jumpi():
-                        logger.error(f"Missing branches {self.name}:{hex(basic_block.end.pc)}")
-
-            f.write("\n}")
+        export_graphs(
+            self._cfg,
+            f"{base_filename}{self.name}.dot",
+            [function_graph(self._cfg, self)],
+            DotExporter(),
+        )
 
     def output_dispatcher_to_dot(self, base_filename: str) -> None:
-
-        with open(f"{base_filename}{self.name}.dot", "w", encoding="utf-8") as f:
-            f.write("digraph{\n")
-            for basic_block in self.basic_blocks:
-                instructions_ = [f"{hex(ins.pc)}:{str(ins)}" for ins in basic_block.instructions]
-                instructions = "\n".join(instructions_)
-
-                f.write(f'{basic_block.start.pc}[label="{instructions}"]\n')
-
-                for son in basic_block.outgoing_basic_blocks(self.key):
-                    f.write(f"{basic_block.start.pc} -> {son.start.pc}\n")
-
-                if not basic_block.outgoing_basic_blocks(self.key):
-                    if basic_block.ends_with_jump_or_jumpi():
-                        logger.error(f"Missing branches {self.name}:{hex(basic_block.end.pc)}")
-            for function in self._cfg.functions:
-                if function != self:
-                    f.write(f'{function.start_addr}[label="Call {function.name}"]\n')
-
-            f.write("\n}")
+        assert self.key == Function.DISPATCHER_ID
+        self.output_to_dot(base_filename)
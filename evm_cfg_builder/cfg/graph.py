@@ -0,0 +1,266 @@
+"""
+Graph analyses of the CFG of a function: reachability, dominators, post-dominators and loops
+
+The basic blocks of the function are numbered, and the sets of basic blocks are stored
+as integer bitsets (bit i is set if the i-th basic block is in the set).
+The analyses are computed once, when the FunctionGraph is built.
+"""
+from typing import Dict, Iterator, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from evm_cfg_builder.cfg.basic_block import BasicBlock
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    """
+    Iterate over the indexes of the bits set, in increasing order
+    """
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class Loop:
+    """Natural loop: the basic blocks reaching a back edge to the header, without going
+    through the header
+
+    The loops sharing a header are merged.
+    """
+
+    def __init__(
+        self, header: "BasicBlock", basic_blocks: List["BasicBlock"], back_edges: List["BasicBlock"]
+    ) -> None:
+        self._header = header
+        self._basic_blocks = basic_blocks
+        self._back_edges = back_edges
+
+    def __repr__(self) -> str:
+        return f"<cfg Loop@{hex(self._header.start_pc)}: {len(self._basic_blocks)} bbs>"
+
+    @property
+    def header(self) -> "BasicBlock":
+        return self._header
+
+    @property
+    def basic_blocks(self) -> List["BasicBlock"]:
+        """
+        Basic blocks of the loop, including the header
+        """
+        return self._basic_blocks
+
+    @property
+    def back_edges(self) -> List["BasicBlock"]:
+        """
+        Sources of the back edges to the header
+        """
+        return self._back_edges
+
+
+# pylint: disable=too-many-instance-attributes
+class FunctionGraph:
+    """Reachability, dominators, post-dominators and loops of the CFG of a function"""
+
+    def __init__(self, entry: "BasicBlock", basic_blocks: List["BasicBlock"], key: int) -> None:
+        """
+        Args:
+            entry (BasicBlock): entry point of the function
+            basic_blocks (list(BasicBlock)): basic blocks of the function
+            key (int): key of the function, used to query the edges
+        """
+        bbs = [entry] + [bb for bb in basic_blocks if bb is not entry]
+        self._bbs = bbs
+        self._ids: Dict["BasicBlock", int] = {bb: idx for idx, bb in enumerate(bbs)}
+        self._succs: List[List[int]] = [
+            [self._ids[son] for son in bb.outgoing_basic_blocks(key) if son in self._ids]
+            for bb in bbs
+        ]
+        self._preds: List[List[int]] = [[] for _ in bbs]
+        for idx, succs in enumerate(self._succs):
+            for succ in succs:
+                self._preds[succ].append(idx)
+        self._all = (1 << len(bbs)) - 1
+
+        self._postorder = self._compute_postorder()
+        self._reachable = self._compute_reachable()
+        reached_from_entry = 0
+        for idx in self._postorder:
+            reached_from_entry |= 1 << idx
+        self._dominators = self._compute_dominators(self._preds, [0], reached_from_entry)
+        exits = [idx for idx, succs in enumerate(self._succs) if not succs]
+        exits_bits = 0
+        for idx in exits:
+            exits_bits |= 1 << idx
+        reaching_exits = 0
+        for idx, bits in enumerate(self._reachable):
+            if bits & exits_bits:
+                reaching_exits |= 1 << idx
+        self._post_dominators = self._compute_dominators(self._succs, exits, reaching_exits)
+        self._loops = self._compute_loops()
+
+    def _compute_postorder(self) -> List[int]:
+        postorder: List[int] = []
+        visited = 1
+        stack = [(0, iter(self._succs[0]))]
+        while stack:
+            node, succs = stack[-1]
+            for succ in succs:
+                if not visited >> succ & 1:
+                    visited |= 1 << succ
+                    stack.append((succ, iter(self._succs[succ])))
+                    break
+            else:
+                stack.pop()
+                postorder.append(node)
+        return postorder
+
+    def _compute_reachable(self) -> List[int]:
+        # Fixpoint over the postorder: the successors are mostly computed before their predecessors
+        reachable = [1 << idx for idx in range(len(self._bbs))]
+        changed = True
+        while changed:
+            changed = False
+            for idx in self._postorder:
+                bits = reachable[idx]
+                for succ in self._succs[idx]:
+                    bits |= reachable[succ]
+                if bits != reachable[idx]:
+                    reachable[idx] = bits
+                    changed = True
+        return reachable
+
+    def _compute_dominators(
+        self, preds: List[List[int]], roots: List[int], reached: int
+    ) -> List[int]:
+        """
+        Iterative data-flow computation of the dominators over preds
+        The nodes that are not in reached (from the roots) are only dominated by themselves
+        """
+        order = list(reversed(self._postorder)) if preds is self._preds else self._postorder
+        root_bits = 0
+        for root in roots:
+            root_bits |= 1 << root
+        dominators = [self._all] * len(self._bbs)
+        for root in roots:
+            dominators[root] = 1 << root
+        changed = True
+        while changed:
+            changed = False
+            for idx in order:
+                if root_bits >> idx & 1 or not reached >> idx & 1:
+                    continue
+                bits = self._all
+                for pred in preds[idx]:
+                    bits &= dominators[pred]
+                bits |= 1 << idx
+                if bits != dominators[idx]:
+                    dominators[idx] = bits
+                    changed = True
+        return [bits if reached >> idx & 1 else 1 << idx for idx, bits in enumerate(dominators)]
+
+    def _compute_loops(self) -> List[Loop]:
+        bodies: Dict[int, int] = {}
+        back_edges: Dict[int, List[int]] = {}
+        for src in self._postorder:
+            for header in self._succs[src]:
+                if not self._dominators[src] >> header & 1:
+                    continue
+                back_edges.setdefault(header, []).append(src)
+                body = bodies.get(header, 1 << header)
+                worklist = [src]
+                while worklist:
+                    node = worklist.pop()
+                    if body >> node & 1:
+                        continue
+                    body |= 1 << node
+                    worklist.extend(self._preds[node])
+                bodies[header] = body
+        return [
+            Loop(
+                self._bbs[header],
+                self._to_bbs(body),
+                [self._bbs[src] for src in back_edges[header]],
+            )
+            for header, body in sorted(bodies.items(), key=lambda item: self._bbs[item[0]].start_pc)
+        ]
+
+    def _to_bbs(self, bits: int) -> List["BasicBlock"]:
+        return sorted((self._bbs[idx] for idx in iter_bits(bits)), key=lambda bb: bb.start_pc)
+
+    @property
+    def basic_blocks(self) -> List["BasicBlock"]:
+        return list(self._bbs)
+
+    def index(self, bb: "BasicBlock") -> int:
+        """
+        Return the bit of the basic block in the bitsets
+        """
+        return self._ids[bb]
+
+    def reachable_bits(self, bb: "BasicBlock") -> int:
+        return self._reachable[self._ids[bb]]
+
+    def dominators_bits(self, bb: "BasicBlock") -> int:
+        return self._dominators[self._ids[bb]]
+
+    def post_dominators_bits(self, bb: "BasicBlock") -> int:
+        return self._post_dominators[self._ids[bb]]
+
+    def reachable(self, bb: "BasicBlock") -> List["BasicBlock"]:
+        """
+        Basic blocks reachable from bb (including bb), sorted by start address
+        """
+        return self._to_bbs(self.reachable_bits(bb))
+
+    def is_reachable(self, src: "BasicBlock", dst: "BasicBlock") -> bool:
+        return bool(self.reachable_bits(src) >> self._ids[dst] & 1)
+
+    def dominators(self, bb: "BasicBlock") -> List["BasicBlock"]:
+        """
+        Basic blocks dominating bb (including bb), sorted by start address
+        """
+        return self._to_bbs(self.dominators_bits(bb))
+
+    def dominates(self, dominator: "BasicBlock", bb: "BasicBlock") -> bool:
+        return bool(self.dominators_bits(bb) >> self._ids[dominator] & 1)
+
+    def immediate_dominator(self, bb: "BasicBlock") -> Optional["BasicBlock"]:
+        """
+        Closest strict dominator of bb. None for the entry point
+        """
+        return self._immediate(self._dominators, self._ids[bb])
+
+    def post_dominators(self, bb: "BasicBlock") -> List["BasicBlock"]:
+        """
+        Basic blocks post-dominating bb (including bb), sorted by start address
+        A basic block that does not reach an exit is only post-dominated by itself
+        """
+        return self._to_bbs(self.post_dominators_bits(bb))
+
+    def post_dominates(self, post_dominator: "BasicBlock", bb: "BasicBlock") -> bool:
+        return bool(self.post_dominators_bits(bb) >> self._ids[post_dominator] & 1)
+
+    def immediate_post_dominator(self, bb: "BasicBlock") -> Optional["BasicBlock"]:
+        """
+        Closest strict post-dominator of bb. None for the exits, and if bb reaches
+        several exits without a common post-dominator (there is no virtual exit node)
+        """
+        return self._immediate(self._post_dominators, self._ids[bb])
+
+    def _immediate(self, dominators: List[int], idx: int) -> Optional["BasicBlock"]:
+        # The strict dominators form a chain: the closest one has the most dominators
+        strict = dominators[idx] & ~(1 << idx)
+        if not strict:
+            return None
+        closest = max(iter_bits(strict), key=lambda dom: bin(dominators[dom]).count("1"))
+        return self._bbs[closest]
+
+    @property
+    def loops(self) -> List[Loop]:
+        """
+        Natural loops, sorted by the start address of their header
+        """
+        return list(self._loops)
+
+    def loop_headers(self) -> List["BasicBlock"]:
+        return [loop.header for loop in self._loops]
@@ -0,0 +1,147 @@
+import copy
+from bisect import bisect_left
+from typing import List, Optional, Set, Tuple
+
+from pyevmasm import Instruction
+
+from evm_cfg_builder.cfg.disassembler import (
+    INSTRUCTION_TEMPLATES,
+    OPCODE_NAMES,
+    disassemble,
+)
+
+
+# pylint: disable=too-many-instance-attributes
+class InstructionStore:
+    """Compact, pc-indexed representation of the instructions of a bytecode.
+
+    The instructions are kept in three flat arrays (pc, opcode, next pc),
+    filled by a single pass of the disassembler. PUSH operands are decoded during
+    the same pass, and JUMPDESTs are kept in a bitmap indexed by pc.
+
+    pyevmasm Instruction objects are only created when requested through
+    get_instruction/instructions.
+    """
+
+    __slots__ = (
+        "_bytecode",
+        "_pcs",
+        "_opcodes",
+        "_next_pcs",
+        "_operands",
+        "_jumpdests",
+        "_basic_blocks_bounds",
+        "_jumpdests_pcs",
+    )
+
+    def __init__(self, bytecode: Optional[bytes] = None) -> None:
+        disassembly = disassemble(bytecode)
+        self._bytecode = disassembly.bytecode
+        self._pcs = disassembly.pcs
+        self._opcodes = disassembly.opcodes
+        self._next_pcs = disassembly.next_pcs
+        self._operands = disassembly.operands
+        self._jumpdests = disassembly.jumpdests
+        self._basic_blocks_bounds = disassembly.basic_blocks
+        self._jumpdests_pcs: Optional[Tuple[int, ...]] = None
+
+    def __len__(self) -> int:
+        return len(self._pcs)
+
+    @property
+    def bytecode(self) -> bytes:
+        return self._bytecode
+
+    @property
+    def code_end(self) -> int:
+        """
+        Return the address following the last decoded instruction
+        """
+        if not self._next_pcs:
+            return 0
+        return self._next_pcs[-1]
+
+    def index_of(self, pc: int) -> Optional[int]:
+        """Return the index of the instruction starting at pc
+
+        :param pc: Address of the instruction
+        :return: int, None -- None if no instruction starts at pc
+        """
+        idx = bisect_left(self._pcs, pc)
+        if idx < len(self._pcs) and self._pcs[idx] == pc:
+            return idx
+        return None
+
+    @property
+    def basic_blocks_bounds(self) -> List[Tuple[int, int]]:
+        """
+        Return the (first, last) instruction indexes of each basic block, in bytecode order
+        """
+        return self._basic_blocks_bounds
+
+    def pc_at(self, idx: int) -> int:
+        return self._pcs[idx]
+
+    def next_pc_at(self, idx: int) -> int:
+        return self._next_pcs[idx]
+
+    def opcode_at(self, idx: int) -> int:
+        return self._opcodes[idx]
+
+    def name_at(self, idx: int) -> str:
+        return OPCODE_NAMES[self._opcodes[idx]]
+
+    def operand_at(self, idx: int) -> Optional[int]:
+        """Return the operand of the instruction at the index, or None if it has no operand"""
+        return self._operands.get(idx)
+
+    def text_at(self, idx: int) -> str:
+        """Return the text of the instruction at the index (as str(Instruction))"""
+        operand = self._operands.get(idx)
+        if operand is not None:
+            return f"{self.name_at(idx)} 0x{operand:x}"
+        if INSTRUCTION_TEMPLATES[self._opcodes[idx]].has_operand:
+            return f"{self.name_at(idx)} ???"
+        return self.name_at(idx)
+
+    def instruction_at(self, idx: int) -> Instruction:
+        """Create the pyevmasm Instruction at the index"""
+        instruction = copy.copy(INSTRUCTION_TEMPLATES[self._opcodes[idx]])
+        instruction.pc = self._pcs[idx]
+        operand = self.operand_at(idx)
+        if operand is not None:
+            instruction.operand = operand
+        return instruction
+
+    def get_instruction(self, pc: int) -> Optional[Instruction]:
+        """Create the pyevmasm Instruction starting at pc
+
+        :param pc: Address of the instruction
+        :return: Instruction, None -- None if no instruction starts at pc
+        """
+        idx = self.index_of(pc)
+        if idx is None:
+            return None
+        return self.instruction_at(idx)
+
+    def instructions(self, start: int = 0, end: Optional[int] = None) -> List[Instruction]:
+        """Create the pyevmasm Instructions between two indexes (end excluded)"""
+        if end is None:
+            end = len(self._pcs)
+        return [self.instruction_at(idx) for idx in range(start, end)]
+
+    def is_jumpdest(self, pc: int) -> bool:
+        return 0 <= pc < len(self._jumpdests) and self._jumpdests[pc] == 1
+
+    @property
+    def jumpdests_pcs(self) -> Tuple[int, ...]:
+        """Return the pcs that are JUMPDEST, in increasing order"""
+        if self._jumpdests_pcs is None:
+            self._jumpdests_pcs = tuple(
+                pc for pc, is_jumpdest in enumerate(self._jumpdests) if is_jumpdest
+            )
+        return self._jumpdests_pcs
+
+    def jumpdests(self) -> Set[int]:
+        """Return the set of pcs that are JUMPDEST"""
+        return set(self.jumpdests_pcs)
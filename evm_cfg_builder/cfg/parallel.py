@@ -0,0 +1,172 @@
+"""
+Run the per-function value-set analysis in a process pool
+
+Each worker rebuilds the CFG of the contract once (basic blocks and functions, without the VSA),
+and then analyzes the functions it receives. The edges, the explored basic blocks
+and the reachable basic blocks of each function are sent back as addresses, and
+merged into the CFG of the parent process.
+The workers get the time of the contract budget left when the pool starts. The memory of the
+contract budget applies to each worker.
+"""
+import multiprocessing
+from typing import Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from evm_cfg_builder.cfg.budget import AnalysisBudget
+    from evm_cfg_builder.cfg.cfg import CFG
+    from evm_cfg_builder.cfg.function import Function
+    from evm_cfg_builder.cfg.stats import AnalysisStats
+
+
+# pylint: disable=too-few-public-methods
+class FunctionCFG:
+    """CFG of a function, expressed with the start addresses of the basic blocks
+
+    - basic_blocks: basic blocks explored by the VSA, in exploration order
+    - edges: for each basic block with edges for the function (outgoing, incoming)
+    - reachable: basic blocks reachable from the function entry
+    - stats: counters of the analysis (None if unknown)
+    - incomplete_reason: why the analysis stopped before the fixpoint (None if complete)
+    """
+
+    __slots__ = ("key", "basic_blocks", "edges", "reachable", "stats", "incomplete_reason")
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        key: int,
+        basic_blocks: List[int],
+        edges: List[Tuple[int, List[int], List[int]]],
+        reachable: List[int],
+        *,
+        stats: Optional["AnalysisStats"] = None,
+        incomplete_reason: Optional[str] = None,
+    ) -> None:
+        self.key = key
+        self.basic_blocks = basic_blocks
+        self.edges = edges
+        self.reachable = reachable
+        self.stats = stats
+        self.incomplete_reason = incomplete_reason
+
+
+def export_function_cfg(cfg: "CFG", function: "Function") -> FunctionCFG:
+    """
+    Export the CFG of an analyzed function
+    Args:
+        cfg (CFG)
+        function (Function)
+    Returns:
+        FunctionCFG
+    """
+    key = function.key
+    edges = []
+    reachable = []
+    for bb in cfg.basic_blocks:
+        outgoing = bb.outgoing_basic_blocks(key)
+        incoming = bb.incoming_basic_blocks(key)
+        if outgoing or incoming:
+            edges.append(
+                (
+                    bb.start_pc,
+                    [son.start_pc for son in outgoing],
+                    [father.start_pc for father in incoming],
+                )
+            )
+        if key in bb.reacheable:
+            reachable.append(bb.start_pc)
+    return FunctionCFG(
+        key,
+        [bb.start_pc for bb in function.basic_blocks],
+        edges,
+        reachable,
+        stats=function.stats,
+        incomplete_reason=function.incomplete_reason,
+    )
+
+
+def import_function_cfg(cfg: "CFG", function: "Function", function_cfg: FunctionCFG) -> None:
+    """
+    Add the CFG of a function to the basic blocks of the cfg
+    The edges are added in the order in which they were found by the analysis
+    Args:
+        cfg (CFG)
+        function (Function)
+        function_cfg (FunctionCFG)
+    """
+    key = function.key
+    get_bb = cfg.get_basic_block_at
+    for start, outgoing, incoming in function_cfg.edges:
+        bb = get_bb(start)
+        assert bb
+        for son_start in outgoing:
+            son = get_bb(son_start)
+            assert son
+            bb.add_outgoing_basic_block(son, key)
+        for father_start in incoming:
+            father = get_bb(father_start)
+            assert father
+            bb.add_incoming_basic_block(father, key)
+    reachable = [get_bb(start) for start in function_cfg.reachable]
+    cfg.add_reachable_basic_blocks(key, [bb for bb in reachable if bb])
+    function.basic_blocks = [bb for bb in map(get_bb, function_cfg.basic_blocks) if bb]
+    function.stats = function_cfg.stats
+    function.incomplete_reason = function_cfg.incomplete_reason
+
+
+# CFG of the contract analyzed by the worker process
+_worker_cfg: Optional["CFG"] = None
+
+
+def _init_worker(
+    bytecode: bytes, optimization_enabled: bool, budget: Optional["AnalysisBudget"]
+) -> None:
+    # pylint: disable=import-outside-toplevel,global-statement
+    from evm_cfg_builder.cfg.cfg import CFG
+
+    global _worker_cfg
+    _worker_cfg = CFG(
+        bytecode,
+        remove_metadata=False,
+        optimization_enabled=optimization_enabled,
+        compute_cfgs=False,
+        budget=budget,
+    )
+
+
+def _analyze_in_worker(key: int) -> FunctionCFG:
+    cfg = _worker_cfg
+    assert cfg is not None
+    function = cfg.get_function_by_key(key)
+    assert function is not None
+    cfg.compute_function_cfg(function)
+    function_cfg = export_function_cfg(cfg, function)
+    # Drop the function's edges, they are not needed anymore by the worker
+    cfg.edges.remove_key(key)
+    return function_cfg
+
+
+def analyze_functions(
+    cfg: "CFG", functions: List["Function"], workers: int
+) -> Iterator[Tuple["Function", FunctionCFG]]:
+    """
+    Analyze the functions in a pool of processes
+    The results are yielded in the order of the functions
+    Args:
+        cfg (CFG)
+        functions (list(Function))
+        workers (int): number of processes
+    Returns:
+        iterator of (Function, FunctionCFG)
+    """
+    assert cfg.bytecode is not None
+    with multiprocessing.Pool(
+        processes=workers,
+        initializer=_init_worker,
+        initargs=(cfg.bytecode, cfg.optimization_enabled, cfg.remaining_budget()),
+    ) as pool:
+        keys = [function.key for function in functions]
+        for function, function_cfg in zip(
+            functions, pool.imap(_analyze_in_worker, keys, chunksize=1)
+        ):
+            yield function, function_cfg
@@ -0,0 +1,145 @@
+"""
+Instrumentation of the analysis: timers of the phases and counters of the value-set analysis
+
+CFG.stats accumulates the time of each phase of the contract:
+- convert: conversion of the bytecode and removal of the metadata
+- basic_blocks: disassembly, split in basic blocks and static edges
+- functions: recovery and naming of the functions
+- vsa: value-set analysis of the functions (with workers: sum of the times in the workers)
+- export: export of the graphs (export_cfg)
+Function.stats holds the counters of the value-set analysis of the function.
+A callback given to the CFG is called at the end of each phase, and after the analysis of
+each function.
+"""
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from evm_cfg_builder.cfg.cfg import CFG
+    from evm_cfg_builder.cfg.function import Function
+
+PHASES = ("convert", "basic_blocks", "functions", "vsa", "export")
+
+# Called with the name of the phase, the function analyzed (for the "vsa" phase, None otherwise)
+# and the time of the phase in seconds
+StatsCallback = Callable[[str, Optional["Function"], float], None]
+
+
+# pylint: disable=too-many-instance-attributes
+class AnalysisStats:
+    """Counters of the value-set analysis of a function
+
+    - time: duration of the analysis, in seconds
+    - explorations: runs of the worklist (one more each time new branches are found)
+    - transfers: calls to the transfer function of a basic block
+    - merges: merges of the stacks of the predecessors of a basic block
+    - widenings: widenings of the input stack of a loop header
+    - summaries: applications of the summary of a subroutine to the stack of a call
+    - max_exploration_reached: basic blocks explored MAXEXPLORATION times
+    - edges_found: edges found by the analysis
+    - peak_stack_depth: depth of the deepest abstract stack
+    """
+
+    __slots__ = (
+        "time",
+        "explorations",
+        "transfers",
+        "merges",
+        "widenings",
+        "summaries",
+        "max_exploration_reached",
+        "edges_found",
+        "peak_stack_depth",
+    )
+
+    def __init__(self) -> None:
+        self.time = 0.0
+        self.explorations = 0
+        self.transfers = 0
+        self.merges = 0
+        self.widenings = 0
+        self.summaries = 0
+        self.max_exploration_reached = 0
+        self.edges_found = 0
+        self.peak_stack_depth = 0
+
+    def __repr__(self) -> str:
+        return f"<AnalysisStats {self.to_json()}>"
+
+    def add(self, stats: "AnalysisStats") -> None:
+        """
+        Add the counters of stats. The peak stack depth is the maximum of both
+        """
+        for name in self.__slots__:
+            if name == "peak_stack_depth":
+                self.peak_stack_depth = max(self.peak_stack_depth, stats.peak_stack_depth)
+            else:
+                setattr(self, name, getattr(self, name) + getattr(stats, name))
+
+    def to_json(self) -> Dict[str, Any]:
+        json_stats: Dict[str, Any] = {name: getattr(self, name) for name in self.__slots__}
+        json_stats["time"] = round(self.time, 6)
+        return json_stats
+
+
+class CFGStats:
+    """Time of each phase of the analysis of a contract"""
+
+    def __init__(self, callback: Optional[StatsCallback] = None) -> None:
+        self._callback = callback
+        self._phases: Dict[str, float] = {}
+
+    @property
+    def phases(self) -> Dict[str, float]:
+        """
+        Time of each phase run, in seconds
+        """
+        return dict(self._phases)
+
+    def record(self, name: str, elapsed: float, function: Optional["Function"] = None) -> None:
+        """
+        Add the time of a phase, and call the callback
+        """
+        self._phases[name] = self._phases.get(name, 0.0) + elapsed
+        if self._callback is not None:
+            self._callback(name, function, elapsed)
+
+    def clear(self) -> None:
+        self._phases = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Time the phase. Nothing is recorded if the phase raises an exception
+        """
+        start = time.perf_counter()
+        yield
+        self.record(name, time.perf_counter() - start)
+
+
+def stats_report(cfg: "CFG") -> Dict[str, Any]:
+    """
+    Return the JSON report of the phases of the contract, and of the analysis of each function
+    The functions that were not analyzed (CFG not computed, or loaded from the cache)
+    have no stats. "incomplete" is the reason why the analysis of the function stopped, if any
+    """
+    total = AnalysisStats()
+    functions: List[Dict[str, Any]] = []
+    for function in cfg.functions:
+        stats = function.stats
+        if stats is not None:
+            total.add(stats)
+        functions.append(
+            {
+                "name": function.name,
+                "hash_id": hex(function.hash_id),
+                "stats": stats.to_json() if stats is not None else None,
+                "incomplete": function.incomplete_reason,
+            }
+        )
+    return {
+        "phases": {name: round(elapsed, 6) for name, elapsed in cfg.stats.phases.items()},
+        "total": total.to_json(),
+        "functions": functions,
+    }
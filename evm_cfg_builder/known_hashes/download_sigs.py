@@ -1,90 +1,253 @@
 """
 Queries and import function signatures from https://www.4byte.directory/
+
+The pages are fetched concurrently through one pooled HTTP session, ordered by creation
+date, so that the new signatures are always on the last pages. The progress is saved
+in a checkpoint file: an interrupted run restarts from the last page fetched, and a new run
+only fetches the pages added since the previous one.
+Only the selectors not already known are merged into the selector table.
 """
+import argparse
+import json
+import os
 import sys
-from typing import Tuple, Dict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Union
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except ImportError:
     print('Run "pip install requests" t run this script')
     sys.exit(0)
-import known_hashes
+from evm_cfg_builder.known_hashes import known_hashes
+from evm_cfg_builder.known_hashes.selector_table import SelectorTable, write_selector_table
+
+DEFAULT_URL = "https://www.4byte.directory/api/v1/signatures/"
+DEFAULT_CHECKPOINT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "download_sigs.checkpoint.json"
+)
+
+
+class Checkpoint:
+    """Progress of the synchronization
+
+    - last_page: last page fetched, all the previous pages were fetched as well
+    - page_size: number of results per page
+    - pending: new signatures fetched, not yet saved in the selector table
+
+    The checkpoint file only stores the pages fetched. The pending signatures are appended
+    to a journal (the path of the checkpoint + ".journal", one json object per save), so that
+    a save only writes the signatures found since the previous one.
+    """
 
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.last_page = 0
+        self.page_size = 0
+        self.pending: Dict[int, str] = {}
+        # Pending signatures not written in the journal yet
+        self._unsaved: Dict[int, str] = {}
+
+    def add(self, selector: int, signature: str) -> None:
+        self.pending[selector] = signature
+        self._unsaved[selector] = signature
+
+    @staticmethod
+    def load(path: str, url: str) -> "Checkpoint":
+        """
+        Load the checkpoint. Return an empty checkpoint if there is none for the url
+        """
+        checkpoint = Checkpoint(url)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+        if not isinstance(data, dict) or data.get("url") != url:
+            # The journal belongs to another checkpoint
+            _remove(_journal_path(path))
+            return checkpoint
+        checkpoint.last_page = data["last_page"]
+        checkpoint.page_size = data["page_size"]
+        checkpoint.pending = _read_journal(_journal_path(path))
+        return checkpoint
+
+    def save(self, path: str) -> None:
+        if self._unsaved:
+            with open(_journal_path(path), "a", encoding="utf-8") as f:
+                f.write(json.dumps({f"{k:#010x}": v for k, v in self._unsaved.items()}) + "\n")
+            self._unsaved = {}
+        data = {"url": self.url, "last_page": self.last_page, "page_size": self.page_size}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def clear_pending(self, path: str) -> None:
+        """
+        Forget the pending signatures, once they are saved in the selector table
+        """
+        self.pending = {}
+        self._unsaved = {}
+        _remove(_journal_path(path))
+        self.save(path)
+
+
+def _journal_path(path: str) -> str:
+    return path + ".journal"
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _read_journal(path: str) -> Dict[int, str]:
+    """
+    Return the signatures of the journal
+    The last line is incomplete if a save was interrupted: it is removed from the file
+    """
+    pending: Dict[int, str] = {}
+    try:
+        with open(path, "rb+") as f:
+            offset = 0
+            for line in f:
+                try:
+                    entries = json.loads(line)
+                except ValueError:
+                    f.truncate(offset)
+                    break
+                pending.update((int(k, 16), v) for k, v in entries.items())
+                offset += len(line)
+    except OSError:
+        pass
+    return pending
+
+
+def create_session(max_workers: int) -> requests.Session:
+    """
+    Create an HTTP session, with one connection per worker, retrying on server errors
+    """
+    session = requests.Session()
+    retries = Retry(total=5, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
-def get_results(url: str, num_parsed: int) -> Tuple[str, int]:
+
+def get_page(session: requests.Session, url: str, page: int, timeout: float) -> Dict[str, Any]:
     """
     Queries the API for a json formatted list of functions and their associated function signatures
     """
-    resp = requests.get(url)
+    params: Dict[str, Union[str, int]] = {"ordering": "created_at", "page": page}
+    resp = session.get(url, params=params, timeout=timeout)
     resp.raise_for_status()
+    return resp.json()
 
-    json_data = resp.json()
-    next_url: str = json_data["next"]
-    results = json_data["results"]
 
-    cur_parsed = 0
-    for result in results:
-        hex_sig = result["hex_signature"]
-        text_sig = result["text_signature"]
+def merge_results(json_data: Dict[str, Any], checkpoint: Checkpoint, table: SelectorTable) -> None:
+    """
+    Add the signatures of a page to the pending signatures, if their selector is not already known
+    """
+    for result in json_data["results"]:
+        # hex_sig is a 'str', parse it into an 'int'
+        selector = int(result["hex_signature"], 16)
         # If a key already exists, do not overwrite it. This helps cover the corner
         # case of a hash collision. An example of this is
         # owner() and ideal_warn_timed(uint256,uint128)
-        if int(hex_sig, 16) not in known_hashes.known_hashes:
-            # hex_sig is a 'str', parse it into an 'int'
-            known_hashes.known_hashes[int(hex_sig, 16)] = text_sig
-
-        cur_parsed += 1
-
-    num_parsed += cur_parsed
-    # Display a status update
-    percentage_comp = num_parsed / json_data["count"] * 100
-    print(f"Parsed {num_parsed}/{json_data['count']} results ({percentage_comp:.2f}%)")
-
-    return next_url, cur_parsed
-
-
-def iterate_paginated_results(url: str) -> None:
+        if selector not in table and selector not in checkpoint.pending:
+            checkpoint.add(selector, result["text_signature"])
+
+
+# pylint: disable=too-many-locals,too-many-arguments
+def sync(
+    url: str = DEFAULT_URL,
+    max_workers: int = 8,
+    checkpoint_path: str = DEFAULT_CHECKPOINT,
+    timeout: float = 30,
+    checkpoint_every: int = 50,
+    *,
+    table: SelectorTable = known_hashes.known_hashes,
+) -> Checkpoint:
     """
-    4byte paginates the results for effeciency because there are > 400,000 function signatures.
-    This will move from page to page and collect all the signatures available.
+    Fetch the pages following the checkpoint
+    The pages are fetched concurrently, and merged in order. The checkpoint is saved
+    every checkpoint_every pages merged, and at the end
+    Only the signatures whose selector is not in the table are kept
     """
-    results_parsed = 0
-    while True:
-        url, num_parsed = get_results(url, results_parsed)
-        if not url:
-            break
-
-        results_parsed += num_parsed
-
-    print("Finished iterating over results")
-
-
-def sort_dict(unsorted_dict: Dict) -> Dict:
-    sorted_dict = dict(sorted(unsorted_dict.items()))
-    return sorted_dict
-
-
-def save_results() -> None:
+    checkpoint = Checkpoint.load(checkpoint_path, url)
+    session = create_session(max_workers)
+
+    # The last page fetched might have been incomplete: fetch it again
+    first_page = max(checkpoint.last_page, 1)
+    first = get_page(session, url, first_page, timeout)
+    if not checkpoint.page_size:
+        checkpoint.page_size = len(first["results"]) or 1
+    count = first["count"]
+    last_page = max(-(-count // checkpoint.page_size), first_page)
+    merge_results(first, checkpoint, table)
+    checkpoint.last_page = first_page
+    print(f"{count} signatures, fetching pages {first_page} to {last_page}")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures: Dict[int, "Future[Dict[str, Any]]"] = {}
+        next_page = first_page + 1
+        try:
+            while checkpoint.last_page < last_page:
+                # Keep at most 2 pages per worker in flight
+                while next_page <= last_page and len(futures) < 2 * max_workers:
+                    futures[next_page] = executor.submit(get_page, session, url, next_page, timeout)
+                    next_page += 1
+                page = checkpoint.last_page + 1
+                merge_results(futures.pop(page).result(), checkpoint, table)
+                checkpoint.last_page = page
+                if page % checkpoint_every == 0:
+                    checkpoint.save(checkpoint_path)
+                    print(f"Fetched {page}/{last_page} pages ({len(checkpoint.pending)} new)")
+        finally:
+            for future in futures.values():
+                future.cancel()
+            checkpoint.save(checkpoint_path)
+
+    print(f"Finished iterating over results ({len(checkpoint.pending)} new)")
+    return checkpoint
+
+
+def save_results(
+    checkpoint: Checkpoint,
+    checkpoint_path: str = DEFAULT_CHECKPOINT,
+    table: SelectorTable = known_hashes.known_hashes,
+) -> None:
     """
-    Write the dict to the known_hashes.py file
-    We write the key and value as shown below to maintain the current format
-    of the key being an int - displayed as hex (4 bytes).
+    Merge the new signatures into the selector table (known_hashes.bin by default)
+    The table is only rewritten if there are new signatures
     """
-    sorted_dict = sort_dict(known_hashes.known_hashes)
-    with open("known_hashes.py", "w", encoding="utf-8") as f:
-        f.write("known_hashes = {\n")
-        for k, v in sorted_dict.items():
-            # format the key as so
-            # pad the output with 0's (#0)
-            # pad the output to 10 char's (10)
-            # format into hex representation (x)
-            f.write(f"  {k:#010x}: '{v}',\n")
-        f.write("}\n")
+    if not checkpoint.pending:
+        print("No new signature")
+        return
+    for selector, signature in checkpoint.pending.items():
+        table[selector] = signature
+    write_selector_table(table.path, dict(table.items()))
+    checkpoint.clear_pending(checkpoint_path)
 
     print("Saved results!")
 
 
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Download the signatures from 4byte")
+    parser.add_argument("--url", default=DEFAULT_URL, help="Signatures API")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent requests")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Checkpoint file")
+    parser.add_argument("--timeout", type=float, default=30, help="Timeout per request")
+    args = parser.parse_args()
+    checkpoint = sync(args.url, args.workers, args.checkpoint, args.timeout)
+    save_results(checkpoint, args.checkpoint)
+
+
 if __name__ == "__main__":
-    iterate_paginated_results("https://www.4byte.directory/api/v1/signatures/")
-    save_results()
+    main()
@@ -0,0 +1,14 @@
+"""
+Known function signatures, indexed by selector
+
+The signatures are stored in known_hashes.bin, a selector table generated by download_sigs.py.
+The table is memory-mapped on the first lookup. Signatures added at runtime
+(known_hashes[selector] = signature) are kept in memory, and take precedence over the table.
+"""
+import os
+
+from evm_cfg_builder.known_hashes.selector_table import SelectorTable
+
+KNOWN_HASHES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "known_hashes.bin")
+
+known_hashes = SelectorTable(KNOWN_HASHES_PATH)
@@ -0,0 +1,177 @@
+"""
+Compact table of function selectors, stored in a binary file
+
+Format (integers are little-endian uint32):
+- header: MAGIC, number of selectors (n)
+- keys: the n selectors, sorted
+- offsets: n + 1 offsets of the signatures in the blob
+- blob: the utf-8 signatures, concatenated
+
+The file is memory-mapped on the first lookup and queried by binary search, so the table
+is never loaded in memory, and processes using the same file share its pages.
+"""
+import logging
+import mmap
+import os
+import struct
+from typing import Dict, Iterator, Mapping, Optional, Tuple
+
+logger = logging.getLogger("evm-cfg-builder")
+
+MAGIC = b"EVMSEL01"
+_HEADER = struct.Struct("<8sI")
+_UINT32 = struct.Struct("<I")
+
+
+def write_selector_table(path: str, signatures: Mapping[int, str]) -> None:
+    """
+    Write the signatures in a selector table file
+    Args:
+        path (str)
+        signatures (dict int -> str): selector -> signature
+    """
+    keys = sorted(signatures)
+    blobs = [signatures[key].encode("utf-8") for key in keys]
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(keys)))
+        f.write(struct.pack(f"<{len(keys)}I", *keys))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(b"".join(blobs))
+    os.replace(tmp_path, path)
+
+
+# pylint: disable=too-many-instance-attributes
+class SelectorTable:
+    """Read-only selector table file, with an in-memory overlay
+
+    Supports the lookups of a dict (in, [], get) and __setitem__. The assigned signatures
+    are kept in the overlay, and take precedence over the file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._overlay: Dict[int, str] = {}
+        self._loaded = False
+        self._mmap: Optional[mmap.mmap] = None
+        self._count = 0
+        self._keys_offset = 0
+        self._offsets_offset = 0
+        self._blob_offset = 0
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def _load(self) -> None:
+        self._loaded = True
+        try:
+            with open(self._path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < _HEADER.size:
+                    raise ValueError("truncated file")
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            logger.debug(f"No selector table at {self._path}")
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Invalid selector table {self._path}: {e}")
+            return
+
+        magic, count = _HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC:
+            logger.warning(f"Invalid selector table {self._path}: unknown format")
+            mapped.close()
+            return
+        keys_offset = _HEADER.size
+        offsets_offset = keys_offset + 4 * count
+        blob_offset = offsets_offset + 4 * (count + 1)
+        truncated = len(mapped) < blob_offset
+        if not truncated:
+            # The last offset is the size of the blob
+            blob_size = _UINT32.unpack_from(mapped, blob_offset - 4)[0]
+            truncated = blob_offset + blob_size > len(mapped)
+        if truncated:
+            logger.warning(f"Invalid selector table {self._path}: truncated file")
+            mapped.close()
+            return
+        self._mmap = mapped
+        self._count = count
+        self._keys_offset = keys_offset
+        self._offsets_offset = offsets_offset
+        self._blob_offset = blob_offset
+
+    def _key_at(self, idx: int) -> int:
+        assert self._mmap is not None
+        return _UINT32.unpack_from(self._mmap, self._keys_offset + 4 * idx)[0]
+
+    def _signature_at(self, idx: int) -> str:
+        assert self._mmap is not None
+        start, end = struct.unpack_from("<2I", self._mmap, self._offsets_offset + 4 * idx)
+        return self._mmap[self._blob_offset + start : self._blob_offset + end].decode("utf-8")
+
+    def _index_of(self, key: int) -> Optional[int]:
+        if not self._loaded:
+            self._load()
+        if self._mmap is None or not 0 <= key <= 0xFFFFFFFF:
+            return None
+        low = 0
+        high = self._count
+        while low < high:
+            mid = (low + high) // 2
+            if self._key_at(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self._count and self._key_at(low) == key:
+            return low
+        return None
+
+    def get(self, key: int, default: Optional[str] = None) -> Optional[str]:
+        if key in self._overlay:
+            return self._overlay[key]
+        idx = self._index_of(key)
+        if idx is None:
+            return default
+        return self._signature_at(idx)
+
+    def __getitem__(self, key: int) -> str:
+        signature = self.get(key)
+        if signature is None:
+            raise KeyError(key)
+        return signature
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, int):
+            return False
+        return key in self._overlay or self._index_of(key) is not None
+
+    def __setitem__(self, key: int, signature: str) -> None:
+        self._overlay[key] = signature
+
+    def _file_items(self) -> Iterator[Tuple[int, str]]:
+        if not self._loaded:
+            self._load()
+        for idx in range(self._count):
+            yield self._key_at(idx), self._signature_at(idx)
+
+    def items(self) -> Iterator[Tuple[int, str]]:
+        """
+        Iterate over the (selector, signature), the overlay first
+        """
+        yield from self._overlay.items()
+        for key, signature in self._file_items():
+            if key not in self._overlay:
+                yield key, signature
+
+    def __iter__(self) -> Iterator[int]:
+        for key, _ in self.items():
+            yield key
+
+    def __len__(self) -> int:
+        if not self._loaded:
+            self._load()
+        return self._count + sum(1 for key in self._overlay if self._index_of(key) is None)
@@ -0,0 +1,581 @@
+"""
+Generator of synthetic contracts, to stress and measure the value-set analysis
+
+The contracts follow the shape of the solc output, and are built from parameters:
+- selectors: number of public functions, dispatched by a chain of `DUP1 PUSH4 selector EQ PUSH2
+tag JUMPI` (split in a tree of `GT` comparisons with dispatcher_split)
+- call_depth: length of the chain of internal calls made by each public function. The internal
+calls follow the solc convention: the caller pushes the return address and the argument,
+and the callee returns with `SWAP1 JUMP`
+- fan_in: number of callers sharing each subroutine, and call_sites: number of calls of its
+callee made by each caller. A subroutine has fan_in * call_sites return addresses
+- loop_nesting: depth of the nest of counting loops in the leaves of the call graph
+- jumpdests: minimal number of JUMPDESTs. Basic blocks made of a single JUMPDEST are added to the
+bodies until the bytecode has this number of JUMPDESTs
+
+The generator knows the target of each jump, and returns the ground-truth CFG of the contract
+(basic blocks and edges), and of each function. The edges of a function are context sensitive:
+a subroutine returns only to the call sites of the function. compare_to_cfg reports the
+differences with the CFG recovered by the analysis.
+The bytecode has no metadata, and the jump destinations are PUSH2: the code is limited to 64KB.
+
+Usage:
+    python -m evm_cfg_builder.synthetic output_prefix --selectors 500 --call-depth 4
+writes output_prefix.evm (hex runtime bytecode) and output_prefix.json (ground truth)
+"""
+import argparse
+import json
+import random
+from typing import Any, Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from evm_cfg_builder.cfg.disassembler import OPCODE_NAMES
+from evm_cfg_builder.cfg.function import Function
+
+if TYPE_CHECKING:
+    from evm_cfg_builder.cfg.cfg import CFG
+
+_OPCODES: Dict[str, int] = {name: opcode for opcode, name in enumerate(OPCODE_NAMES)}
+_TERMINATORS = {"STOP", "RETURN", "REVERT", "INVALID", "SELFDESTRUCT", "JUMP", "JUMPI"}
+# Size of the jump destinations (PUSH2)
+_LABEL_SIZE = 2
+# Initial value of the loop counters
+_LOOP_COUNT = 10
+
+Edge = Tuple[int, int]
+
+
+# pylint: disable=too-few-public-methods,too-many-instance-attributes
+class SyntheticParameters:
+    """Parameters of a synthetic contract"""
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        selectors: int = 4,
+        *,
+        call_depth: int = 1,
+        fan_in: int = 1,
+        call_sites: int = 1,
+        loop_nesting: int = 0,
+        jumpdests: int = 0,
+        dispatcher_split: int = 0,
+        seed: int = 0,
+    ) -> None:
+        """
+        Args:
+            selectors (int): number of public functions
+            call_depth (int): length of the chain of internal calls of each public function
+            fan_in (int): number of callers of each subroutine
+            call_sites (int): number of calls of its callee made by each caller
+            loop_nesting (int): depth of the nest of loops in the leaves of the call graph
+            jumpdests (int): minimal number of JUMPDESTs of the bytecode
+            dispatcher_split (int): split the dispatcher in a tree if there are more selectors.
+                0 for a chain of comparisons
+            seed (int): seed of the selectors
+        """
+        if selectors < 1 or fan_in < 1 or call_sites < 1:
+            raise ValueError("selectors, fan_in and call_sites must be positive")
+        if call_depth < 0 or loop_nesting < 0 or jumpdests < 0 or dispatcher_split < 0:
+            raise ValueError(
+                "call_depth, loop_nesting, jumpdests and dispatcher_split must be >= 0"
+            )
+        self.selectors = selectors
+        self.call_depth = call_depth
+        self.fan_in = fan_in
+        self.call_sites = call_sites
+        self.loop_nesting = loop_nesting
+        self.jumpdests = jumpdests
+        self.dispatcher_split = dispatcher_split
+        self.seed = seed
+
+    def to_json(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+
+class _Unit:
+    """Contiguous code of the dispatcher, of a function or of a subroutine"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = 0
+        self.end = 0
+        # Units called, and return labels of the calls made to this unit
+        self.callees: List["_Unit"] = []
+        self.return_labels: List[int] = []
+        self.entry_label: Optional[int] = None
+
+
+class _Assembler:
+    """Two-pass assembler: the labels are resolved once the code is complete"""
+
+    def __init__(self) -> None:
+        # (opcode, operand size, operand, label)
+        self._code: List[Tuple[int, int, int, Optional[int]]] = []
+        self._labels: List[Optional[int]] = []
+        # Index of the JUMP/JUMPI -> target labels, or the unit returning
+        self._jumps: Dict[int, List[int]] = {}
+        self._returns: Dict[int, _Unit] = {}
+        self.units: List[_Unit] = []
+        self._unit: Optional[_Unit] = None
+
+    def new_label(self) -> int:
+        self._labels.append(None)
+        return len(self._labels) - 1
+
+    def begin_unit(self, unit: _Unit) -> None:
+        unit.start = len(self._code)
+        self.units.append(unit)
+        self._unit = unit
+
+    def end_unit(self) -> None:
+        assert self._unit is not None
+        self._unit.end = len(self._code)
+        self._unit = None
+
+    def op(self, *names: str) -> None:
+        for name in names:
+            self._code.append((_OPCODES[name], 0, 0, None))
+
+    def push(self, value: int, size: Optional[int] = None) -> None:
+        if size is None:
+            size = max(1, (value.bit_length() + 7) // 8)
+        self._code.append((_OPCODES[f"PUSH{size}"], size, value, None))
+
+    def mark(self, label: int) -> None:
+        """
+        Place the label on a JUMPDEST
+        """
+        self._labels[label] = len(self._code)
+        self.op("JUMPDEST")
+
+    def jump(self, label: int, conditional: bool = False) -> None:
+        self._code.append((_OPCODES[f"PUSH{_LABEL_SIZE}"], _LABEL_SIZE, 0, label))
+        self._jumps[len(self._code)] = [label]
+        self.op("JUMPI" if conditional else "JUMP")
+
+    def call(self, callee: _Unit) -> None:
+        """
+        Call the subroutine with the top of the stack as argument. The result is added to it
+        """
+        assert self._unit is not None and callee.entry_label is not None
+        return_label = self.new_label()
+        self._unit.callees.append(callee)
+        callee.return_labels.append(return_label)
+        self._code.append((_OPCODES[f"PUSH{_LABEL_SIZE}"], _LABEL_SIZE, 0, return_label))
+        self.op("DUP2")
+        self.jump(callee.entry_label)
+        self.mark(return_label)
+        self.op("ADD")
+
+    def ret(self) -> None:
+        assert self._unit is not None
+        self.op("SWAP1")
+        self._returns[len(self._code)] = self._unit
+        self.op("JUMP")
+
+    def count(self, name: str) -> int:
+        return sum(1 for opcode, _, _, _ in self._code if opcode == _OPCODES[name])
+
+    def assemble(self) -> Tuple[bytes, List[int], Dict[int, Set[int]]]:
+        """
+        Returns:
+            bytes, list(int), dict: the bytecode, the pc of each instruction, and the pcs of
+            the targets of each jump (indexed by pc)
+        """
+        pcs = []
+        pc = 0
+        for _, size, _, _ in self._code:
+            pcs.append(pc)
+            pc += 1 + size
+        if pc > 1 << (8 * _LABEL_SIZE):
+            raise ValueError(f"The code is too large ({pc} bytes)")
+        label_pcs = [pcs[idx] if idx is not None else 0 for idx in self._labels]
+
+        code = bytearray()
+        for opcode, size, operand, label in self._code:
+            code.append(opcode)
+            if size:
+                value = label_pcs[label] if label is not None else operand
+                code += value.to_bytes(size, "big")
+
+        targets = {
+            pcs[idx]: {label_pcs[label] for label in labels} for idx, labels in self._jumps.items()
+        }
+        for idx, unit in self._returns.items():
+            targets[pcs[idx]] = {label_pcs[label] for label in unit.return_labels}
+        for unit in self.units:
+            unit.start = pcs[unit.start]
+            unit.end = pcs[unit.end] if unit.end < len(pcs) else pc
+        return bytes(code), pcs, targets
+
+
+class GroundTruthFunction:
+    """Expected CFG of a function"""
+
+    def __init__(
+        self, name: str, key: int, entry: int, basic_blocks: List[int], edges: List[Edge]
+    ) -> None:
+        """
+        Args:
+            name (str): name of the function
+            key (int): key of the function (selector, or Function.FALLBACK_ID/DISPATCHER_ID)
+            entry (int): start address
+            basic_blocks (list(int)): start addresses of the basic blocks, sorted
+            edges (list((int, int))): edges between the start addresses, sorted
+        """
+        self.name = name
+        self.key = key
+        self.entry = entry
+        self.basic_blocks = basic_blocks
+        self.edges = edges
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "key": self.key,
+            "entry": self.entry,
+            "basic_blocks": self.basic_blocks,
+            "edges": [list(edge) for edge in self.edges],
+        }
+
+
+class SyntheticContract:
+    """Runtime bytecode and ground-truth CFG of a synthetic contract"""
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        parameters: SyntheticParameters,
+        bytecode: bytes,
+        basic_blocks: List[Edge],
+        edges: List[Edge],
+        functions: List[GroundTruthFunction],
+    ) -> None:
+        self.parameters = parameters
+        self.bytecode = bytecode
+        # (start, end) addresses of the basic blocks, sorted
+        self.basic_blocks = basic_blocks
+        self.edges = edges
+        self.functions = functions
+
+    @property
+    def jumpdests(self) -> int:
+        return sum(
+            1 for start, _ in self.basic_blocks if self.bytecode[start] == _OPCODES["JUMPDEST"]
+        )
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "parameters": self.parameters.to_json(),
+            "bytecode": "0x" + self.bytecode.hex(),
+            "basic_blocks": [list(bb) for bb in self.basic_blocks],
+            "edges": [list(edge) for edge in self.edges],
+            "functions": [function.to_json() for function in self.functions],
+        }
+
+
+def _selectors(parameters: SyntheticParameters) -> List[int]:
+    rng = random.Random(parameters.seed)
+    selectors: Set[int] = set()
+    while len(selectors) < parameters.selectors:
+        selectors.add(rng.randrange(1, 1 << 32))
+    return sorted(selectors)
+
+
+def _dispatch(asm: _Assembler, selectors: List[int], entries: Dict[int, int], split: int) -> None:
+    """
+    Chain of comparisons, or tree of GT comparisons if there are more than split selectors
+    The selector is on the top of the stack
+    """
+    if split and len(selectors) > split:
+        middle = len(selectors) // 2
+        lower = asm.new_label()
+        asm.op("DUP1")
+        asm.push(selectors[middle], 4)
+        asm.op("GT")
+        asm.jump(lower, conditional=True)
+        _dispatch(asm, selectors[middle:], entries, split)
+        asm.mark(lower)
+        _dispatch(asm, selectors[:middle], entries, split)
+        return
+    for selector in selectors:
+        asm.op("DUP1")
+        asm.push(selector, 4)
+        asm.op("EQ")
+        asm.jump(entries[selector], conditional=True)
+    asm.push(0)
+    asm.op("DUP1", "REVERT")
+
+
+def _loops(asm: _Assembler, nesting: int) -> None:
+    """
+    Nest of counting loops. The counter is on the top of the stack during the loop
+    """
+    if not nesting:
+        return
+    head = asm.new_label()
+    end = asm.new_label()
+    asm.push(_LOOP_COUNT)
+    asm.mark(head)
+    asm.op("DUP1", "ISZERO")
+    asm.jump(end, conditional=True)
+    _loops(asm, nesting - 1)
+    asm.push(1)
+    asm.op("SWAP1", "SUB")
+    asm.jump(head)
+    asm.mark(end)
+    asm.op("POP")
+
+
+def _body(
+    asm: _Assembler, callee: Optional[_Unit], parameters: SyntheticParameters, padding: int
+) -> None:
+    """
+    Body of a function or of a subroutine. The argument is on the top of the stack
+    """
+    for _ in range(padding):
+        asm.op("JUMPDEST")
+    if callee is None:
+        _loops(asm, parameters.loop_nesting)
+        return
+    for _ in range(parameters.call_sites):
+        asm.call(callee)
+
+
+def _padding(total: int, units: int, idx: int) -> int:
+    return total // units + (1 if idx < total % units else 0)
+
+
+def _dispatcher(
+    asm: _Assembler, selectors: List[int], entries: Dict[int, int], fallback: int, split: int
+) -> None:
+    """
+    Dispatcher, followed by the fallback function
+    """
+    asm.begin_unit(_Unit("_dispatcher"))
+    asm.push(0x80)
+    asm.push(0x40)
+    asm.op("MSTORE")
+    asm.push(4)
+    asm.op("CALLDATASIZE", "LT")
+    asm.jump(fallback, conditional=True)
+    asm.push(0)
+    asm.op("CALLDATALOAD")
+    asm.push(0xE0)
+    asm.op("SHR")
+    _dispatch(asm, selectors, entries, split)
+    asm.end_unit()
+
+    asm.begin_unit(_Unit("_fallback"))
+    asm.mark(fallback)
+    asm.op("STOP")
+    asm.end_unit()
+
+
+# pylint: disable=too-many-locals
+def _build(parameters: SyntheticParameters, padding: int) -> _Assembler:
+    asm = _Assembler()
+    selectors = _selectors(parameters)
+    # Subroutines of each level, from the deepest one
+    levels: List[List[_Unit]] = []
+    callers = parameters.selectors
+    for _ in range(parameters.call_depth):
+        callers = (callers + parameters.fan_in - 1) // parameters.fan_in
+        names = [f"subroutine_{len(levels)}_{idx}" for idx in range(callers)]
+        levels.append([_Unit(name) for name in names])
+    # From the deepest level
+    levels.reverse()
+    bodies = parameters.selectors + sum(len(level) for level in levels)
+
+    fallback = asm.new_label()
+    entries = {selector: asm.new_label() for selector in selectors}
+    for level in levels:
+        for subroutine in level:
+            subroutine.entry_label = asm.new_label()
+
+    _dispatcher(asm, selectors, entries, fallback, parameters.dispatcher_split)
+
+    body_idx = 0
+    first_level = levels[-1] if levels else []
+    for idx, selector in enumerate(selectors):
+        asm.begin_unit(_Unit(hex(selector)))
+        asm.mark(entries[selector])
+        asm.push(4)
+        asm.op("CALLDATALOAD")
+        callee = first_level[idx // parameters.fan_in] if first_level else None
+        _body(asm, callee, parameters, _padding(padding, bodies, body_idx))
+        body_idx += 1
+        asm.push(0)
+        asm.op("MSTORE")
+        asm.push(0x20)
+        asm.push(0)
+        asm.op("RETURN")
+        asm.end_unit()
+
+    for depth, level in reversed(list(enumerate(levels))):
+        next_level = levels[depth - 1] if depth else []
+        for idx, subroutine in enumerate(level):
+            asm.begin_unit(subroutine)
+            assert subroutine.entry_label is not None
+            asm.mark(subroutine.entry_label)
+            callee = next_level[idx // parameters.fan_in] if next_level else None
+            _body(asm, callee, parameters, _padding(padding, bodies, body_idx))
+            body_idx += 1
+            asm.ret()
+            asm.end_unit()
+    return asm
+
+
+def _split(
+    bytecode: bytes, pcs: List[int], targets: Dict[int, Set[int]]
+) -> Tuple[List[Edge], List[Edge]]:
+    """
+    Returns:
+        list((int, int)), list((int, int)): the (start, end) addresses of the basic blocks,
+        and the edges
+    """
+    names = [OPCODE_NAMES[bytecode[pc]] for pc in pcs]
+    starts = {0}
+    for idx, (pc, name) in enumerate(zip(pcs, names)):
+        if name == "JUMPDEST":
+            starts.add(pc)
+        if name in _TERMINATORS and idx + 1 < len(pcs):
+            starts.add(pcs[idx + 1])
+
+    basic_blocks: List[Edge] = []
+    edges: List[Edge] = []
+    start = 0
+    for idx, (pc, name) in enumerate(zip(pcs, names)):
+        next_pc = pcs[idx + 1] if idx + 1 < len(pcs) else None
+        if next_pc is not None and next_pc not in starts:
+            continue
+        basic_blocks.append((start, pc))
+        if name in ("JUMP", "JUMPI"):
+            edges += [(start, target) for target in sorted(targets[pc])]
+        if next_pc is not None and (name == "JUMPI" or name not in _TERMINATORS):
+            edges.append((start, next_pc))
+        if next_pc is not None:
+            start = next_pc
+    return basic_blocks, edges
+
+
+# pylint: disable=too-many-locals
+def _ground_truth(
+    asm: _Assembler, parameters: SyntheticParameters, selectors: List[int]
+) -> SyntheticContract:
+    bytecode, pcs, targets = asm.assemble()
+    basic_blocks, edges = _split(bytecode, pcs, targets)
+
+    functions = []
+    keys = {"_dispatcher": Function.DISPATCHER_ID, "_fallback": Function.FALLBACK_ID}
+    keys.update({hex(selector): selector for selector in selectors})
+    for unit in asm.units:
+        if unit.name not in keys:
+            continue
+        # The units called, transitively. All their basic blocks are reachable
+        reached = {unit.name: unit}
+        worklist = [unit]
+        while worklist:
+            for callee in worklist.pop().callees:
+                if callee.name not in reached:
+                    reached[callee.name] = callee
+                    worklist.append(callee)
+        function_bbs = {
+            bb_start
+            for bb_start, _ in basic_blocks
+            if any(u.start <= bb_start < u.end for u in reached.values())
+        }
+        # The edges of the dispatcher include the jumps to the functions. For the other functions,
+        # the return edges to the callers outside of the function are filtered out
+        function_edges = [
+            (src, dst)
+            for src, dst in edges
+            if src in function_bbs and (dst in function_bbs or unit.name == "_dispatcher")
+        ]
+        functions.append(
+            GroundTruthFunction(
+                unit.name, keys[unit.name], unit.start, sorted(function_bbs), sorted(function_edges)
+            )
+        )
+    return SyntheticContract(parameters, bytecode, basic_blocks, sorted(set(edges)), functions)
+
+
+def generate(parameters: SyntheticParameters) -> SyntheticContract:
+    """
+    Generate the runtime bytecode and the ground-truth CFG of a synthetic contract
+    Args:
+        parameters (SyntheticParameters)
+    Returns:
+        SyntheticContract
+    Raises:
+        ValueError: if the bytecode is larger than 64KB
+    """
+    asm = _build(parameters, 0)
+    missing = parameters.jumpdests - asm.count("JUMPDEST")
+    if missing > 0:
+        asm = _build(parameters, missing)
+    return _ground_truth(asm, parameters, _selectors(parameters))
+
+
+def compare_to_cfg(contract: SyntheticContract, cfg: "CFG") -> List[str]:
+    """
+    Compare the CFG recovered by the analysis to the ground truth
+    Returns:
+        list(str): differences, empty if the CFGs are identical
+    """
+    differences = []
+    for expected in contract.functions:
+        function = cfg.get_function_by_key(expected.key)
+        if function is None:
+            differences.append(f"{expected.name}: function not found")
+            continue
+        bbs = {bb.start_pc for bb in function.basic_blocks}
+        edges = {
+            (bb.start_pc, son.start_pc)
+            for bb in function.basic_blocks
+            for son in bb.outgoing_basic_blocks(function.key)
+        }
+        for label, found, wanted in (
+            ("basic blocks", bbs, set(expected.basic_blocks)),
+            ("edges", edges, set(expected.edges)),
+        ):
+            if found != wanted:
+                differences.append(
+                    f"{expected.name}: {len(wanted - found)} {label} missing, "
+                    f"{len(found - wanted)} unexpected"
+                )
+    return differences
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic contract and its ground-truth CFG",
+        usage="python -m evm_cfg_builder.synthetic output_prefix [options]",
+    )
+    parser.add_argument("output", help="Write output.evm (runtime bytecode) and output.json")
+    defaults = SyntheticParameters()
+    for name, value in defaults.to_json().items():
+        parser.add_argument(
+            f"--{name.replace('_', '-')}", type=int, default=value, help=f"(default {value})"
+        )
+    args = parser.parse_args()
+
+    try:
+        parameters = SyntheticParameters(
+            **{name: getattr(args, name) for name in defaults.to_json()}
+        )
+        contract = generate(parameters)
+    except ValueError as e:
+        parser.error(str(e))
+    with open(f"{args.output}.evm", "w", encoding="utf-8") as f:
+        f.write("0x" + contract.bytecode.hex())
+    with open(f"{args.output}.json", "w", encoding="utf-8") as f:
+        json.dump(contract.to_json(), f)
+    print(
+        f"{args.output}.evm: {len(contract.bytecode)} bytes, {len(contract.basic_blocks)} basic blocks,"
+        f" {contract.jumpdests} JUMPDESTs, {len(contract.edges)} edges"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,680 @@
+"""
+Abstract domain of the value-set analysis
+
+An element of the stack (AbsStackElem) is a set of potential values, interned by an
+AbsStackElemTable. The stacks are persistent linked lists of StackNode: a copy of a stack only
+copies its top, and the stacks derived from the same stack share their cells.
+merge_stack joins the stacks reaching the same basic block.
+"""
+import itertools
+from typing import AbstractSet, Dict, FrozenSet, List, Optional, Set, Tuple, Union
+
+
+class AbsStackElem:
+    """Represent an element of the stack
+
+    An element is a set of potential values.
+    There are at max MAXVALS number of values, otherwise it is set to TOP
+
+    TOP is representented as None
+
+    []     --> [1, 2, None, 3...]  --> None
+    Init   --> [ up to 10 vals ]   --  TOP
+
+    If a value is not known, it is None.
+    Note that we make the difference between the list beeing TOP, and one
+    of the value inside the list beeing TOP. The idea is that even if one
+    of the value is not known, we can list keep track of the known values.
+
+    Thus our analysis is an under-approximation of an over-approximation
+    and is not sound.
+
+    Elements are immutable, and are created through an AbsStackElemTable.
+    The table interns the elements: two elements with the same values are
+    the same object.
+    """
+
+    __slots__ = ("_vals", "_table")
+
+    def __init__(
+        self, table: "AbsStackElemTable", vals: Optional[FrozenSet[Optional[int]]]
+    ) -> None:
+        self._vals = vals
+        self._table = table
+
+    def get_vals(self) -> Optional[FrozenSet[Optional[int]]]:
+        """
+            Return the values. The return must be checked for TOP (None)
+
+        Returns:
+            set of int, or None
+        """
+        return self._vals
+
+    def absAnd(self, elem: "AbsStackElem") -> "AbsStackElem":
+        """
+            AND between two AbsStackElem
+        Args:
+            elem (AbsStackElem)
+        Returns:
+            AbsStackElem: Element containing the result of the AND between
+            the values. If one of the absStackElem is TOP, returns TOP
+        """
+        return self._table.abs_and(self, elem)
+
+    def merge(self, elem: "AbsStackElem") -> "AbsStackElem":
+        """
+            Merge between two AbsStackElem
+        Args:
+            elem (AbsStackElem)
+        Returns:
+            AbsStackElem: Element containing the result of the merge
+                          If one of the absStackElem is TOP, returns TOP
+        """
+        return self._table.merge(self, elem)
+
+    def equals(self, elems: "AbsStackElem") -> bool:
+        """
+            Return True if equal
+            Elements are interned, so two equal elements are the same object
+
+        Args:
+            elem (AbsStackElem)
+        Returns:
+            bool: True if the two absStackElem are equals. If both are TOP
+            returns True
+        """
+        return self is elems
+
+    def get_copy(self) -> "AbsStackElem":
+        """
+            Return of copy of the object. Elements are immutable, so this is the object itself
+        Returns:
+            AbsStackElem
+        """
+        return self
+
+    def __str__(self) -> str:
+        """
+            String representation
+        Returns:
+            str
+        """
+        if self._vals is None:
+            return str(None)
+        return str(set(self._vals))
+
+
+class AbsStackElemTable:
+    """Intern table of the AbsStackElem of an analysis
+
+    The table keeps one AbsStackElem per set of values.
+    The cells of the stacks are interned as well: two stacks with the same
+    elements share their cells, and only differ by the cells above their common part.
+    If authorized_values is not empty (optimization enabled), only the authorized values are
+    tracked, any other value being represented by None
+    """
+
+    def __init__(self, authorized_values: Optional[Set[int]]) -> None:
+        self._authorized_values: Set[int] = authorized_values if authorized_values else set()
+        self._elems: Dict[Optional[FrozenSet[Optional[int]]], AbsStackElem] = {}
+        self._nodes: Dict[Tuple[AbsStackElem, Optional["StackNode"]], "StackNode"] = {}
+
+        # Maximum number of values inside the set. If > MAXVALS -> TOP
+        self._max_number_of_elements = 100
+        if self._authorized_values:
+            # If we know the set of targets, we can change the max number of elements in the set
+            self._max_number_of_elements = len(self._authorized_values)
+
+        self.top = self.get(None)
+        self.empty = self.get(frozenset())
+
+    @property
+    def authorized_values(self) -> Set[int]:
+        return self._authorized_values
+
+    @property
+    def max_number_of_elements(self) -> int:
+        return self._max_number_of_elements
+
+    def get(self, vals: Optional[AbstractSet[Optional[int]]]) -> AbsStackElem:
+        """
+            Return the element representing the values
+        Args:
+            vals (set of int, or None): List of values, or TOP
+        Returns:
+            AbsStackElem
+        """
+        key = None if vals is None else frozenset(vals)
+        elem = self._elems.get(key)
+        if elem is None:
+            elem = AbsStackElem(self, key)
+            self._elems[key] = elem
+        return elem
+
+    def node(self, elem: AbsStackElem, next_node: Optional["StackNode"]) -> "StackNode":
+        """
+            Return the stack cell holding elem on top of next_node
+        Args:
+            elem (AbsStackElem)
+            next_node (StackNode, or None): None for the bottom of the stack
+        Returns:
+            StackNode
+        """
+        key = (elem, next_node)
+        node = self._nodes.get(key)
+        if node is None:
+            node = StackNode(elem, next_node)
+            self._nodes[key] = node
+        return node
+
+    def _filter(self, nbr: Optional[int]) -> Optional[int]:
+        """
+        Return the value tracked for nbr
+        Only keep track of values that are JMPDEST, if the optimization is enabled
+        """
+        if self._authorized_values and nbr not in self._authorized_values:
+            return None
+        return nbr
+
+    def from_value(self, nbr: Optional[int]) -> AbsStackElem:
+        """
+            Return the element containing one value
+        Args:
+            nbr (int, None)
+        Returns:
+            AbsStackElem
+        """
+        return self.get({self._filter(nbr)})
+
+    def abs_and(self, elem1: AbsStackElem, elem2: AbsStackElem) -> AbsStackElem:
+        v1 = elem1.get_vals()
+        v2 = elem2.get_vals()
+        if v1 is None or v2 is None:
+            return self.top
+
+        vals: Set[Optional[int]] = set()
+        for (a, b) in itertools.product(v1, v2):
+            if a is None or b is None:
+                vals.add(None)
+            else:
+                vals.add(self._filter(a & b))
+        if len(vals) > self._max_number_of_elements:
+            return self.top
+        return self.get(vals)
+
+    def merge(self, elem1: AbsStackElem, elem2: AbsStackElem) -> AbsStackElem:
+        v1 = elem1.get_vals()
+        v2 = elem2.get_vals()
+        if v1 is None or v2 is None:
+            return self.top
+        vals = v1 | v2
+        if len(vals) > self._max_number_of_elements:
+            return self.top
+        return self.get(vals)
+
+    def merge_all(self, elems: List[AbsStackElem]) -> AbsStackElem:
+        """
+            Merge a list of elements
+        Args:
+            elems (list of AbsStackElem)
+        Returns:
+            AbsStackElem: TOP if one element is TOP, or if there are too many values
+        """
+        _max_number_of_elements = self._max_number_of_elements
+        vals: Set[Optional[int]] = set()
+        for elem in elems:
+            next_vals = elem.get_vals()
+            if next_vals is None:
+                return self.top
+            vals |= next_vals
+            if len(vals) > _max_number_of_elements:
+                return self.top
+        return self.get(vals)
+
+
+class BitsetAbsStackElem(AbsStackElem):
+    """Element of a BitsetAbsStackElemTable
+
+    The values are encoded in an int (None for TOP), and are only decoded
+    to a set when get_vals is called.
+    """
+
+    __slots__ = ("_bits", "_decoded")
+
+    def __init__(self, table: "BitsetAbsStackElemTable", bits: Optional[int]) -> None:
+        super().__init__(table, None)
+        self._bits = bits
+        self._decoded = False
+
+    @property
+    def bits(self) -> Optional[int]:
+        return self._bits
+
+    def get_vals(self) -> Optional[FrozenSet[Optional[int]]]:
+        if not self._decoded:
+            if self._bits is not None:
+                assert isinstance(self._table, BitsetAbsStackElemTable)
+                self._vals = self._table.decode(self._bits)
+            self._decoded = True
+        return self._vals
+
+
+class BitsetAbsStackElemTable(AbsStackElemTable):
+    """Intern table of the AbsStackElem, when only the JUMPDESTs are tracked
+
+    The i-th authorized value (by increasing order) is represented by the bit i,
+    and the unknown value (None) by the bit following the last authorized value.
+    A merge is a bitwise OR, and as a set contains at most all the authorized values
+    and None, it has too many values only if all the bits are set.
+    """
+
+    def __init__(self, authorized_values: Set[int]) -> None:
+        assert authorized_values
+        self._pcs: List[int] = sorted(authorized_values)
+        self._index: Dict[int, int] = {pc: idx for idx, pc in enumerate(self._pcs)}
+        self._unknown_bit = 1 << len(self._pcs)
+        self._all_bits = (self._unknown_bit << 1) - 1
+        self._elems_by_bits: Dict[Optional[int], BitsetAbsStackElem] = {}
+        super().__init__(authorized_values)
+        self.unknown = self.from_value(None)
+
+    def encode(self, vals: AbstractSet[Optional[int]]) -> int:
+        """
+        Return the bits representing the values
+        Values that are not authorized are represented as None
+        """
+        bits = 0
+        index = self._index
+        for val in vals:
+            idx = index.get(val) if val is not None else None
+            bits |= self._unknown_bit if idx is None else 1 << idx
+        return bits
+
+    def decode(self, bits: int) -> FrozenSet[Optional[int]]:
+        """
+        Return the values represented by the bits
+        """
+        vals: Set[Optional[int]] = set()
+        pcs = self._pcs
+        number_of_pcs = len(pcs)
+        while bits:
+            lowest_bit = bits & -bits
+            idx = lowest_bit.bit_length() - 1
+            vals.add(pcs[idx] if idx < number_of_pcs else None)
+            bits ^= lowest_bit
+        return frozenset(vals)
+
+    def get_bits(self, bits: Optional[int]) -> BitsetAbsStackElem:
+        """
+            Return the element represented by the bits
+        Args:
+            bits (int, or None): None for TOP
+        Returns:
+            BitsetAbsStackElem
+        """
+        if bits == self._all_bits:
+            bits = None
+        elem = self._elems_by_bits.get(bits)
+        if elem is None:
+            elem = BitsetAbsStackElem(self, bits)
+            self._elems_by_bits[bits] = elem
+        return elem
+
+    def get(self, vals: Optional[AbstractSet[Optional[int]]]) -> AbsStackElem:
+        return self.get_bits(None if vals is None else self.encode(vals))
+
+    def from_value(self, nbr: Optional[int]) -> AbsStackElem:
+        idx = self._index.get(nbr) if nbr is not None else None
+        return self.get_bits(self._unknown_bit if idx is None else 1 << idx)
+
+    @staticmethod
+    def _bits(elem: AbsStackElem) -> Optional[int]:
+        assert isinstance(elem, BitsetAbsStackElem)
+        return elem.bits
+
+    def abs_and(self, elem1: AbsStackElem, elem2: AbsStackElem) -> AbsStackElem:
+        bits1 = self._bits(elem1)
+        bits2 = self._bits(elem2)
+        if bits1 is None or bits2 is None:
+            return self.top
+        if not bits1 or not bits2:
+            return self.empty
+        # The AND with an unknown value is unknown
+        if self._unknown_bit in (bits1, bits2):
+            return self.unknown
+        return super().abs_and(elem1, elem2)
+
+    def merge(self, elem1: AbsStackElem, elem2: AbsStackElem) -> AbsStackElem:
+        bits1 = self._bits(elem1)
+        bits2 = self._bits(elem2)
+        if bits1 is None or bits2 is None:
+            return self.top
+        return self.get_bits(bits1 | bits2)
+
+    def merge_all(self, elems: List[AbsStackElem]) -> AbsStackElem:
+        bits = 0
+        for elem in elems:
+            elem_bits = self._bits(elem)
+            if elem_bits is None:
+                return self.top
+            bits |= elem_bits
+        return self.get_bits(bits)
+
+
+# pylint: disable=too-few-public-methods
+class StackNode:
+    """
+    Cell of a persistent stack, created through AbsStackElemTable.node
+    A node is never modified once created: the nodes below the top are shared
+    between all the stacks derived from the same stack
+    """
+
+    __slots__ = ("elem", "next", "depth")
+
+    def __init__(self, elem: AbsStackElem, next_node: Optional["StackNode"]) -> None:
+        self.elem = elem
+        self.next = next_node
+        self.depth: int = next_node.depth + 1 if next_node else 1
+
+
+class Stack:
+    """
+    Stack representation
+    The stack is updated throyugh the push/pop/dup operation, and returns
+    itself
+    The elements are stored in a persistent linked list (top first). A copy of the stack
+    only copies the reference to the top, and the operations only allocate the cells they change
+    """
+
+    def __init__(self, table: AbsStackElemTable, head: Optional[StackNode] = None) -> None:
+        self._head: Optional[StackNode] = head
+        self._table: AbsStackElemTable = table
+
+    @property
+    def table(self) -> AbsStackElemTable:
+        return self._table
+
+    @property
+    def authorized_values(self) -> Set[int]:
+        return self._table.authorized_values
+
+    @property
+    def head(self) -> Optional[StackNode]:
+        """
+        Return the cell at the top of the stack (None if the stack is empty)
+        """
+        return self._head
+
+    def depth(self) -> int:
+        return self._head.depth if self._head else 0
+
+    def copy_stack(self, stack: "Stack") -> None:
+        """
+            Copy the given stack
+            The cells are immutable, and are shared between the two stacks
+
+        Args:
+            Stack: stack to copy
+        """
+        self._head = stack.head
+
+    def push(self, elem: Optional[Union[AbsStackElem, int]]) -> None:
+        """
+            Push an elem. If the elem is not an AbsStackElem, create a new
+            AbsStackElem
+        Args:
+            elem (AbsStackElem, or str or None): If str, it should be the
+            hexadecimal repr
+        """
+        if not isinstance(elem, AbsStackElem):
+            elem = self._table.from_value(elem)
+
+        self._head = self._table.node(elem, self._head)
+
+    def insert(self, elem: Optional[Union[AbsStackElem, int]]) -> None:
+        """
+        Insert an elem at the bottom of the stack
+        The whole stack is re-allocated
+        """
+        if not isinstance(elem, AbsStackElem):
+            elem = self._table.from_value(elem)
+
+        self.set_elems([elem] + self.get_elems())
+
+    def pop(self) -> AbsStackElem:
+        """
+            Pop an element.
+        Returns:
+            AbsStackElem
+        """
+        if self._head is None:
+            self.push(None)
+
+        assert self._head is not None
+        elem = self._head.elem
+        self._head = self._head.next
+        return elem
+
+    def swap(self, n: int) -> None:
+        """
+            Swap operation
+        Args:
+            n (int)
+        """
+        if self.depth() >= (n + 1):
+            # Only the n + 1 cells at the top are re-allocated
+            node = self._head
+            elems = []
+            for _ in range(n + 1):
+                assert node is not None
+                elems.append(node.elem)
+                node = node.next
+            elems[0], elems[n] = elems[n], elems[0]
+            for elem in reversed(elems):
+                node = self._table.node(elem, node)
+            self._head = node
+
+        # if we swap more than the size of the stack,
+        # we can assume that elements are missing on the stack
+        else:
+            top = self.top()
+            missing_elems = n - self.depth() + 1
+            elems = [self._table.from_value(None)] * missing_elems + self.get_elems()
+            elems[-1 - n] = top
+            self.set_elems(elems)
+
+    def dup(self, n: int) -> None:
+        """
+        Dup operation
+        """
+        if self.depth() >= n:
+            node = self._head
+            for _ in range(n - 1):
+                assert node is not None
+                node = node.next
+            assert node is not None
+            self.push(node.elem)
+        else:
+            self.push(None)
+
+    def get_elems(self) -> List[AbsStackElem]:
+        """
+            Returns the stack elements (the top is the last element)
+            The list is built on each call
+        Returns:
+            List AbsStackElem
+        """
+        elems = []
+        node = self._head
+        while node is not None:
+            elems.append(node.elem)
+            node = node.next
+        elems.reverse()
+        return elems
+
+    def set_elems(self, elems: List[AbsStackElem]) -> None:
+        """
+            Set the stack elements
+        Args:
+            elems (list of AbsStackElem)
+        """
+        node = None
+        for elem in elems:
+            node = self._table.node(elem, node)
+        self._head = node
+
+    def merge(self, stack: "Stack") -> "Stack":
+        """
+            Merge two stack. Returns a new object
+            The stacks are aligned on their top, the cells below the shorter stack are shared
+        Arg:
+            stack (Stack)
+        Returns: New object representing the merge
+        """
+        node1 = self._head
+        node2 = stack.head
+        elems = []
+        # Merge elements
+        while node1 is not None and node2 is not None and node1 is not node2:
+            elems.append(node1.elem.merge(node2.elem))
+            node1 = node1.next
+            node2 = node2.next
+        if node1 is node2:
+            tail = node1
+        else:
+            tail = node1 if node1 is not None else node2
+        for elem in reversed(elems):
+            tail = self._table.node(elem, tail)
+        return Stack(self._table, tail)
+
+    def equals(self, stack: "Stack") -> bool:
+        """
+            Test equality between two stack
+            Stop at the first cell shared by the two stacks
+        Args:
+            stack (Stack)
+        Returns:
+            bool: True if the stacks are equals
+        """
+        if self.depth() != stack.depth():
+            return False
+        node1 = self._head
+        node2 = stack.head
+        while node1 is not node2:
+            assert node1 is not None and node2 is not None
+            if node1.elem is not node2.elem:
+                return False
+            node1 = node1.next
+            node2 = node2.next
+        return True
+
+    def top(self) -> AbsStackElem:
+        """
+            Return the element at the top (without pop)
+        Returns:
+            AbsStackElem
+        """
+        if self._head is None:
+            self.push(None)
+        assert self._head is not None
+        return self._head.elem
+
+    def __str__(self) -> str:
+        """
+        String representation (only first 5 items)
+        """
+        return str([str(x) for x in self.get_elems()[-100::]])
+
+
+def merge_stack(stacks: List[Stack], table: AbsStackElemTable) -> Stack:
+    """
+        Merge two stack. Returns a new object
+        The stacks are aligned on their bottom. They are walked from the top
+        until they reach a cell shared by all of them, which becomes the tail of the merged stack
+    Arg:
+        stack (Stack)
+    Returns: New object representing the merge
+    """
+
+    # Merged elements, from the top, or (top, stop) for a segment
+    # of cells of the deepest stack above the other stacks
+    parts: List[Union[AbsStackElem, Tuple[StackNode, StackNode]]] = []
+
+    heads = [stack.head for stack in stacks if stack.head is not None]
+    tail: Optional[StackNode] = None
+    while heads:
+        first = heads[0]
+        if all(node is first for node in heads):
+            tail = first
+            break
+        depths = sorted((node.depth for node in heads), reverse=True)
+        if len(depths) > 1 and depths[1] < depths[0]:
+            # Only the deepest stack has elements down to the next stack
+            parts.append(_pop_segment(heads, depths[1]))
+        else:
+            parts.append(_pop_column(heads, depths[0], table))
+
+    for part in reversed(parts):
+        if isinstance(part, AbsStackElem):
+            tail = table.node(part, tail)
+        else:
+            tail = _move_segment(part[0], part[1], tail, table)
+    return Stack(table, tail)
+
+
+def _pop_segment(heads: List[StackNode], depth: int) -> Tuple[StackNode, StackNode]:
+    """
+        Move the deepest of the heads down to depth
+    Returns:
+        (StackNode, StackNode): top of the segment, and the cell below the segment
+    """
+    deepest = max(range(len(heads)), key=lambda i: heads[i].depth)
+    segment_top = node = heads[deepest]
+    while node.depth > depth:
+        assert node.next is not None
+        node = node.next
+    heads[deepest] = node
+    return segment_top, node
+
+
+def _pop_column(heads: List[StackNode], depth: int, table: AbsStackElemTable) -> AbsStackElem:
+    """
+        Merge the elements of the heads at depth, and move these heads to their next cell
+    Returns:
+        AbsStackElem: the merged element
+    """
+    column = [node.elem for node in heads if node.depth == depth]
+    next_heads = [node.next if node.depth == depth else node for node in heads]
+    heads[:] = [node for node in next_heads if node is not None]
+    first_elem = column[0]
+    # Elements are interned: if all the stacks share the element, it is kept as it is
+    if all(elem is first_elem for elem in column):
+        return first_elem
+    return table.merge_all(column)
+
+
+def _move_segment(
+    segment_top: StackNode,
+    stop: StackNode,
+    tail: Optional[StackNode],
+    table: AbsStackElemTable,
+) -> StackNode:
+    """
+        Put the cells from segment_top to stop (excluded) on top of tail
+        The cells are re-allocated only if tail is not stop
+    Returns:
+        StackNode: the new top
+    """
+    if tail is stop:
+        return segment_top
+    elems = []
+    node: Optional[StackNode] = segment_top
+    while node is not stop:
+        assert node is not None
+        elems.append(node.elem)
+        node = node.next
+    for elem in reversed(elems):
+        tail = table.node(elem, tail)
+    assert tail is not None
+    return tail
@@ -0,0 +1,214 @@
+"""
+Effects of the basic blocks on the abstract stack, compiled once per contract
+
+The transfer function of the value-set analysis interprets the instructions of a basic block each
+time the basic block is explored. Instead, the basic block is run once with a symbolic stack
+(see value_analysis.terms), and its effect is recorded:
+- consumed: number of elements of the stack read or popped
+- cells: terms pushed once they are popped. A term is a constant (PUSH), an element of the stack
+before the basic block (moved or copied by SWAP and DUP), or the AND of two terms
+- target: term of the target of the last JUMP/JUMPI
+Applying the effect reads the consumed elements, and pushes the cells resolved with them.
+
+The effect is only applied to a stack with at least consumed elements. The transfer function
+completes a stack too short with unknown values, in a way that depends on the instruction
+(see Stack.swap): the basic block is interpreted in that case.
+"""
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from evm_cfg_builder.cfg.disassembler import INSTRUCTION_TEMPLATES
+from evm_cfg_builder.value_analysis.terms import (
+    AndTerm,
+    SlotTerm,
+    SymbolicStack,
+    Term,
+    TermTable,
+    UnsupportedTerm,
+)
+from evm_cfg_builder.value_analysis.abstract_stack import (
+    AbsStackElem,
+    AbsStackElemTable,
+    BitsetAbsStackElemTable,
+    Stack,
+)
+
+if TYPE_CHECKING:
+    from evm_cfg_builder.cfg.basic_block import BasicBlock
+    from evm_cfg_builder.cfg.cfg import CFG
+    from evm_cfg_builder.cfg.instruction_store import InstructionStore
+
+
+def transfer_symbolic(
+    store: "InstructionStore", idx: int, stack: SymbolicStack, terms: TermTable
+) -> None:
+    """
+    Same as StackValueAnalysis._transfer_func_ins, on terms, for the instruction at the index
+    """
+    table = terms.table
+    op = store.name_at(idx)
+    if op.startswith("PUSH"):
+        stack.push(table.from_value(store.operand_at(idx)))
+    elif op.startswith("SWAP"):
+        stack.swap(int(op[4:]))
+    elif op.startswith("DUP"):
+        stack.dup(int(op[3:]))
+    elif op == "AND":
+        v1 = stack.pop()
+        v2 = stack.pop()
+        stack.push(terms.abs_and(v1, v2))
+    else:
+        template = INSTRUCTION_TEMPLATES[store.opcode_at(idx)]
+        for _ in range(template.pops):
+            stack.pop()
+        for _ in range(template.pushes):
+            stack.push(table.from_value(None))
+
+
+def _slots(term: Term) -> List[int]:
+    if isinstance(term, SlotTerm):
+        return [term.index]
+    if isinstance(term, AndTerm):
+        return _slots(term.left) + _slots(term.right)
+    return []
+
+
+def _resolve(
+    term: Term,
+    elems: List[AbsStackElem],
+    table: AbsStackElemTable,
+    converted: Dict[AbsStackElem, AbsStackElem],
+) -> AbsStackElem:
+    if isinstance(term, SlotTerm):
+        return elems[term.index]
+    if isinstance(term, AndTerm):
+        return table.abs_and(
+            _resolve(term.left, elems, table, converted),
+            _resolve(term.right, elems, table, converted),
+        )
+    assert isinstance(term, AbsStackElem)
+    elem = converted.get(term)
+    if elem is None:
+        elem = table.get(term.get_vals())
+        converted[term] = elem
+    return elem
+
+
+# pylint: disable=too-few-public-methods
+class BlockEffect:
+    """Effect of a basic block on the stack
+
+    - consumed: number of elements of the stack read or popped
+    - cells: terms pushed once they are popped (the top is the last element)
+    - target: term of the target of the last JUMP/JUMPI, None if the basic block does not end
+    with a jump
+    The cells at the bottom that are the elements popped, at the same place, are not re-pushed
+    """
+
+    __slots__ = ("consumed", "cells", "target", "_kept", "_reads")
+
+    def __init__(self, stack: SymbolicStack, target: Optional[Term]) -> None:
+        self.consumed = stack.consumed
+        self.cells: Tuple[Term, ...] = tuple(stack.cells)
+        self.target = target
+        kept = 0
+        for cell in self.cells:
+            if not isinstance(cell, SlotTerm) or cell.index != self.consumed - 1 - kept:
+                break
+            kept += 1
+        self._kept = kept
+        # Elements read from the top: the elements popped, and the elements used by the terms
+        slots = [index for cell in self.cells[kept:] for index in _slots(cell)]
+        if target is not None:
+            slots += _slots(target)
+        self._reads = max([self.consumed - kept] + [index + 1 for index in slots])
+
+    def apply(
+        self, stack: Stack, converted: Dict[AbsStackElem, AbsStackElem]
+    ) -> Tuple[Optional[AbsStackElem], Stack]:
+        """
+            Apply the effect to a stack with at least consumed elements
+        Args:
+            stack (Stack)
+            converted (dict(AbsStackElem -> AbsStackElem)): constants of the effect converted
+                to the table of the stack, updated by the call
+        Returns:
+            (AbsStackElem, Stack): the target of the jump (None if there is no jump),
+                and the stack after the basic block
+        """
+        table = stack.table
+        elems = []
+        node = stack.head
+        tail = node
+        popped = self.consumed - self._kept
+        for idx in range(self._reads):
+            if idx == popped:
+                tail = node
+            assert node is not None
+            elems.append(node.elem)
+            node = node.next
+        if popped == self._reads:
+            tail = node
+        for idx in range(self._kept, len(self.cells)):
+            tail = table.node(_resolve(self.cells[idx], elems, table, converted), tail)
+        target = None
+        if self.target is not None:
+            target = _resolve(self.target, elems, table, converted)
+        return target, Stack(table, tail)
+
+
+def compile_basic_block(
+    store: "InstructionStore", start_idx: int, end_idx: int, terms: TermTable
+) -> BlockEffect:
+    """
+    Run the instructions between two indexes (both included) on a symbolic stack
+    Raise UnsupportedTerm if a term is too large
+    """
+    stack = SymbolicStack(terms)
+    for idx in range(start_idx, end_idx):
+        transfer_symbolic(store, idx, stack, terms)
+    target: Optional[Term] = None
+    if store.name_at(end_idx) in ["JUMP", "JUMPI"]:
+        target = stack.peek(0)
+    transfer_symbolic(store, end_idx, stack, terms)
+    return BlockEffect(stack, target)
+
+
+class BlockEffects:
+    """Effects of the basic blocks of a contract, compiled when first needed
+
+    The constants are elements of a table of the contract, with the values tracked by the
+    analysis (only the JUMPDESTs if the optimization is enabled). The terms are shared with
+    the summaries of the subroutines.
+    """
+
+    def __init__(self, cfg: "CFG") -> None:
+        authorized_values: Set[int] = set()
+        if cfg.optimization_enabled:
+            authorized_values = cfg.instruction_store.jumpdests()
+        table: AbsStackElemTable
+        if authorized_values:
+            table = BitsetAbsStackElemTable(authorized_values)
+        else:
+            table = AbsStackElemTable(authorized_values)
+        self._store = cfg.instruction_store
+        self._terms = TermTable(table)
+        self._effects: Dict[int, Optional[BlockEffect]] = {}
+
+    @property
+    def terms(self) -> TermTable:
+        return self._terms
+
+    def effect(self, bb: "BasicBlock") -> Optional[BlockEffect]:
+        """
+        Return the effect of the basic block, None if it cannot be compiled (term too large)
+        """
+        addr = bb.start_pc
+        if addr in self._effects:
+            return self._effects[addr]
+        effect: Optional[BlockEffect]
+        try:
+            effect = compile_basic_block(self._store, bb.start_idx, bb.end_idx, self._terms)
+        except UnsupportedTerm:
+            effect = None
+        self._effects[addr] = effect
+        return effect
@@ -0,0 +1,363 @@
+"""
+Summaries of the internal subroutines, shared by the value-set analysis of all the functions
+
+An internal subroutine (SafeMath, _transfer, a modifier, ..) is called with a basic block
+pushing the return address, the arguments, and jumping to the entry of the subroutine:
+    PUSH ret .. PUSH entry JUMP
+and it returns by jumping to the return address, taken from the stack of the caller.
+
+The summary of a subroutine is computed once per contract, by applying the effects of the basic
+blocks of its body (see value_analysis.block_effects) to a symbolic stack: the elements of the
+stack at the entry are slots (0 for the top), and the values computed from them are terms
+(see value_analysis.terms) resolved with the stack of the call site.
+The jumps to a constant are edges of the body, and the calls to another summarized subroutine
+are applied to the symbolic stack. The jumps whose target depends on the stack at the entry
+are the exits of the subroutine. For each exit, the summary records the target and the stack
+after the jump: the number of entry slots consumed, and the cells pushed above them. The return
+of the subroutine is the exit whose target is one slot (return_slot).
+
+A body that cannot be summarized (stacks of different heights merged, recursive calls, terms or
+loops too large) has no summary, and is explored by the analysis of each function.
+
+The summaries can find more basic blocks than the exploration of the bodies, and the extra
+basic blocks are reachable. The exploration merges the stacks of all the call sites at the entry
+of a subroutine, aligned on their bottom. When the call sites have stacks of different heights,
+their return addresses are in different slots, and the return only reaches the call sites whose
+address is in the slot read by the final JUMP: the code after the other call sites is missed.
+For example, reinvest() of tests/fomo3d.sol calls myDividends() from two call sites. The second
+return is lost without summaries, and with it the call to purchaseTokens().
+A summary is applied to the stack of each call site, and returns to each of them.
+"""
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from evm_cfg_builder.value_analysis.terms import (
+    SlotTerm,
+    StackResolver,
+    SymbolicStack,
+    Term,
+    TermTable,
+    UnsupportedTerm,
+)
+from evm_cfg_builder.value_analysis.abstract_stack import AbsStackElem, Stack
+
+if TYPE_CHECKING:
+    from evm_cfg_builder.cfg.basic_block import BasicBlock
+    from evm_cfg_builder.cfg.cfg import CFG
+
+# Visits of a basic block of the body before giving up the summary
+MAX_VISITS = 16
+
+
+# pylint: disable=too-few-public-methods
+class SubroutineExit:
+    """Jump of the body whose target depends on the stack at the entry
+
+    - basic_block: basic block of the jump
+    - target: term of the target
+    - consumed: number of entry slots popped after the jump
+    - cells: terms pushed above them (the top is the last element)
+    """
+
+    __slots__ = ("basic_block", "target", "consumed", "cells")
+
+    def __init__(self, basic_block: "BasicBlock", target: Term, stack: SymbolicStack) -> None:
+        self.basic_block = basic_block
+        self.target = target
+        self.consumed = stack.consumed
+        self.cells: Tuple[Term, ...] = tuple(stack.cells)
+
+    @property
+    def return_slot(self) -> Optional[int]:
+        """
+        Slot of the return address, if the exit is a return of the subroutine
+        """
+        return self.target.index if isinstance(self.target, SlotTerm) else None
+
+
+class SubroutineSummary:
+    """Summary of a subroutine
+
+    - entry: first basic block
+    - basic_blocks: basic blocks of the body, including the subroutines called
+    - edges: edges of the body (the static edges are not included)
+    - exits: jumps leaving the body
+    """
+
+    __slots__ = ("entry", "basic_blocks", "edges", "exits")
+
+    def __init__(
+        self,
+        entry: "BasicBlock",
+        basic_blocks: List["BasicBlock"],
+        edges: List[Tuple["BasicBlock", "BasicBlock"]],
+        exits: List[SubroutineExit],
+    ) -> None:
+        self.entry = entry
+        self.basic_blocks = basic_blocks
+        self.edges = edges
+        self.exits = exits
+
+    def __repr__(self) -> str:
+        return (
+            f"<SubroutineSummary {hex(self.entry.start_pc)}: {len(self.basic_blocks)} basic blocks,"
+            f" {len(self.exits)} exits>"
+        )
+
+    def apply(
+        self, stack: Stack, converted: Dict[AbsStackElem, AbsStackElem]
+    ) -> List[Tuple["BasicBlock", AbsStackElem, Stack]]:
+        """
+            Apply the summary to the stack at the entry
+        Args:
+            stack (Stack): stack at the entry
+            converted (dict(AbsStackElem -> AbsStackElem)): constants of the summary converted
+                to the table of the stack, updated by the call
+        Returns:
+            list(BasicBlock, AbsStackElem, Stack): for each exit, its basic block,
+                the target of the jump and the stack after the jump
+        """
+        table = stack.table
+        resolver = StackResolver(stack, converted)
+        results = []
+        for subroutine_exit in self.exits:
+            node = stack.head
+            for _ in range(subroutine_exit.consumed):
+                if node is None:
+                    break
+                node = node.next
+            for cell in subroutine_exit.cells:
+                node = table.node(resolver.resolve(cell), node)
+            results.append(
+                (
+                    subroutine_exit.basic_block,
+                    resolver.resolve(subroutine_exit.target),
+                    Stack(table, node),
+                )
+            )
+        return results
+
+
+def find_subroutine_entries(cfg: "CFG") -> Set[int]:
+    """
+    Return the entries of the subroutines: the targets of the basic blocks ending with
+    PUSH entry JUMP, that push another JUMPDEST (the return address) before
+    """
+    store = cfg.instruction_store
+    entries = set()
+    for bb in cfg.basic_blocks:
+        end_idx = bb.end_idx
+        if store.name_at(end_idx) != "JUMP" or end_idx - bb.start_idx < 2:
+            continue
+        if not store.name_at(end_idx - 1).startswith("PUSH"):
+            continue
+        entry = store.operand_at(end_idx - 1)
+        if entry is None or not store.is_jumpdest(entry):
+            continue
+        for idx in range(bb.start_idx, end_idx - 1):
+            operand = store.operand_at(idx)
+            if (
+                store.name_at(idx).startswith("PUSH")
+                and operand is not None
+                and operand != entry
+                and store.is_jumpdest(operand)
+            ):
+                entries.add(entry)
+                break
+    return entries
+
+
+class Subroutines:
+    """Summaries of the subroutines of a contract, computed when first needed
+
+    The summaries are computed with the values tracked by the analysis of the contract
+    (only the JUMPDESTs if the optimization is enabled).
+    """
+
+    def __init__(self, cfg: "CFG") -> None:
+        self._cfg = cfg
+        self._entries: Optional[Set[int]] = None
+        self._summaries: Dict[int, Optional[SubroutineSummary]] = {}
+        self._in_progress: Set[int] = set()
+
+    @property
+    def entries(self) -> Set[int]:
+        """
+        Return the start of the subroutines
+        """
+        if self._entries is None:
+            self._entries = find_subroutine_entries(self._cfg)
+        return self._entries
+
+    @property
+    def summaries(self) -> Dict[int, SubroutineSummary]:
+        """
+        Return the summaries computed so far
+        """
+        return {entry: summary for entry, summary in self._summaries.items() if summary is not None}
+
+    def summary(self, entry: "BasicBlock") -> Optional[SubroutineSummary]:
+        """
+        Return the summary of the subroutine starting at entry
+        None if entry is not the entry of a subroutine, or if its body cannot be summarized
+        """
+        addr = entry.start_pc
+        if addr in self._summaries:
+            return self._summaries[addr]
+        if addr not in self.entries:
+            return None
+        # The summaries are built callee-first, without recursion: the analysis of a body
+        # calling a subroutine not summarized yet is stopped, and restarted once the summary
+        # of the callee is known. The callees are above their callers in pending.
+        pending = [entry]
+        try:
+            while pending:
+                current = pending[-1]
+                self._in_progress.add(current.start_pc)
+                summary: Optional[SubroutineSummary]
+                try:
+                    summary = _Summarizer(self, current).run()
+                except _MissingSummary as missing:
+                    pending.append(missing.entry)
+                    continue
+                except UnsupportedTerm:
+                    summary = None
+                pending.pop()
+                self._in_progress.discard(current.start_pc)
+                self._summaries[current.start_pc] = summary
+        finally:
+            for bb in pending:
+                self._in_progress.discard(bb.start_pc)
+        return self._summaries[addr]
+
+    def is_in_progress(self, addr: int) -> bool:
+        return addr in self._in_progress
+
+    def is_summarized(self, addr: int) -> bool:
+        return addr in self._summaries
+
+    @property
+    def cfg(self) -> "CFG":
+        return self._cfg
+
+    @property
+    def terms(self) -> TermTable:
+        return self._cfg.block_effects.terms
+
+
+class _MissingSummary(Exception):
+    """Call of a subroutine whose summary is not computed yet"""
+
+    def __init__(self, entry: "BasicBlock") -> None:
+        super().__init__()
+        self.entry = entry
+
+
+# pylint: disable=too-many-instance-attributes,too-few-public-methods
+class _Summarizer:
+    """Symbolic analysis of the body of a subroutine"""
+
+    def __init__(self, subroutines: Subroutines, entry: "BasicBlock") -> None:
+        self._subroutines = subroutines
+        self._cfg = subroutines.cfg
+        self._terms = subroutines.terms
+        self._entry = entry
+        self._inputs: Dict["BasicBlock", SymbolicStack] = {entry: SymbolicStack(self._terms)}
+        self._visits: Dict["BasicBlock", int] = {}
+        # Ordered sets (dicts with None values)
+        self._basic_blocks: Dict["BasicBlock", None] = {}
+        self._edges: Dict[Tuple["BasicBlock", "BasicBlock"], None] = {}
+        # (basic block of the jump, basic block of the call) -> exit
+        self._exits: Dict[Tuple[int, int], SubroutineExit] = {}
+        self._worklist: List["BasicBlock"] = [entry]
+
+    def run(self) -> SubroutineSummary:
+        while self._worklist:
+            bb = self._worklist.pop()
+            visits = self._visits.get(bb, 0) + 1
+            if visits > MAX_VISITS:
+                raise UnsupportedTerm()
+            self._visits[bb] = visits
+            self._basic_blocks[bb] = None
+            self._transfer_bb(bb, self._inputs[bb].copy())
+        return SubroutineSummary(
+            self._entry,
+            list(self._basic_blocks),
+            list(self._edges),
+            list(self._exits.values()),
+        )
+
+    def _targets(self, target: AbsStackElem) -> List["BasicBlock"]:
+        vals = target.get_vals()
+        if not vals:
+            return []
+        store = self._cfg.instruction_store
+        targets = []
+        for dst in sorted(x for x in vals if x and store.is_jumpdest(x)):
+            bb = self._cfg.get_basic_block_at(dst)
+            if bb is not None:
+                targets.append(bb)
+        return targets
+
+    def _transfer_bb(self, bb: "BasicBlock", stack: SymbolicStack) -> None:
+        effect = self._cfg.block_effects.effect(bb)
+        if effect is None:
+            raise UnsupportedTerm()
+        stack, target = stack.apply(effect.consumed, effect.cells, effect.target)
+
+        static = self._cfg.edges.static_successor(bb)
+        if static is not None:
+            self._propagate(static, stack)
+
+        if target is None:
+            return
+        if not isinstance(target, AbsStackElem):
+            self._exits[(bb.end_pc, bb.end_pc)] = SubroutineExit(bb, target, stack)
+            return
+        for dst in self._targets(target):
+            self._edges[(bb, dst)] = None
+            self._call(bb, dst, stack)
+
+    def _call(self, bb: "BasicBlock", dst: "BasicBlock", stack: SymbolicStack) -> None:
+        """
+        Follow the jump from bb to dst: apply the summary if dst is the entry of another
+        subroutine, otherwise dst is part of the body
+        """
+        subroutines = self._subroutines
+        summary = None
+        if dst is not self._entry and dst.start_pc in subroutines.entries:
+            if subroutines.is_in_progress(dst.start_pc):
+                # Recursive call
+                raise UnsupportedTerm()
+            if not subroutines.is_summarized(dst.start_pc):
+                raise _MissingSummary(dst)
+            summary = subroutines.summary(dst)
+        if summary is None:
+            self._propagate(dst, stack)
+            return
+
+        for body_bb in summary.basic_blocks:
+            self._basic_blocks[body_bb] = None
+        for edge in summary.edges:
+            self._edges[edge] = None
+        for subroutine_exit in summary.exits:
+            out, target = stack.apply(
+                subroutine_exit.consumed, subroutine_exit.cells, subroutine_exit.target
+            )
+            assert target is not None
+            exit_bb = subroutine_exit.basic_block
+            if not isinstance(target, AbsStackElem):
+                self._exits[(exit_bb.end_pc, bb.end_pc)] = SubroutineExit(exit_bb, target, out)
+                continue
+            for ret in self._targets(target):
+                self._edges[(exit_bb, ret)] = None
+                self._propagate(ret, out)
+
+    def _propagate(self, bb: "BasicBlock", stack: SymbolicStack) -> None:
+        previous = self._inputs.get(bb)
+        if previous is not None:
+            stack = previous.merge(stack)
+            if stack.equals(previous):
+                return
+        self._inputs[bb] = stack
+        if bb not in self._worklist:
+            self._worklist.append(bb)
@@ -0,0 +1,304 @@
+"""
+Symbolic terms, used to summarize the effect of code on the abstract stack
+
+The elements of the stack before the code are slots (0 for the top), and the values computed
+from them are terms: a constant (AbsStackElem), a slot, the AND of two terms, or the merge
+of terms. The terms are resolved with a concrete stack (StackResolver) when the summary is
+applied, or with another symbolic stack (SymbolicResolver) to compose the summaries.
+The terms are interned by a TermTable: two equal terms are the same object.
+"""
+from typing import Dict, FrozenSet, List, Optional, Sequence, Set, Tuple, Union
+
+from evm_cfg_builder.value_analysis.abstract_stack import (
+    AbsStackElem,
+    AbsStackElemTable,
+    Stack,
+    StackNode,
+)
+
+# Number of operations in a term before giving up the summary using it
+MAX_TERM_SIZE = 32
+
+
+class UnsupportedTerm(Exception):
+    """The code cannot be summarized: term too large, or stacks of different heights merged"""
+
+
+# pylint: disable=too-few-public-methods
+class SlotTerm:
+    """Element of the stack before the code (0 for the top)"""
+
+    __slots__ = ("index",)
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+
+
+# pylint: disable=too-few-public-methods
+class AndTerm:
+    """AND between two terms, one of them at least not constant"""
+
+    __slots__ = ("left", "right", "size")
+
+    def __init__(self, left: "Term", right: "Term") -> None:
+        self.left = left
+        self.right = right
+        self.size = _size(left) + _size(right) + 1
+
+
+# pylint: disable=too-few-public-methods
+class JoinTerm:
+    """Merge of terms: at most one constant, and no JoinTerm"""
+
+    __slots__ = ("terms", "size")
+
+    def __init__(self, terms: FrozenSet["Term"]) -> None:
+        self.terms = terms
+        self.size = sum(_size(term) for term in terms) + 1
+
+
+Term = Union[AbsStackElem, SlotTerm, AndTerm, JoinTerm]
+
+
+def _size(term: Term) -> int:
+    return term.size if isinstance(term, (AndTerm, JoinTerm)) else 1
+
+
+class TermTable:
+    """Intern table of the terms of a contract
+
+    As for the AbsStackElem, two equal terms are the same object.
+    The operations on constants are computed with the table of the terms.
+    """
+
+    def __init__(self, table: AbsStackElemTable) -> None:
+        self._table = table
+        self._slots: List[SlotTerm] = []
+        self._ands: Dict[Tuple[Term, Term], AndTerm] = {}
+        self._joins: Dict[FrozenSet[Term], JoinTerm] = {}
+
+    @property
+    def table(self) -> AbsStackElemTable:
+        return self._table
+
+    def slot(self, index: int) -> SlotTerm:
+        while len(self._slots) <= index:
+            self._slots.append(SlotTerm(len(self._slots)))
+        return self._slots[index]
+
+    def abs_and(self, left: Term, right: Term) -> Term:
+        table = self._table
+        if isinstance(left, AbsStackElem) and isinstance(right, AbsStackElem):
+            return table.abs_and(left, right)
+        if left is table.top or right is table.top:
+            return table.top
+        term = self._ands.get((left, right))
+        if term is None:
+            term = AndTerm(left, right)
+            if term.size > MAX_TERM_SIZE:
+                raise UnsupportedTerm()
+            self._ands[(left, right)] = term
+        return term
+
+    def merge(self, left: Term, right: Term) -> Term:
+        if left is right:
+            return left
+        table = self._table
+        if isinstance(left, AbsStackElem) and isinstance(right, AbsStackElem):
+            return table.merge(left, right)
+        constants: List[AbsStackElem] = []
+        terms: Set[Term] = set()
+        for term in (left, right):
+            for part in term.terms if isinstance(term, JoinTerm) else (term,):
+                if isinstance(part, AbsStackElem):
+                    constants.append(part)
+                else:
+                    terms.add(part)
+        if constants:
+            constant = table.merge_all(constants)
+            if constant is table.top:
+                return table.top
+            # The empty set is the identity of the merge
+            if constant is not table.empty:
+                terms.add(constant)
+        if len(terms) == 1:
+            return next(iter(terms))
+        key = frozenset(terms)
+        join = self._joins.get(key)
+        if join is None:
+            join = JoinTerm(key)
+            if join.size > MAX_TERM_SIZE:
+                raise UnsupportedTerm()
+            self._joins[key] = join
+        return join
+
+
+class SymbolicStack:
+    """Stack of terms, relative to the stack before the code
+
+    - cells: terms above the slots not consumed (the top is the last element)
+    - consumed: number of slots popped. The slots are added to the cells when they are read
+    """
+
+    __slots__ = ("_terms", "cells", "consumed")
+
+    def __init__(
+        self, terms: TermTable, cells: Optional[List[Term]] = None, consumed: int = 0
+    ) -> None:
+        self._terms = terms
+        self.cells: List[Term] = cells if cells is not None else []
+        self.consumed = consumed
+
+    def copy(self) -> "SymbolicStack":
+        return SymbolicStack(self._terms, list(self.cells), self.consumed)
+
+    @property
+    def height(self) -> int:
+        """
+        Height of the stack, relative to the stack before the code
+        """
+        return len(self.cells) - self.consumed
+
+    def materialize(self, n: int) -> None:
+        """
+        Add the slots below the cells, so that there are at least n cells
+        """
+        missing = n - len(self.cells)
+        if missing > 0:
+            consumed = self.consumed
+            slots = [self._terms.slot(consumed + idx) for idx in range(missing)]
+            slots.reverse()
+            self.cells[0:0] = slots
+            self.consumed = consumed + missing
+
+    def peek(self, n: int) -> Term:
+        """
+        Return the n-th term from the top (0 for the top)
+        """
+        self.materialize(n + 1)
+        return self.cells[-1 - n]
+
+    def push(self, term: Term) -> None:
+        self.cells.append(term)
+
+    def pop(self) -> Term:
+        self.materialize(1)
+        return self.cells.pop()
+
+    def swap(self, n: int) -> None:
+        self.materialize(n + 1)
+        cells = self.cells
+        cells[-1], cells[-1 - n] = cells[-1 - n], cells[-1]
+
+    def dup(self, n: int) -> None:
+        self.push(self.peek(n - 1))
+
+    def merge(self, stack: "SymbolicStack") -> "SymbolicStack":
+        """
+        Merge two stacks of the same height. Raise UnsupportedTerm if the heights differ
+        """
+        if self.height != stack.height:
+            raise UnsupportedTerm()
+        stack1 = self.copy()
+        stack2 = stack.copy()
+        consumed = max(stack1.consumed, stack2.consumed)
+        stack1.materialize(len(stack1.cells) + consumed - stack1.consumed)
+        stack2.materialize(len(stack2.cells) + consumed - stack2.consumed)
+        merge = self._terms.merge
+        cells = [merge(cell1, cell2) for cell1, cell2 in zip(stack1.cells, stack2.cells)]
+        return SymbolicStack(self._terms, cells, consumed)
+
+    def equals(self, stack: "SymbolicStack") -> bool:
+        if self.consumed != stack.consumed or len(self.cells) != len(stack.cells):
+            return False
+        return all(cell1 is cell2 for cell1, cell2 in zip(self.cells, stack.cells))
+
+    def apply(
+        self, consumed: int, cells: Sequence[Term], target: Optional[Term] = None
+    ) -> Tuple["SymbolicStack", Optional[Term]]:
+        """
+            Apply a summarized effect to the stack, the terms of the effect being resolved
+            with the stack
+        Args:
+            consumed (int): number of slots popped by the effect
+            cells (list(Term)): terms pushed by the effect (the top is the last element)
+            target (Term, None): target of the jump of the effect
+        Returns:
+            (SymbolicStack, Term): the new stack, and the target resolved (None if no target)
+        """
+        resolver = SymbolicResolver(self.copy(), self._terms)
+        stack = self.copy()
+        for _ in range(consumed):
+            stack.pop()
+        stack.cells.extend(resolver.resolve(cell) for cell in cells)
+        return stack, resolver.resolve(target) if target is not None else None
+
+
+class StackResolver:
+    """Resolution of the terms with the concrete stack before the code
+    The slots below the bottom of the stack are unknown values
+    """
+
+    def __init__(self, stack: Stack, converted: Dict[AbsStackElem, AbsStackElem]) -> None:
+        self._table = stack.table
+        self._node: Optional[StackNode] = stack.head
+        # Elements of the stack read so far, from the top
+        self._elems: List[AbsStackElem] = []
+        self._converted = converted
+        self._resolved: Dict[Term, AbsStackElem] = {}
+
+    def _slot(self, index: int) -> AbsStackElem:
+        elems = self._elems
+        while len(elems) <= index and self._node is not None:
+            elems.append(self._node.elem)
+            self._node = self._node.next
+        if index < len(elems):
+            return elems[index]
+        # Element below the bottom of the stack
+        return self._table.from_value(None)
+
+    def resolve(self, term: Term) -> AbsStackElem:
+        elem = self._resolved.get(term)
+        if elem is not None:
+            return elem
+        table = self._table
+        if isinstance(term, AbsStackElem):
+            elem = self._converted.get(term)
+            if elem is None:
+                elem = table.get(term.get_vals())
+                self._converted[term] = elem
+        elif isinstance(term, SlotTerm):
+            elem = self._slot(term.index)
+        elif isinstance(term, AndTerm):
+            elem = table.abs_and(self.resolve(term.left), self.resolve(term.right))
+        else:
+            elem = table.merge_all([self.resolve(part) for part in term.terms])
+        self._resolved[term] = elem
+        return elem
+
+
+class SymbolicResolver:
+    """Resolution of the terms with a symbolic stack, to compose the summaries"""
+
+    def __init__(self, stack: SymbolicStack, terms: TermTable) -> None:
+        self._stack = stack
+        self._terms = terms
+        self._resolved: Dict[Term, Term] = {}
+
+    def resolve(self, term: Term) -> Term:
+        if isinstance(term, AbsStackElem):
+            return term
+        resolved = self._resolved.get(term)
+        if resolved is not None:
+            return resolved
+        if isinstance(term, SlotTerm):
+            resolved = self._stack.peek(term.index)
+        elif isinstance(term, AndTerm):
+            resolved = self._terms.abs_and(self.resolve(term.left), self.resolve(term.right))
+        else:
+            parts = [self.resolve(part) for part in term.terms]
+            resolved = parts[0]
+            for part in parts[1:]:
+                resolved = self._terms.merge(resolved, part)
+        self._resolved[term] = resolved
+        return resolved
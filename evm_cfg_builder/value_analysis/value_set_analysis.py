@@ -1,13 +1,39 @@
-import itertools
-from typing import Dict, List, Set, Optional, Tuple, TYPE_CHECKING, Any, Union
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TYPE_CHECKING,
+)
 
 from pyevmasm import Instruction
 
 from evm_cfg_builder.cfg.function import Function
+from evm_cfg_builder.cfg.stats import AnalysisStats
+from evm_cfg_builder.value_analysis.abstract_stack import (
+    AbsStackElem,
+    AbsStackElemTable,
+    BitsetAbsStackElemTable,
+    Stack,
+    StackNode,
+    merge_stack,
+)
+from evm_cfg_builder.value_analysis.worklist import (
+    Worklist,
+    loop_headers,
+    reverse_postorder,
+    widen_stack,
+)
 
 if TYPE_CHECKING:
     from evm_cfg_builder.cfg.basic_block import BasicBlock
+    from evm_cfg_builder.cfg.budget import BudgetTracker
     from evm_cfg_builder.cfg.cfg import CFG
+    from evm_cfg_builder.value_analysis.block_effects import BlockEffects
+    from evm_cfg_builder.value_analysis.subroutines import Subroutines, SubroutineSummary
 
 BASIC_BLOCK_END = [
     "STOP",
@@ -21,381 +47,32 @@ BASIC_BLOCK_END = [
 ]
 
 
-class AbsStackElem:
-    """Represent an element of the stack
-
-    An element is a set of potential values.
-    There are at max MAXVALS number of values, otherwise it is set to TOP
-
-    TOP is representented as None
-
-    []     --> [1, 2, None, 3...]  --> None
-    Init   --> [ up to 10 vals ]   --  TOP
-
-    If a value is not known, it is None.
-    Note that we make the difference between the list beeing TOP, and one
-    of the value inside the list beeing TOP. The idea is that even if one
-    of the value is not known, we can list keep track of the known values.
-
-    Thus our analysis is an under-approximation of an over-approximation
-    and is not sound.
-    """
-
-    def __init__(
-        self, auhtorized_values: Optional[Set[int]], vals: Optional[Set[Optional[int]]] = None
-    ):
-        if vals:
-            self._vals: Optional[Set[Optional[int]]] = vals
-        else:
-            self._vals = set()
-        self._authorized_values = auhtorized_values
-
-        # Maximum number of values inside the set. If > MAXVALS -> TOP
-        self._max_number_of_elements = 100
-        if auhtorized_values:
-            # If we know the set of targets, we can change the max number of elements in the set
-            self._max_number_of_elements = len(auhtorized_values)
-
-    def append(self, nbr: Optional[int]) -> None:
-        """
-            Append value to the element
-
-        Args:
-            nbr (int, None)
-        """
-        # Optimization enabled
-        if self._vals is None:
-            return
-        if self._authorized_values:
-            # Only keep track of values that are JMPDEST
-            if nbr in self._authorized_values:
-                self._vals.add(nbr)
-            # Only Add None if its not present; avoid the list to grow up on unknown values
-            elif None not in self._authorized_values:
-                self._vals.add(None)
-        else:
-            self._vals.add(nbr)
-
-    def get_vals(self) -> Optional[Set[Optional[int]]]:
-        """
-            Return the values. The return must be checked for TOP (None)
-
-        Returns:
-            set of int, or None
-        """
-        return self._vals
-
-    def set_vals(self, vals: Optional[Set[Optional[int]]]) -> None:
-        """
-            Set the values
-        Args:
-            vals (set of int, or None): List of values, or TOP
-        """
-        self._vals = vals
-
-    def absAnd(self, elem: "AbsStackElem") -> "AbsStackElem":
-        """
-            AND between two AbsStackElem
-        Args:
-            elem (AbsStackElem)
-        Returns:
-            AbsStackElem: New object containing the result of the AND between
-            the values. If one of the absStackElem is TOP, returns TOP
-        """
-        newElem = AbsStackElem(self._authorized_values)
-        v1 = self.get_vals()
-        v2 = elem.get_vals()
-        if v1 is None or v2 is None:
-            newElem.set_vals(None)
-            return newElem
-
-        for (a, b) in itertools.product(v1, v2):
-            if a is None or b is None:
-                newElem.append(None)
-            else:
-                newElem.append(a & b)
-
-        return newElem
-
-    def merge(self, elem: "AbsStackElem") -> "AbsStackElem":
-        """
-            Merge between two AbsStackElem
-        Args:
-            elem (AbsStackElem)
-        Returns:
-            AbsStackElem: New object containing the result of the merge
-                          If one of the absStackElem is TOP, returns TOP
-        """
-        newElem = AbsStackElem(self._authorized_values)
-        v1 = self.get_vals()
-        v2 = elem.get_vals()
-        if v1 is None or v2 is None:
-            newElem.set_vals(None)
-            return newElem
-        vals = set(v1 | v2)
-        if len(vals) > self._max_number_of_elements:
-            newElem.set_vals(None)
-        else:
-            newElem.set_vals(vals)
-        return newElem
-
-    def equals(self, elems: "AbsStackElem") -> bool:
-        """
-            Return True if equal
-
-        Args:
-            elem (AbsStackElem)
-        Returns:
-            bool: True if the two absStackElem are equals. If both are TOP
-            returns True
-        """
-
-        v1 = self.get_vals()
-        v2 = elems.get_vals()
-
-        return v1 == v2
-
-    def get_copy(self) -> "AbsStackElem":
-        """
-            Return of copy of the object
-        Returns:
-            AbsStackElem
-        """
-        cp = AbsStackElem(self._authorized_values, self._vals)
-        return cp
-
-    def __str__(self) -> str:
-        """
-            String representation
-        Returns:
-            str
-        """
-        return str(self._vals)
-
-
-class Stack:
-    """
-    Stack representation
-    The stack is updated throyugh the push/pop/dup operation, and returns
-    itself
-    We keep the same stack for one basic block, to reduce the memory usage
-    """
-
-    def __init__(self, authorized_values: Set[int]) -> None:
-        self._elems: List[AbsStackElem] = []
-        self._authorized_values: Set[int] = authorized_values
-
-    @property
-    def authorized_values(self) -> Set[int]:
-        return self._authorized_values
-
-    def depth(self) -> int:
-        return len(self._elems)
-
-    def copy_stack(self, stack: "Stack") -> None:
-        """
-            Copy the given stack
-
-        Args:
-            Stack: stack to copy
-        """
-        self._elems = [x.get_copy() for x in stack.get_elems()]
-
-    def push(self, elem: Optional[Union[AbsStackElem, int]]) -> None:
-        """
-            Push an elem. If the elem is not an AbsStackElem, create a new
-            AbsStackElem
-        Args:
-            elem (AbsStackElem, or str or None): If str, it should be the
-            hexadecimal repr
-        """
-        if not isinstance(elem, AbsStackElem):
-            st = AbsStackElem(self.authorized_values)
-            st.append(elem)
-            elem = st
-
-        self._elems.append(elem)
-
-    def insert(self, elem: Optional[Union[AbsStackElem, int]]) -> None:
-        if not isinstance(elem, AbsStackElem):
-            st = AbsStackElem(self.authorized_values)
-            st.append(elem)
-            elem = st
-
-        self._elems.insert(0, elem)
-
-    def pop(self) -> AbsStackElem:
-        """
-            Pop an element.
-        Returns:
-            AbsStackElem
-        """
-        if not self._elems:
-            self.push(None)
-
-        return self._elems.pop()
-
-    def swap(self, n: int) -> None:
-        """
-            Swap operation
-        Args:
-            n (int)
-        """
-        if len(self._elems) >= (n + 1):
-            elem = self._elems[-1 - n]
-            top = self.top()
-            self._elems[-1] = elem
-            self._elems[-1 - n] = top
-
-        # if we swap more than the size of the stack,
-        # we can assume that elements are missing on the stack
-        else:
-            top = self.top()
-            missing_elems = n - len(self._elems) + 1
-            for _ in range(0, missing_elems):
-                self.insert(None)
-            self._elems[-1 - n] = top
-
-    def dup(self, n: int) -> None:
-        """
-        Dup operation
-        """
-        if len(self._elems) >= n:
-            self.push(self._elems[-n])
-        else:
-            self.push(None)
-
-    def get_elems(self) -> List[AbsStackElem]:
-        """
-            Returns the stack elements
-        Returns:
-            List AbsStackElem
-        """
-        return self._elems
-
-    def set_elems(self, elems: List[AbsStackElem]) -> None:
-        """
-            Set the stack elements
-        Args:
-            elems (list of AbsStackElem)
-        """
-        self._elems = elems
-
-    def merge(self, stack: "Stack") -> "Stack":
-        """
-            Merge two stack. Returns a new object
-        Arg:
-            stack (Stack)
-        Returns: New object representing the merge
-        """
-        newSt = Stack(self.authorized_values)
-        elems1 = self.get_elems()
-        elems2 = stack.get_elems()
-        # We look for the longer stack
-        if len(elems2) <= len(elems1):
-            longStack = elems1
-            shortStack = elems2
-        else:
-            longStack = elems2
-            shortStack = elems1
-        longStack = [x.get_copy() for x in longStack if x]
-        # Merge elements
-        for i in range(0, len(shortStack)):
-            longStack[-(i + 1)] = longStack[-(i + 1)].merge(shortStack[-(i + 1)])
-        newSt.set_elems(longStack)
-        return newSt
-
-    def equals(self, stack: "Stack") -> bool:
-        """
-            Test equality between two stack
-        Args:
-            stack (Stack)
-        Returns:
-            bool: True if the stacks are equals
-        """
-        elems1 = self.get_elems()
-        elems2 = stack.get_elems()
-        if len(elems1) != len(elems2):
-            return False
-        for (v1, v2) in zip(elems1, elems2):
-            if not v1.equals(v2):
-                return False
-        return True
-
-    def top(self) -> AbsStackElem:
-        """
-            Return the element at the top (without pop)
-        Returns:
-            AbsStackElem
-        """
-        if not self._elems:
-            self.push(None)
-        return self._elems[-1]
-
-    def __str__(self) -> str:
-        """
-        String representation (only first 5 items)
-        """
-        return str([str(x) for x in self._elems[-100::]])
-
-
-def merge_stack(stacks: List[Stack], authorized_values: Set[int]) -> Stack:
-    """
-        Merge two stack. Returns a new object
-    Arg:
-        stack (Stack)
-    Returns: New object representing the merge
-    """
-
-    stack_elements: List[AbsStackElem] = []
-
-    _max_number_of_elements = len(authorized_values) if authorized_values else 100
-
-    found = True
-    i = 0
-    while found:
-        vals: Optional[Set[Optional[int]]] = set()
-        found = False
-        for stack in stacks:
-            elems = stack.get_elems()
-            if len(elems) <= i:
-                continue
-            found = True
-            next_vals = elems[i].get_vals()
-            if next_vals is None:
-                vals = None
-                break
-            assert vals is not None
-            vals |= next_vals
-            if len(vals) > _max_number_of_elements:
-                vals = None
-                break
-        stack_elements.append(AbsStackElem(authorized_values, vals))
-        i = i + 1
-    newSt = Stack(authorized_values)
-    newSt.set_elems(stack_elements)
-    return newSt
-
-
-def get_valid_destination(instructions: List[Instruction]) -> Set[int]:
-    """
-    Return the list of valid destinations
-    :param instructions:
-    :return:
-    """
-    return {ins.pc for ins in instructions if ins.name == "JUMPDEST"}
-
-
 # pylint: disable=too-many-instance-attributes
 class StackValueAnalysis:
     """Stack value analysis.
 
     After each convergence, we add the new branches and re-analyze the function.
-    The exploration is bounded in case the analysis is lost.
+    The exploration is bounded in case the analysis is lost: each basic block is explored at most
+    maxexploration times, and the function is re-analyzed at most maxiteration times.
+    If the budget is exhausted, or maxiteration is reached, the analysis stops with the edges
+    found so far, and incomplete is set to the reason.
 
     IF enable_optimization is enabled, only keep track of valid destination
+
+    The basic blocks are applied at once with their effect on the stack, compiled once per contract
+    (see value_analysis.block_effects), when the stack is deep enough.
+    The internal subroutines summarized (see value_analysis.subroutines) are not explored:
+    their summary is applied to the stack of each call site, and the stacks after their exits
+    are merged in the input stacks of the return addresses.
     """
 
+    BUDGET_CHECK_INTERVAL = 64
+
+    # Visits of a loop header before its input stack is widened
+    WIDENING_DELAY = 3
+    # Visits of a loop header before the height of its input stack stops growing
+    HEIGHT_WIDENING_DELAY = 6
+
     # pylint: disable=too-many-arguments
     def __init__(
         self,
@@ -406,11 +83,14 @@ class StackValueAnalysis:
         maxexploration: int = 100,
         initStack: Optional[Stack] = None,
         enable_optimization: bool = True,
+        *,
+        budget: Optional["BudgetTracker"] = None,
     ) -> None:
         """
         Args:
             maxiteration (int): number of time re-analyze the function
             maxexploration (int): number of time re-explore a bb
+            budget (BudgetTracker): time and memory budget of the analysis
         """
         # last targets discovered. We keep track of these branches to only
         # re-launch the analysis on new paths found
@@ -420,9 +100,12 @@ class StackValueAnalysis:
         self.all_discovered_targets: Dict[int, Set[int]] = {}
 
         # The the destination value on a JUMP/JUMPI
-        self.last_ins_top_value: Dict[int, Optional[Set[Optional[int]]]] = {}
+        self.last_ins_top_value: Dict[int, Optional[FrozenSet[Optional[int]]]] = {}
         # Only save stacksOut for the last instructions of a BB
         self.stacksOut: Dict[int, Stack] = {}
+        # Input stacks of the loop headers, widened after WIDENING_DELAY visits
+        self.stacksIn: Dict[int, Stack] = {}
+        self._loop_headers: Set[int] = set()
 
         # bb counter, to bound the bb exploration
         self.bb_counter: Dict[int, int] = {}
@@ -445,16 +128,57 @@ class StackValueAnalysis:
 
         self._key = key
 
+        # Basic blocks explored, in exploration order
         self._basic_blocks_explored: List[int] = []
+        self._basic_blocks_explored_set: Set[int] = set()
 
-        self._to_explore: Set["BasicBlock"] = {self._entry_point}
-
-        self._outgoing_basic_blocks: List["BasicBlock"] = []
+        self._worklist = Worklist()
+        self._worklist.push(self._entry_point)
 
         self._authorized_values: Set[int] = set()
 
         if enable_optimization:
-            self._authorized_values = get_valid_destination(cfg.instructions)
+            self._authorized_values = cfg.instruction_store.jumpdests()
+
+        # Abstract values of the analysis
+        self._table: AbsStackElemTable
+        if self._authorized_values:
+            self._table = BitsetAbsStackElemTable(self._authorized_values)
+        else:
+            self._table = AbsStackElemTable(self._authorized_values)
+
+        # Instructions of the basic blocks explored, created once per analysis
+        self._bb_instructions: Dict[int, List[Instruction]] = {}
+
+        self.stats = AnalysisStats()
+
+        self._budget = budget
+        # Transfers left before the next check of the budget
+        # The first check follows the transfer of the entry, which is always explored
+        self._budget_countdown = 1
+        # Reason why the analysis stopped before the fixpoint: "iterations", or the budget exhausted
+        self.incomplete: Optional[str] = None
+
+        # The effects and the summaries are computed with the transfer function of
+        # StackValueAnalysis. The summaries are not used for the dispatcher
+        self._block_effects: Optional["BlockEffects"] = None
+        self._subroutines: Optional["Subroutines"] = None
+        if (
+            type(self).stub is StackValueAnalysis.stub
+            and enable_optimization == cfg.optimization_enabled
+        ):
+            self._block_effects = cfg.block_effects
+            if key != Function.DISPATCHER_ID:
+                self._subroutines = cfg.subroutines
+        # Stacks after the exits of the subroutines, per target
+        self._returns: Dict[int, Stack] = {}
+        # (entry, end of the caller) -> stack at the call, when the summary was last applied.
+        # The end of the caller is None for the stack returned to the entry
+        self._calls: Dict[Tuple[int, Optional[int]], Optional[StackNode]] = {}
+        # Subroutines whose body was added to the function
+        self._bodies: Set[int] = set()
+        # Elements of the effects and of the summaries converted to the table of the analysis
+        self._summary_elems: Dict[AbsStackElem, AbsStackElem] = {}
 
     @property
     def authorized_values(self) -> Set[int]:
@@ -471,11 +195,7 @@ class StackValueAnalysis:
         Returns:
             bool: True if the instruction is a JUMPDEST
         """
-        ins = self.cfg.get_instruction_at(addr)
-        if ins is None:
-            return False
-
-        return ins.name == "JUMPDEST"
+        return self.cfg.instruction_store.is_jumpdest(addr)
 
     # pylint: disable=no-self-use
     def stub(self, _ins: Instruction, _addr: int, _stack: Stack) -> Tuple[bool, Any]:
@@ -532,14 +252,31 @@ class StackValueAnalysis:
         """
         last_jump = None
 
-        if not bb.start.pc in self._basic_blocks_explored:
-            self._basic_blocks_explored.append(bb.start.pc)
+        self._mark_explored(bb)
+
+        effect = self._block_effects.effect(bb) if self._block_effects is not None else None
+        if effect is not None and stack.depth() >= effect.consumed:
+            end = bb.end_pc
+            target, stack_out = effect.apply(stack, self._summary_elems)
+            if target is not None:
+                self.last_ins_top_value[end] = target.get_vals()
+            # Same as the transfer function: the stack given is updated
+            stack.copy_stack(stack_out)
+            self.stacksOut[end] = stack
+            if target is not None:
+                last_jump = stack.top()
+            return last_jump
+
+        instructions = self._bb_instructions.get(bb.start_pc)
+        if instructions is None:
+            instructions = bb.instructions
+            self._bb_instructions[bb.start_pc] = instructions
 
         ins = None
-        for idx, ins in enumerate(bb.instructions):
+        for idx, ins in enumerate(instructions):
             addr = ins.pc
             # Only save last instructions
-            if idx == len(bb.instructions) - 1 and ins.name in ["JUMP", "JUMPI"]:
+            if idx == len(instructions) - 1 and ins.name in ["JUMP", "JUMPI"]:
                 self.last_ins_top_value[addr] = stack.top().get_vals()
                 # stackIn = stack
                 # stack = Stack(self.authorized_values)
@@ -548,7 +285,7 @@ class StackValueAnalysis:
             stack = self._transfer_func_ins(ins, addr, stack)
 
             # Only save stackOut for last instructions
-            if idx == len(bb.instructions) - 1:
+            if idx == len(instructions) - 1:
                 self.stacksOut[addr] = stack
 
         if ins:
@@ -559,7 +296,12 @@ class StackValueAnalysis:
                 last_jump = stack.top()
         return last_jump
 
-    # pylint: disable=too-many-branches,too-many-locals
+    def _mark_explored(self, bb: "BasicBlock") -> None:
+        if not bb.start_pc in self._basic_blocks_explored_set:
+            self._basic_blocks_explored_set.add(bb.start_pc)
+            self._basic_blocks_explored.append(bb.start_pc)
+
+    # pylint: disable=too-many-branches,too-many-locals,too-many-statements
     def _transfer_func_bb(self, bb: "BasicBlock", init: bool = False) -> None:
         """
         Transfer function
@@ -567,9 +309,10 @@ class StackValueAnalysis:
 
         if self._key == Function.DISPATCHER_ID and bb.reacheable:
             return
-        addr = bb.start.pc
-        end_ins = bb.end
-        end = end_ins.pc
+        addr = bb.start_pc
+        end = bb.end_pc
+        stats = self.stats
+        stats.transfers += 1
 
         # bound the number of times we analyze a BB
         if addr not in self.bb_counter:
@@ -579,8 +322,15 @@ class StackValueAnalysis:
 
             if self.bb_counter[addr] > self.MAXEXPLORATION:
                 # print('Reach max explo {}'.format(hex(addr)))
+                if self.bb_counter[addr] == self.MAXEXPLORATION + 1:
+                    stats.max_exploration_reached += 1
                 return
 
+        summary = self._summary(bb)
+        if summary is not None:
+            self._apply_summary(bb, summary)
+            return
+
         # Check if the bb was already analyzed (used for convergence)
         prev_stack: Optional[Stack]
         if end in self.stacksOut:
@@ -591,25 +341,36 @@ class StackValueAnalysis:
         if init and self.initStack:
             stack = self.initStack
         else:
-            stack = Stack(self.authorized_values)
+            stack = Stack(self._table)
 
         # Merge all the stack incoming_basic_blocks
         # We merge only father that were already analyzed
         incoming_basic_blocks = bb.incoming_basic_blocks(self._key)
 
-        incoming_basic_blocks = [f for f in incoming_basic_blocks if f.end.pc in self.stacksOut]
+        incoming_basic_blocks = [f for f in incoming_basic_blocks if f.end_pc in self.stacksOut]
+
+        stacks = [self.stacksOut[father.end_pc] for father in incoming_basic_blocks]
+        if addr in self._returns:
+            stacks.append(self._returns[addr])
 
-        if incoming_basic_blocks:
-            stacks = [self.stacksOut[father.end.pc] for father in incoming_basic_blocks]
+        if stacks:
             stack = merge_stack(
                 stacks,
-                self._authorized_values,
+                self._table,
             )
+            stats.merges += 1
+
+        if addr in self._loop_headers:
+            stack = self._widen(addr, stack)
+
         # Analyze the BB
         self._explore_bb(bb, stack)
+        stats.peak_stack_depth = max(
+            stats.peak_stack_depth, stack.depth(), self.stacksOut[end].depth()
+        )
 
         # check if the last instruction is a JUMP
-        op = end_ins.name
+        op = bb.end_name
 
         if op == "JUMP":
             src = end
@@ -638,8 +399,81 @@ class StackValueAnalysis:
                 converged = True
 
         if not converged:
-            new_outgoing_basic_blocks = bb.outgoing_basic_blocks(self._key)
-            self._outgoing_basic_blocks = new_outgoing_basic_blocks + self._outgoing_basic_blocks
+            for son in bb.outgoing_basic_blocks(self._key):
+                self._worklist.push(son)
+
+    def _summary(self, bb: "BasicBlock") -> Optional["SubroutineSummary"]:
+        if self._subroutines is None or bb is self._entry_point:
+            return None
+        return self._subroutines.summary(bb)
+
+    def _apply_summary(self, bb: "BasicBlock", summary: "SubroutineSummary") -> None:
+        """
+        Apply the summary of the subroutine starting at bb to the stack of each call
+        The body of the subroutine is added to the function without being explored
+        """
+        addr = bb.start_pc
+        if addr not in self._bodies:
+            self._bodies.add(addr)
+            for body_bb in summary.basic_blocks:
+                self._mark_explored(body_bb)
+            for bb_from, bb_to in summary.edges:
+                bb_from.add_outgoing_basic_block(bb_to, self._key)
+                bb_to.add_incoming_basic_block(bb_from, self._key)
+
+        calls: List[Tuple[Optional[int], Stack]] = [
+            (father.end_pc, self.stacksOut[father.end_pc])
+            for father in bb.incoming_basic_blocks(self._key)
+            if father.end_pc in self.stacksOut
+        ]
+        if addr in self._returns:
+            calls.append((None, self._returns[addr]))
+
+        for caller, stack in calls:
+            call = (addr, caller)
+            if call in self._calls and self._calls[call] is stack.head:
+                continue
+            self._calls[call] = stack.head
+            self.stats.summaries += 1
+            for exit_bb, target, out in summary.apply(stack, self._summary_elems):
+                dst = target.get_vals()
+                if dst:
+                    dst_ = {x for x in dst if x and self.is_jumpdst(x)}
+                    self.add_branches(exit_bb.end_pc, dst_)
+                    for ret in dst_:
+                        self._add_return(ret, out)
+
+    def _add_return(self, addr: int, stack: Stack) -> None:
+        """
+        Merge the stack returned to addr, and push addr to the worklist if the stack changed
+        """
+        previous = self._returns.get(addr)
+        if previous is not None:
+            stack = merge_stack([previous, stack], self._table)
+            if previous.equals(stack):
+                return
+        self._returns[addr] = stack
+        bb = self.cfg.get_basic_block_at(addr)
+        if bb is not None:
+            self._worklist.push(bb)
+
+    def _widen(self, addr: int, stack: Stack) -> Stack:
+        """
+        Widen the input stack of a loop header with its previous input stack
+        Without widening, the stack of a loop grows at each iteration, and the loop is unrolled
+        until MAXEXPLORATION
+        The values are joined and not set to TOP: the loop headers include the entries of the
+        subroutines called from several call sites, where the return addresses differ.
+        After HEIGHT_WIDENING_DELAY visits, the height of the stack is bounded by the previous one
+        """
+        previous = self.stacksIn.get(addr)
+        visits = self.bb_counter[addr]
+        if previous is not None and visits > self.WIDENING_DELAY:
+            grow = visits <= self.HEIGHT_WIDENING_DELAY
+            stack = widen_stack(previous, stack, self._table, grow)
+            self.stats.widenings += 1
+        self.stacksIn[addr] = Stack(self._table, stack.head)
+        return stack
 
     def add_branches(self, src: int, dst: Set[int]) -> None:
         """
@@ -663,14 +497,20 @@ class StackValueAnalysis:
     def explore(self) -> None:
         """
         Launch the analysis
-        """
-        init = False
-
-        bb = self._to_explore.pop()
 
-        self._transfer_func_bb(bb, init)
-        while self._outgoing_basic_blocks:
-            self._transfer_func_bb(self._outgoing_basic_blocks.pop())
+        Run the transfer function until the worklist is empty, following the
+        reverse postorder of the edges currently known. Then add the new branches
+        found, and push their destinations to the worklist for the next exploration.
+        """
+        self.stats.explorations += 1
+        order = reverse_postorder(self._entry_point, self._key)
+        self._worklist.set_order(order)
+        self._loop_headers = loop_headers(order, self._key)
+        while self._worklist:
+            if self._budget_exhausted():
+                # Keep the branches found so far
+                break
+            self._transfer_func_bb(self._worklist.pop())
 
         last_discovered_targets = self.last_discovered_targets
         self.last_discovered_targets = {}
@@ -684,19 +524,27 @@ class StackValueAnalysis:
                     if bb_to:
                         bb_from.add_outgoing_basic_block(bb_to, self._key)
                         bb_to.add_incoming_basic_block(bb_from, self._key)
+                        self._worklist.push(bb_to)
+                        self.stats.edges_found += 1
 
-        dsts_ = last_discovered_targets.values()
-        self._to_explore |= {
-            block
-            for block in {
-                self.cfg.get_basic_block_at(item) for sublist in dsts_ for item in sublist
-            }
-            if block
-        }
+    def _budget_exhausted(self) -> bool:
+        """
+        Check the budget every BUDGET_CHECK_INTERVAL transfers (reading the memory is not free)
+        """
+        if self.incomplete is None and self._budget is not None:
+            if self._budget_countdown == 0:
+                self._budget_countdown = self.BUDGET_CHECK_INTERVAL
+                self.incomplete = self._budget.exhausted()
+            self._budget_countdown -= 1
+        return self.incomplete is not None
 
     def analyze(self) -> List[int]:
         self.cfg.compute_simple_edges(self._key)
-        while self._to_explore:
+        while self._worklist and self.incomplete is None:
+            if self.counter == self.MAXITERATION:
+                self.incomplete = "iterations"
+                break
+            self.counter += 1
             self.explore()
 
         self.cfg.compute_reachability(self._entry_point, self._key)
@@ -0,0 +1,123 @@
+"""
+Order of the exploration of the basic blocks of a function, and widening of the loops
+
+The basic blocks pending are explored by increasing reverse postorder number (Worklist).
+The input stacks of the loop headers, the targets of the back edges, are widened
+(widen_stack) so that the exploration of the loops converges.
+"""
+import heapq
+from typing import Dict, List, Set, Tuple, TYPE_CHECKING
+
+from evm_cfg_builder.value_analysis.abstract_stack import AbsStackElemTable, Stack, merge_stack
+
+if TYPE_CHECKING:
+    from evm_cfg_builder.cfg.basic_block import BasicBlock
+
+
+def loop_headers(order: Dict["BasicBlock", int], key: int) -> Set[int]:
+    """
+    Return the start of the loop headers: the basic blocks targeted by an edge
+    that does not go forward in the reverse postorder (back edge)
+    Args:
+        order (dict(BasicBlock -> int)): reverse postorder numbers
+        key (int): function key
+    Returns:
+        set(int)
+    """
+    return {
+        son.start_pc
+        for bb, number in order.items()
+        for son in bb.outgoing_basic_blocks(key)
+        if son in order and order[son] <= number
+    }
+
+
+def reverse_postorder(entry_point: "BasicBlock", key: int) -> Dict["BasicBlock", int]:
+    """
+    Number the basic blocks reachable from the entry point in reverse postorder
+    Only the edges currently known for the function key are followed
+    Args:
+        entry_point (BasicBlock)
+        key (int): function key
+    Returns:
+        dict(BasicBlock -> int)
+    """
+    postorder: List["BasicBlock"] = []
+    visited = {entry_point}
+    # Iterative DFS. Each entry is a basic block and an iterator over its sons
+    to_visit = [(entry_point, iter(entry_point.outgoing_basic_blocks(key)))]
+    while to_visit:
+        bb, sons = to_visit[-1]
+        for son in sons:
+            if son not in visited:
+                visited.add(son)
+                to_visit.append((son, iter(son.outgoing_basic_blocks(key))))
+                break
+        else:
+            to_visit.pop()
+            postorder.append(bb)
+    number_of_bbs = len(postorder)
+    return {bb: number_of_bbs - 1 - idx for idx, bb in enumerate(postorder)}
+
+
+class Worklist:
+    """Basic blocks pending for the transfer function
+
+    A basic block is pending at most once. Basic blocks are popped by increasing
+    reverse postorder number, so that a basic block is (re)analyzed after its
+    predecessors, except for back edges. Basic blocks not numbered are popped last,
+    by address.
+    """
+
+    def __init__(self) -> None:
+        self._order: Dict["BasicBlock", int] = {}
+        self._heap: List[Tuple[int, int]] = []
+        self._pending: Dict[int, "BasicBlock"] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _priority(self, bb: "BasicBlock") -> Tuple[int, int]:
+        start = bb.start_pc
+        return self._order.get(bb, len(self._order) + start), start
+
+    def set_order(self, order: Dict["BasicBlock", int]) -> None:
+        """
+            Update the reverse postorder numbers, and reorder the pending basic blocks
+        Args:
+            order (dict(BasicBlock -> int))
+        """
+        self._order = order
+        self._heap = [self._priority(bb) for bb in self._pending.values()]
+        heapq.heapify(self._heap)
+
+    def push(self, bb: "BasicBlock") -> None:
+        start = bb.start_pc
+        if start not in self._pending:
+            self._pending[start] = bb
+            heapq.heappush(self._heap, self._priority(bb))
+
+    def pop(self) -> "BasicBlock":
+        _, start = heapq.heappop(self._heap)
+        return self._pending.pop(start)
+
+
+def widen_stack(previous: Stack, stack: Stack, table: AbsStackElemTable, grow: bool) -> Stack:
+    """
+        Widen the stack with the previous stack of the same basic block
+        The stacks are joined (see merge_stack), so that the values of both stacks are kept.
+        If grow is False, the elements of stack above the height of previous are dropped first:
+        the widened stack is not higher than previous
+    Arg:
+        previous (Stack)
+        stack (Stack)
+        table (AbsStackElemTable)
+        grow (bool): True if the widened stack can be higher than previous
+    Returns: New object representing the widening
+    """
+    if not grow:
+        head = stack.head
+        while head is not None and head.depth > previous.depth():
+            head = head.next
+        stack = Stack(table, head)
+    return merge_stack([previous, stack], table)
@@ -12,5 +12,5 @@ cfg = CFG(runtime_bytecode)
 
 for basic_block in cfg.basic_blocks:
     print(
-        f"{basic_block} -> {sorted(basic_block.all_outgoing_basic_blocks, key=lambda x:x.start.pc)}"
+        f"{basic_block} -> {sorted(basic_block.all_outgoing_basic_blocks, key=lambda x: x.start_pc)}"
     )
@@ -23,10 +23,10 @@ for function in sorted(cfg.functions, key=lambda x: x.start_addr):
             print(f"\t\t-{attr}")
 
     print("\n\tBasic Blocks:")
-    for basic_block in sorted(function.basic_blocks, key=lambda x: x.start.pc):
-        # Each basic block has a start and end instruction
-        # instructions are pyevmasm.Instruction objects
-        print(f"\t- @{len(basic_block.start.pc)}-{hex(basic_block.end.pc)}")
+    for basic_block in sorted(function.basic_blocks, key=lambda x: x.start_pc):
+        # Each basic block has a start and end address
+        # start/end and instructions return pyevmasm.Instruction objects
+        print(f"\t- @{hex(basic_block.start_pc)}-{hex(basic_block.end_pc)}")
 
         print("\t\tInstructions:")
         for ins in basic_block.instructions:
@@ -38,12 +38,12 @@ for function in sorted(cfg.functions, key=lambda x: x.start_addr):
         # incoming_basic_blocks(function_key) returns the list for the given function
         print("\t\tIncoming basic_block:")
         for incoming_bb in sorted(
-            basic_block.incoming_basic_blocks(function.key), key=lambda x: x.start.pc
+            basic_block.incoming_basic_blocks(function.key), key=lambda x: x.start_pc
         ):
             print(f"\t\t- {incoming_bb}")
 
         print("\t\tOutgoing basic_block:")
         for outgoing_bb in sorted(
-            basic_block.outgoing_basic_blocks(function.key), key=lambda x: x.start.pc
+            basic_block.outgoing_basic_blocks(function.key), key=lambda x: x.start_pc
         ):
             print(f"\t\t- {outgoing_bb}")
@@ -0,0 +1,79 @@
+"""
+Fixtures shared by the tests
+"""
+import os
+from typing import Any, Callable, Dict, List, Tuple
+
+import pytest
+
+from evm_cfg_builder.cfg.cfg import CFG
+from evm_cfg_builder.value_analysis.value_set_analysis import StackValueAnalysis
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+
+def _read_bytecode(name: str) -> str:
+    with open(os.path.join(TESTS, name), encoding="utf-8") as f:
+        return f.read().strip()
+
+
+@pytest.fixture(name="fomo3d", scope="session")
+def fixture_fomo3d() -> str:
+    """
+    Runtime bytecode of tests/fomo3d.sol
+    """
+    return _read_bytecode("fomo3d.evm")
+
+
+@pytest.fixture(name="recurse", scope="session")
+def fixture_recurse() -> str:
+    """
+    Runtime bytecode of tests/recurse.sol
+    """
+    return _read_bytecode("recurse.evm")
+
+
+@pytest.fixture(name="analyses")
+def fixture_analyses(monkeypatch: pytest.MonkeyPatch) -> List[int]:
+    """
+    Keys of the functions analyzed
+    """
+    keys: List[int] = []
+    analyze = StackValueAnalysis.analyze
+
+    def counting_analyze(self: StackValueAnalysis) -> List[int]:
+        keys.append(self._key)  # pylint: disable=protected-access
+        return analyze(self)
+
+    monkeypatch.setattr(StackValueAnalysis, "analyze", counting_analyze)
+    return keys
+
+
+def cfg_results(cfg: CFG) -> Dict[int, Any]:
+    """
+    Name, entry, basic blocks, edges and attributes of each function
+    """
+    functions = {}
+    for function in cfg.functions:
+        edges: List[Tuple[int, int]] = []
+        for bb in function.basic_blocks:
+            edges += [(bb.start_pc, son.start_pc) for son in bb.outgoing_basic_blocks(function.key)]
+            edges += [
+                (father.start_pc, bb.start_pc) for father in bb.incoming_basic_blocks(function.key)
+            ]
+        functions[function.key] = (
+            function.name,
+            function.start_addr,
+            sorted(bb.start_pc for bb in function.basic_blocks),
+            sorted(set(edges)),
+            sorted(function.attributes),
+        )
+    return functions
+
+
+@pytest.fixture(name="results")
+def fixture_results() -> Callable[[CFG], Dict[int, Any]]:
+    """
+    Results of the analysis of a cfg, to compare two analyses of the same bytecode
+    """
+    return cfg_results
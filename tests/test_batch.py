@@ -0,0 +1,125 @@
+"""
+Batch analysis: inputs, JSONL output, and the failures that must not stop the batch
+"""
+import io
+import json
+import multiprocessing
+import os
+import signal
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from evm_cfg_builder import batch
+from evm_cfg_builder.batch import iter_inputs, run_batch
+
+# The patch of the analysis is inherited by the workers only if they are forked
+FORKED_WORKERS = pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork", reason="the workers are not forked"
+)
+
+# Bytecodes recognized by the patched analysis
+SLOW = "0x5b5b5b"
+CRASH = "0x5b5b5b5b"
+
+
+def _write_contracts(directory: Path, contracts: Dict[str, str]) -> None:
+    directory.mkdir()
+    for name, bytecode in contracts.items():
+        (directory / name).write_text(bytecode, encoding="utf-8")
+
+
+def _run(source: str, **kwargs: Any) -> List[Dict[str, Any]]:
+    output = io.StringIO()
+    counts = run_batch(source, output, **kwargs)
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert sum(counts.values()) == len(results)
+    return sorted(results, key=lambda result: result["id"])
+
+
+@pytest.fixture(name="patched_cfg")
+def fixture_patched_cfg(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    The analysis of SLOW never ends, and the analysis of CRASH kills its process
+    The forked workers inherit the patch
+    """
+    cfg_class = batch.CFG
+
+    def patched(bytecode: Any, **kwargs: Any) -> Any:
+        if bytecode in (SLOW.encode(), SLOW):
+            time.sleep(60)
+        if bytecode in (CRASH.encode(), CRASH):
+            os._exit(137)  # pylint: disable=protected-access
+        return cfg_class(bytecode, **kwargs)
+
+    monkeypatch.setattr(batch, "CFG", patched)
+
+
+def test_iter_inputs(tmp_path: Path, recurse: str) -> None:
+    _write_contracts(tmp_path / "contracts", {"b.evm": recurse, "a.evm": recurse})
+    (tmp_path / "contracts" / "sub").mkdir()
+    directory = str(tmp_path / "contracts")
+    assert [input_id for input_id, _, _ in iter_inputs(directory)] == [
+        os.path.join(directory, "a.evm"),
+        os.path.join(directory, "b.evm"),
+    ]
+
+    pattern = os.path.join(directory, "b*")
+    assert list(iter_inputs(pattern)) == [
+        (os.path.join(directory, "b.evm"),) * 2 + (None,),
+    ]
+
+    jsonl = tmp_path / "contracts.jsonl"
+    jsonl.write_text('{"id": "x", "bytecode": "0x00"}\n\n{"bytecode": "0x00"}\n', encoding="utf-8")
+    assert [(input_id, path) for input_id, path, _ in iter_inputs(str(jsonl))] == [
+        (f"{jsonl}:1", None),
+        (f"{jsonl}:3", None),
+    ]
+
+
+def test_jsonl_output(tmp_path: Path, recurse: str) -> None:
+    jsonl = tmp_path / "contracts.jsonl"
+    records = [{"id": "recurse", "bytecode": recurse}, {"bytecode": recurse}]
+    jsonl.write_text("".join(json.dumps(record) + "\n" for record in records), encoding="utf-8")
+
+    results = _run(str(jsonl))
+    assert [result["id"] for result in results] == [f"{jsonl}:2", "recurse"]
+    for result in results:
+        assert result["status"] == "ok"
+        assert result["basic_blocks"] > 0
+        assert result["functions"]
+        assert all(function["incomplete"] is None for function in result["functions"])
+    assert results[0]["functions"] == results[1]["functions"]
+
+
+@pytest.mark.parametrize("workers", [1, pytest.param(2, marks=FORKED_WORKERS)])
+@pytest.mark.usefixtures("patched_cfg")
+def test_failures_do_not_stop_the_batch(tmp_path: Path, recurse: str, workers: int) -> None:
+    contracts = {"a_ok.evm": recurse, "b_invalid.evm": "0xzz", "c_slow.evm": SLOW}
+    _write_contracts(tmp_path / "contracts", contracts)
+    handler = signal.getsignal(signal.SIGALRM)
+
+    results = _run(str(tmp_path / "contracts"), workers=workers, timeout=0.5)
+    assert [result["status"] for result in results] == ["ok", "error", "timeout"]
+    assert results[1]["error"].startswith("ValueError")
+    # The handler of the caller is restored
+    assert signal.getsignal(signal.SIGALRM) == handler
+
+
+@FORKED_WORKERS
+@pytest.mark.usefixtures("patched_cfg")
+def test_crashed_worker(tmp_path: Path, recurse: str) -> None:
+    contracts = {f"{idx}_ok.evm": recurse for idx in range(4)}
+    contracts["2_crash.evm"] = CRASH
+    _write_contracts(tmp_path / "contracts", contracts)
+
+    results = _run(str(tmp_path / "contracts"), workers=2)
+    assert [(os.path.basename(result["id"]), result["status"]) for result in results] == [
+        ("0_ok.evm", "ok"),
+        ("1_ok.evm", "ok"),
+        ("2_crash.evm", "crashed"),
+        ("2_ok.evm", "ok"),
+        ("3_ok.evm", "ok"),
+    ]
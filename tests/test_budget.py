@@ -0,0 +1,55 @@
+"""
+Analysis stopped by its time budget: the results found before the stop are kept
+"""
+import os
+from pathlib import Path
+from typing import Set, Tuple
+
+import pytest
+
+from evm_cfg_builder.cfg.budget import AnalysisBudget
+from evm_cfg_builder.cfg.cache import CFGCache
+from evm_cfg_builder.cfg.cfg import CFG
+
+
+def dynamic_edges(cfg: CFG) -> Set[Tuple[int, int, int]]:
+    """
+    (function key, source, destination) of the edges that are not static
+    """
+    edges = set()
+    for function in cfg.functions:
+        for bb in function.basic_blocks:
+            static = cfg.edges.static_successor(bb)
+            for son in bb.outgoing_basic_blocks(function.key):
+                if son is not static:
+                    edges.add((function.key, bb.start_pc, son.start_pc))
+    return edges
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_exhausted_function_time(fomo3d: str, workers: int) -> None:
+    cfg = CFG(fomo3d, workers=workers, budget=AnalysisBudget(function_time=0))
+    assert all(function.incomplete_reason == "function time" for function in cfg.functions)
+    # The entry of each function is explored before the first check of the budget
+    assert all(function.entry in function.basic_blocks for function in cfg.functions)
+
+    # The edges found by the transfer of the entries are kept
+    edges = dynamic_edges(cfg)
+    assert edges
+    assert edges < dynamic_edges(CFG(fomo3d))
+
+
+def test_small_function_time(fomo3d: str) -> None:
+    cfg = CFG(fomo3d, budget=AnalysisBudget(function_time=5e-4))
+    assert all(function.basic_blocks for function in cfg.functions)
+    assert all(function.incomplete_reason in (None, "function time") for function in cfg.functions)
+
+
+def test_incomplete_not_cached(fomo3d: str, tmp_path: Path) -> None:
+    cache = CFGCache(str(tmp_path / "cache"))
+    cfg = CFG(fomo3d, cache=cache, budget=AnalysisBudget(function_time=0))
+    assert any(function.incomplete for function in cfg.functions)
+    assert not os.path.exists(cache.directory)
+
+    CFG(fomo3d, cache=cache)
+    assert len(os.listdir(cache.directory)) == 1
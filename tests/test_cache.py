@@ -0,0 +1,150 @@
+"""
+On-disk cache of the analysis results
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+from evm_cfg_builder.batch import BatchTimeout
+from evm_cfg_builder.cfg.cache import CACHE_VERSION, CFGCache
+from evm_cfg_builder.cfg.cfg import CFG
+
+
+def entries(cache: CFGCache) -> List[str]:
+    return sorted(name for name in os.listdir(cache.directory) if name.endswith(".json"))
+
+
+def test_hit_runs_no_analysis(
+    fomo3d: str,
+    analyses: List[int],
+    tmp_path: Path,
+    results: Callable[[CFG], Dict[int, Any]],
+) -> None:
+    cache = CFGCache(str(tmp_path))
+    expected = results(CFG(fomo3d, cache=cache))
+    assert len(entries(cache)) == 1
+    analyses.clear()
+
+    cfg = CFG(fomo3d, cache=cache)
+    assert not analyses
+    assert results(cfg) == expected
+    assert not analyses
+
+
+def test_lazy_store_and_hit_run_no_analysis(
+    fomo3d: str, analyses: List[int], tmp_path: Path
+) -> None:
+    cache = CFGCache(str(tmp_path))
+    CFG(fomo3d, compute_cfgs=False, cache=cache)
+    cfg = CFG(fomo3d, compute_cfgs=False, cache=cache)
+    assert not analyses
+
+    # The CFGs are computed on demand after a hit
+    function = cfg.get_function_by_key(0x70A08231)
+    assert function is not None
+    assert function.attributes == ["view"]
+    assert analyses == [function.key]
+
+
+def test_key(fomo3d: str, recurse: str) -> None:
+    key = CFGCache.key(fomo3d.encode(), True, True)
+    assert key == CFGCache.key(fomo3d.encode(), True, True)
+    assert key != CFGCache.key(recurse.encode(), True, True)
+    assert key != CFGCache.key(fomo3d.encode(), False, True)
+    assert key != CFGCache.key(fomo3d.encode(), True, False)
+
+
+def test_options_miss(recurse: str, analyses: List[int], tmp_path: Path) -> None:
+    cache = CFGCache(str(tmp_path))
+    CFG(recurse, cache=cache)
+    analyses.clear()
+    CFG(recurse, optimization_enabled=False, cache=cache)
+    assert analyses
+    assert len(entries(cache)) == 2
+
+
+def _corrupt(cache: CFGCache, content: str) -> None:
+    (name,) = entries(cache)
+    with open(os.path.join(cache.directory, name), "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        json.dumps({"version": CACHE_VERSION - 1, "functions": []}),
+        '{"version": ',
+        "[]",
+        json.dumps({"version": CACHE_VERSION}),
+        json.dumps(
+            {
+                "version": CACHE_VERSION,
+                "functions": [{"hash_id": 0, "start_addr": 1, "attributes": [], "cfg": None}],
+            }
+        ),
+        json.dumps(
+            {
+                "version": CACHE_VERSION,
+                "functions": [{"hash_id": 0, "start_addr": 0, "attributes": [], "cfg": [[0]]}],
+            }
+        ),
+    ],
+    ids=["version", "corrupt", "list", "no-functions", "start-addr", "function-cfg"],
+)
+def test_invalid_entry(
+    recurse: str,
+    analyses: List[int],
+    tmp_path: Path,
+    content: str,
+    results: Callable[[CFG], Dict[int, Any]],
+) -> None:
+    cache = CFGCache(str(tmp_path))
+    expected = results(CFG(recurse, cache=cache))
+    _corrupt(cache, content)
+    analyses.clear()
+
+    cfg = CFG(recurse, cache=cache)
+    assert analyses
+    assert results(cfg) == expected
+    # The entry is replaced
+    analyses.clear()
+    CFG(recurse, cache=cache)
+    assert not analyses
+
+
+def test_eviction(fomo3d: str, recurse: str, tmp_path: Path) -> None:
+    cache = CFGCache(str(tmp_path))
+    fomo3d_entry, recurse_entry = (
+        f"{CFGCache.key(CFG(bytecode, cache=cache).bytecode or b'', True, True)}.json"
+        for bytecode in (fomo3d, recurse)
+    )
+    assert entries(cache) == sorted([fomo3d_entry, recurse_entry])
+
+    # fomo3d is the least recently used
+    os.utime(os.path.join(cache.directory, fomo3d_entry), (1, 1))
+    recurse_size = os.path.getsize(os.path.join(cache.directory, recurse_entry))
+    cache = CFGCache(str(tmp_path), max_size=recurse_size)
+    cache.evict()
+    assert entries(cache) == [recurse_entry]
+
+    cache.clear()
+    assert not entries(cache)
+
+
+def test_store_interrupted(monkeypatch: pytest.MonkeyPatch, recurse: str, tmp_path: Path) -> None:
+    """
+    The temporary file is removed when the write is interrupted, e.g. by the timeout of a batch
+    """
+    cfg = CFG(recurse)
+    cache = CFGCache(str(tmp_path))
+
+    def interrupted_dump(*_args: Any, **_kwargs: Any) -> None:
+        raise BatchTimeout()
+
+    monkeypatch.setattr(json, "dump", interrupted_dump)
+    with pytest.raises(BatchTimeout):
+        cache.store(cfg, True)
+    assert not os.listdir(cache.directory)
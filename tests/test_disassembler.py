@@ -0,0 +1,99 @@
+"""
+Comparison of the single-pass disassembler with the split of pyevmasm.disassemble_all
+"""
+import random
+from typing import List, Optional, Tuple
+
+import pytest
+from pyevmasm import disassemble_all
+
+from evm_cfg_builder.cfg.cfg import convert_bytecode
+from evm_cfg_builder.cfg.disassembler import BASIC_BLOCK_END, OPCODE_NAMES, disassemble
+
+# (pc, name, operand) of each instruction, and (first pc, last pc) of each basic block
+Instructions = List[Tuple[int, str, Optional[int]]]
+BasicBlocks = List[Tuple[int, int]]
+
+
+def split_with_pyevmasm(bytecode: bytes) -> Tuple[Instructions, BasicBlocks]:
+    """
+    Previous splitter: a JUMPDEST starts a basic block, a terminating instruction ends it
+    """
+    instructions: Instructions = [
+        (ins.pc, ins.name, ins.operand if ins.has_operand else None)
+        for ins in disassemble_all(bytecode)
+    ]
+    basic_blocks: BasicBlocks = []
+    start: Optional[int] = None
+    for idx, (_, name, _) in enumerate(instructions):
+        if name == "JUMPDEST" and start is not None:
+            basic_blocks.append((instructions[start][0], instructions[idx - 1][0]))
+            start = None
+        if start is None:
+            start = idx
+        if name in BASIC_BLOCK_END:
+            basic_blocks.append((instructions[start][0], instructions[idx][0]))
+            start = None
+    if start is not None:
+        basic_blocks.append((instructions[start][0], instructions[-1][0]))
+    return instructions, basic_blocks
+
+
+def split_in_one_pass(bytecode: bytes) -> Tuple[Instructions, BasicBlocks]:
+    disassembly = disassemble(bytecode)
+    pcs = disassembly.pcs
+    instructions: Instructions = [
+        (pc, OPCODE_NAMES[opcode], disassembly.operands.get(idx))
+        for idx, (pc, opcode) in enumerate(zip(pcs, disassembly.opcodes))
+    ]
+    basic_blocks: BasicBlocks = [
+        (pcs[first], pcs[last]) for first, last in disassembly.basic_blocks
+    ]
+    return instructions, basic_blocks
+
+
+EDGE_CASES = {
+    "empty": "",
+    # PUSH2 0x0102 at the end of the code
+    "push_at_end": "60016101025b610102",
+    # PUSH2 0x5b5b: the JUMPDEST bytes are data
+    "jumpdest_in_push_data": "615b5b5b00615b5b56",
+    # PUSH32 with 3 bytes of data
+    "truncated_push": "6001565b7f010203",
+    "truncated_push_after_jumpdest": "5b61ff",
+    # 0x0c and 0xfe: unknown opcode and INVALID
+    "invalid": "600c0cfe5b00",
+}
+
+
+@pytest.mark.parametrize("bytecode", EDGE_CASES.values(), ids=EDGE_CASES.keys())
+def test_edge_cases(bytecode: str) -> None:
+    code = bytes.fromhex(bytecode)
+    assert split_in_one_pass(code) == split_with_pyevmasm(code)
+
+
+def test_jumpdest_in_push_data() -> None:
+    disassembly = disassemble(bytes.fromhex(EDGE_CASES["jumpdest_in_push_data"]))
+    assert [pc for pc, jumpdest in enumerate(disassembly.jumpdests) if jumpdest] == [3]
+
+
+def test_truncated_push_is_dropped() -> None:
+    instructions, _ = split_in_one_pass(bytes.fromhex(EDGE_CASES["truncated_push"]))
+    assert [name for _, name, _ in instructions] == ["PUSH1", "JUMP", "JUMPDEST"]
+
+
+@pytest.mark.parametrize("name", ["fomo3d", "recurse"])
+def test_fixtures(request: pytest.FixtureRequest, name: str) -> None:
+    # The metadata is kept: it is data decoded as code
+    code = convert_bytecode(request.getfixturevalue(name))
+    assert code is not None
+    instructions, basic_blocks = split_in_one_pass(code)
+    assert (instructions, basic_blocks) == split_with_pyevmasm(code)
+    assert basic_blocks
+
+
+def test_random_bytecode() -> None:
+    rng = random.Random(0)
+    for _ in range(200):
+        code = bytes(rng.randrange(256) for _ in range(rng.randrange(1, 200)))
+        assert split_in_one_pass(code) == split_with_pyevmasm(code)
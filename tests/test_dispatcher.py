@@ -0,0 +1,230 @@
+"""
+Recovery of the functions from Vyper-style dispatchers
+
+The contracts are assembled from the listings below: `name:` defines a label, `@name` pushes
+the address of a label (PUSH2), and a tuple appends data: (size, value, size, value, ...)
+where size is "u<number of bytes>" and value is a label or an integer
+"""
+from typing import Dict, List, Set, Tuple, Union
+
+import pyevmasm
+import pytest
+
+from evm_cfg_builder.cfg.cfg import CFG
+from evm_cfg_builder.cfg.function import Function
+
+Listing = List[Union[str, Tuple[str, ...]]]
+
+FALLBACK = Function.FALLBACK_ID
+SELECTORS = {0x11111111, 0x22222222, 0x33333333}
+
+
+def _size(item: Union[str, Tuple[str, ...]]) -> int:
+    if isinstance(item, tuple):
+        return sum(int(size[1:]) for size in item[::2])
+    if item.endswith(":"):
+        return 0
+    if item.startswith("@"):
+        return 3
+    return len(pyevmasm.assemble_one(item).bytes)
+
+
+def assemble(listing: Listing) -> Tuple[bytes, Dict[str, int]]:
+    """
+    Return the bytecode and the address of the labels
+    """
+    labels: Dict[str, int] = {}
+    pc = 0
+    for item in listing:
+        if isinstance(item, str) and item.endswith(":"):
+            labels[item[:-1]] = pc
+        pc += _size(item)
+
+    code = b""
+    for item in listing:
+        if isinstance(item, tuple):
+            for size, value in zip(item[::2], item[1::2]):
+                number = labels[value] if value in labels else int(value, 0)
+                code += number.to_bytes(int(size[1:]), "big")
+        elif item.startswith("@"):
+            code += pyevmasm.assemble_one(f"PUSH2 {labels[item[1:]]}").bytes
+        elif not item.endswith(":"):
+            code += pyevmasm.assemble_one(item).bytes
+    return code, labels
+
+
+def functions(bytecode: bytes) -> Set[Tuple[int, int]]:
+    """
+    Return the (selector, start address) of the functions found, without the dispatcher
+    """
+    cfg = CFG(bytecode, remove_metadata=False, compute_cfgs=False)
+    return {
+        (function.hash_id, function.start_addr)
+        for function in cfg.functions
+        if function.hash_id != Function.DISPATCHER_ID
+    }
+
+
+SELECTOR_LOAD = ["PUSH1 0x0", "CALLDATALOAD", "PUSH1 0xe0", "SHR"]
+
+# The calldatasize check jumps to the fallback. The sparse table holds the start of the chain
+# of each bucket (2 bytes per bucket)
+SPARSE: Listing = [
+    "PUSH1 0x4",
+    "CALLDATASIZE",
+    "LT",
+    "@fallback",
+    "JUMPI",
+    *SELECTOR_LOAD,
+    "PUSH1 0x2",
+    "PUSH1 0x1",
+    "DUP3",
+    "AND",
+    "PUSH1 0x1",
+    "SHL",
+    "@table",
+    "ADD",
+    "PUSH1 0x1e",
+    "CODECOPY",
+    "PUSH1 0x0",
+    "MLOAD",
+    "JUMP",
+    # Bucket 0: `selector XOR`, the function is at the fallthrough
+    "bucket0:",
+    "JUMPDEST",
+    "DUP1",
+    "PUSH4 0x11111111",
+    "XOR",
+    "@next0",
+    "JUMPI",
+    "f1:",
+    "STOP",
+    # Check of the call value between two comparisons
+    "next0:",
+    "JUMPDEST",
+    "CALLVALUE",
+    "@fallback",
+    "JUMPI",
+    "DUP1",
+    "PUSH4 0x33333333",
+    "EQ",
+    "ISZERO",
+    "@fallback",
+    "JUMPI",
+    "f3:",
+    "STOP",
+    # Bucket 1: `selector EQ ISZERO`
+    "bucket1:",
+    "JUMPDEST",
+    "DUP1",
+    "PUSH4 0x22222222",
+    "EQ",
+    "ISZERO",
+    "@fallback",
+    "JUMPI",
+    "f2:",
+    "STOP",
+    "fallback:",
+    "JUMPDEST",
+    "PUSH1 0x0",
+    "DUP1",
+    "REVERT",
+    "table:",
+    ("u2", "bucket0", "u2", "bucket1"),
+]
+
+# The calldatasize check falls through to the fallback. Each bucket of the dense table holds
+# a magic (2 bytes), the offset of its entries (2 bytes) and their number (1 byte). Each entry
+# holds a selector (4 bytes), the start of the function (2 bytes) and flags (1 byte)
+DENSE: Listing = [
+    "PUSH1 0x4",
+    "CALLDATASIZE",
+    "LT",
+    "ISZERO",
+    "@dispatch",
+    "JUMPI",
+    "fallback:",
+    "JUMPDEST",
+    "PUSH1 0x0",
+    "DUP1",
+    "REVERT",
+    "dispatch:",
+    "JUMPDEST",
+    *SELECTOR_LOAD,
+    "PUSH1 0x5",
+    "PUSH1 0x5",
+    "PUSH1 0x1",
+    "DUP4",
+    "AND",
+    "MUL",
+    "@buckets",
+    "ADD",
+    "PUSH1 0x1b",
+    "CODECOPY",
+    "PUSH1 0x0",
+    "MLOAD",
+    "PUSH1 0x7",
+    "DUP3",
+    "MLOAD",
+    "EQ",
+    "ISZERO",
+    "@fallback",
+    "JUMPI",
+    "PUSH1 0x0",
+    "MLOAD",
+    "JUMP",
+    "f1:",
+    "JUMPDEST",
+    "STOP",
+    "f2:",
+    "JUMPDEST",
+    "STOP",
+    "f3:",
+    "JUMPDEST",
+    "STOP",
+    "buckets:",
+    ("u2", "0xabcd", "u2", "entries0", "u1", "2"),
+    ("u2", "0xabcd", "u2", "entries1", "u1", "1"),
+    "entries0:",
+    ("u4", "0x11111111", "u2", "f1", "u1", "0"),
+    ("u4", "0x22222222", "u2", "f2", "u1", "0"),
+    "entries1:",
+    ("u4", "0x33333333", "u2", "f3", "u1", "0"),
+]
+
+
+def test_sparse_table() -> None:
+    bytecode, labels = assemble(SPARSE)
+    assert functions(bytecode) == {
+        (FALLBACK, labels["fallback"]),
+        (0x11111111, labels["f1"]),
+        (0x22222222, labels["f2"]),
+        (0x33333333, labels["f3"]),
+    }
+
+
+def test_dense_table() -> None:
+    bytecode, labels = assemble(DENSE)
+    assert functions(bytecode) == {
+        (FALLBACK, labels["fallback"]),
+        (0x11111111, labels["f1"]),
+        (0x22222222, labels["f2"]),
+        (0x33333333, labels["f3"]),
+    }
+
+
+@pytest.mark.parametrize(
+    "listing,old,new",
+    [
+        # A bucket of 2 bytes needs a shift of 1
+        (SPARSE, "PUSH1 0x2", "PUSH1 0x3"),
+        # Entries of 8 bytes are not a dense table
+        (DENSE, "PUSH1 0x7", "PUSH1 0x8"),
+    ],
+)
+def test_unknown_table_layout(listing: Listing, old: str, new: str) -> None:
+    idx = listing.index(old)
+    bytecode, labels = assemble(listing[:idx] + [new] + listing[idx + 1 :])
+    found = functions(bytecode)
+    assert (FALLBACK, labels["fallback"]) in found
+    assert not SELECTORS & {selector for selector, _ in found}
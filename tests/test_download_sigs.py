@@ -0,0 +1,187 @@
+"""
+Synchronization of the signatures against a local stub of the 4byte API
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Iterator, List, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+pytest.importorskip("requests")
+
+# pylint: disable=wrong-import-position
+from evm_cfg_builder.known_hashes import download_sigs
+from evm_cfg_builder.known_hashes.download_sigs import Checkpoint, save_results, sync
+from evm_cfg_builder.known_hashes.selector_table import SelectorTable, write_selector_table
+
+PAGE_SIZE = 3
+
+
+class StubAPI:
+    """Paginated signatures, ordered by creation date
+
+    - signatures: (selector, signature) of all the pages
+    - failing: pages answered with a 404
+    - requested: pages requested
+    """
+
+    def __init__(self, signatures: List[Tuple[int, str]]) -> None:
+        self.signatures = signatures
+        self.failing: Set[int] = set()
+        self.requested: List[int] = []
+        self.lock = threading.Lock()
+
+    @property
+    def pages(self) -> int:
+        return -(-len(self.signatures) // PAGE_SIZE)
+
+    def page(self, page: int) -> Any:
+        with self.lock:
+            self.requested.append(page)
+        if page in self.failing or not 1 <= page <= self.pages:
+            return None
+        # The first pages are the slowest: the pages are not received in order
+        time.sleep(0.01 * (self.pages - page))
+        results = self.signatures[(page - 1) * PAGE_SIZE : page * PAGE_SIZE]
+        return {
+            "count": len(self.signatures),
+            "results": [
+                {"hex_signature": f"{selector:#010x}", "text_signature": signature}
+                for selector, signature in results
+            ],
+        }
+
+
+@pytest.fixture(name="api")
+def fixture_api() -> Iterator[Tuple[StubAPI, str]]:
+    """
+    Stub API on 127.0.0.1, and its url
+    """
+    stub = StubAPI([(0x1000 + idx, f"f{idx}()") for idx in range(20)])
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # pylint: disable=invalid-name
+            query = parse_qs(urlparse(self.path).query)
+            data = stub.page(int(query["page"][0]))
+            body = json.dumps(data if data is not None else {"detail": "Invalid page."})
+            self.send_response(200 if data is not None else 404)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *_args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield stub, f"http://127.0.0.1:{server.server_address[1]}/api/v1/signatures/"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(name="table")
+def fixture_table(tmp_path: Path) -> SelectorTable:
+    path = str(tmp_path / "known_hashes.bin")
+    write_selector_table(path, {0x1005: "known()"})
+    return SelectorTable(path)
+
+
+def test_merge_in_page_order(
+    api: Tuple[StubAPI, str], table: SelectorTable, tmp_path: Path
+) -> None:
+    stub, url = api
+    # Collision: the signature of the first page is kept
+    stub.signatures[10] = (0x1001, "collision()")
+    checkpoint = sync(url, 4, str(tmp_path / "checkpoint.json"), table=table)
+
+    expected = [
+        (selector, signature)
+        for selector, signature in stub.signatures
+        if signature not in ("known()", "collision()")
+    ]
+    expected.remove((0x1005, "f5()"))
+    assert list(checkpoint.pending.items()) == expected
+    assert checkpoint.last_page == stub.pages
+
+
+def test_resume_after_failure(
+    api: Tuple[StubAPI, str], table: SelectorTable, tmp_path: Path
+) -> None:
+    stub, url = api
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    stub.failing.add(5)
+    with pytest.raises(download_sigs.requests.HTTPError):
+        sync(url, 2, checkpoint_path, checkpoint_every=2, table=table)
+
+    # The pages merged before the failing page are in the checkpoint
+    interrupted = Checkpoint.load(checkpoint_path, url)
+    assert interrupted.last_page == 4
+    assert len(interrupted.pending) == 4 * PAGE_SIZE - 1
+
+    stub.failing.clear()
+    stub.requested.clear()
+    checkpoint = sync(url, 2, checkpoint_path, checkpoint_every=2, table=table)
+    # The last page fetched is fetched again
+    assert sorted(stub.requested) == list(range(4, stub.pages + 1))
+    assert checkpoint.last_page == stub.pages
+    assert len(checkpoint.pending) == len(stub.signatures) - 1
+    assert Checkpoint.load(checkpoint_path, url).pending == checkpoint.pending
+
+
+def test_known_selectors_not_overwritten(
+    api: Tuple[StubAPI, str], table: SelectorTable, tmp_path: Path
+) -> None:
+    _, url = api
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    save_results(sync(url, 4, checkpoint_path, table=table), checkpoint_path, table)
+
+    saved = SelectorTable(table.path)
+    assert saved[0x1005] == "known()"
+    assert saved[0x1000] == "f0()"
+    assert len(saved) == 20
+    assert not Checkpoint.load(checkpoint_path, url).pending
+    assert not os.path.exists(checkpoint_path + ".journal")
+
+
+def test_no_new_page(api: Tuple[StubAPI, str], table: SelectorTable, tmp_path: Path) -> None:
+    stub, url = api
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    save_results(sync(url, 4, checkpoint_path, table=table), checkpoint_path, table)
+    saved = os.stat(table.path)
+
+    stub.requested.clear()
+    table = SelectorTable(table.path)
+    checkpoint = sync(url, 4, checkpoint_path, table=table)
+    assert stub.requested == [stub.pages]
+    assert not checkpoint.pending
+    save_results(checkpoint, checkpoint_path, table)
+    after = os.stat(table.path)
+    assert (after.st_ino, after.st_mtime_ns) == (saved.st_ino, saved.st_mtime_ns)
+
+
+def test_interrupted_journal(tmp_path: Path) -> None:
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    checkpoint = Checkpoint("url")
+    checkpoint.add(1, "a()")
+    checkpoint.save(checkpoint_path)
+    checkpoint.add(2, "b()")
+    checkpoint.save(checkpoint_path)
+    # A save interrupted in the middle of the journal line
+    with open(checkpoint_path + ".journal", "a", encoding="utf-8") as f:
+        f.write('{"0x00000003": "c(')
+
+    loaded = Checkpoint.load(checkpoint_path, "url")
+    assert loaded.pending == {1: "a()", 2: "b()"}
+    loaded.add(4, "d()")
+    loaded.save(checkpoint_path)
+    assert Checkpoint.load(checkpoint_path, "url").pending == {1: "a()", 2: "b()", 4: "d()"}
+
+    # Another url: the journal is discarded
+    assert not Checkpoint.load(checkpoint_path, "other").pending
+    assert not os.path.exists(checkpoint_path + ".journal")
@@ -0,0 +1,152 @@
+"""
+Edges of the CFG: static layer, scopes of the functions and union of the dynamic edges
+"""
+from typing import List, cast
+
+import pytest
+
+from evm_cfg_builder.cfg.basic_block import BasicBlock
+from evm_cfg_builder.cfg.edges import EdgeTable
+
+F1 = 1
+F2 = 2
+
+
+# pylint: disable=too-few-public-methods
+class Node:
+    """Stand-in for a basic block: the table only needs hashable objects"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+def names(bbs: List[BasicBlock]) -> List[str]:
+    return [repr(bb) for bb in bbs]
+
+
+@pytest.fixture(name="bbs")
+def fixture_bbs() -> List[BasicBlock]:
+    return [cast(BasicBlock, Node(f"bb{idx}")) for idx in range(6)]
+
+
+@pytest.fixture(name="table")
+def fixture_table(bbs: List[BasicBlock]) -> EdgeTable:
+    """
+    bb0 -> bb1 and bb2 -> bb3 are static edges
+    """
+    table = EdgeTable()
+    for bb in bbs:
+        table.add_basic_block(bb)
+    table.add_static_edge(bbs[0], bbs[1])
+    table.add_static_edge(bbs[2], bbs[3])
+    return table
+
+
+def test_static_edges_shared(table: EdgeTable, bbs: List[BasicBlock]) -> None:
+    table.open_scope(F1)
+    table.open_scope(F2)
+    for key in (F1, F2):
+        assert names(table.outgoing(key, bbs[0])) == ["bb1"]
+        assert names(table.incoming(key, bbs[3])) == ["bb2"]
+    assert table.static_successor(bbs[0]) is bbs[1]
+    assert table.static_successor(bbs[1]) is None
+
+    # A static edge is not duplicated in the dynamic layer
+    table.add_edge(F1, bbs[0], bbs[1])
+    assert names(table.outgoing(F1, bbs[0])) == ["bb1"]
+    assert names(table.all_outgoing(bbs[0])) == ["bb1"]
+
+
+def test_scope(table: EdgeTable, bbs: List[BasicBlock]) -> None:
+    # No scope: the static edges are not visible
+    assert not table.outgoing(F1, bbs[0])
+    assert not table.all_outgoing(bbs[0])
+
+    table.open_scope(F1)
+    assert names(table.outgoing(F1, bbs[2])) == ["bb3"]
+    assert names(table.all_outgoing(bbs[2])) == ["bb3"]
+
+    # Restricted to bb0 and bb1: only their static edges stay visible
+    table.set_reachable(F1, [bbs[0], bbs[1]])
+    assert names(table.outgoing(F1, bbs[0])) == ["bb1"]
+    assert names(table.incoming(F1, bbs[1])) == ["bb0"]
+    assert not table.outgoing(F1, bbs[2])
+    assert not table.all_outgoing(bbs[2])
+    assert names(table.all_outgoing(bbs[0])) == ["bb1"]
+    assert table.outgoing_as_dict(bbs[0]) == {F1: [bbs[1]]}
+
+    # Opening the scope again replaces the restricted scope
+    table.open_scope(F1)
+    assert names(table.outgoing(F1, bbs[2])) == ["bb3"]
+
+
+def test_scope_keeps_incoming_from_outside(table: EdgeTable, bbs: List[BasicBlock]) -> None:
+    """
+    The entry of a function keeps its static edge from a basic block out of the scope
+    """
+    table.open_scope(F1)
+    table.set_reachable(F1, [bbs[1]])
+    assert names(table.incoming(F1, bbs[1])) == ["bb0"]
+    assert not table.outgoing(F1, bbs[0])
+
+
+def test_union_reference_count(table: EdgeTable, bbs: List[BasicBlock]) -> None:
+    table.open_scope(F1)
+    table.open_scope(F2)
+    table.add_edge(F1, bbs[1], bbs[4])
+    table.add_edge(F1, bbs[1], bbs[4])
+    table.add_edge(F2, bbs[1], bbs[4])
+    table.add_edge(F2, bbs[1], bbs[5])
+    assert names(table.all_outgoing(bbs[1])) == ["bb4", "bb5"]
+    assert names(table.all_incoming(bbs[4])) == ["bb1"]
+
+    # bb1 -> bb4 is still an edge of F1
+    table.remove_key(F2)
+    assert names(table.all_outgoing(bbs[1])) == ["bb4"]
+    assert not table.all_incoming(bbs[5])
+
+    table.remove_key(F1)
+    assert not table.all_outgoing(bbs[1])
+    assert not table.all_incoming(bbs[4])
+
+
+def test_per_scope_isolation(table: EdgeTable, bbs: List[BasicBlock]) -> None:
+    table.open_scope(F1)
+    table.open_scope(F2)
+    table.add_edge(F1, bbs[1], bbs[4])
+    table.add_edge(F2, bbs[3], bbs[5])
+    assert names(table.outgoing(F1, bbs[1])) == ["bb4"]
+    assert not table.outgoing(F2, bbs[1])
+    assert names(table.outgoing(F2, bbs[3])) == ["bb5"]
+    assert not table.incoming(F1, bbs[5])
+    assert table.outgoing_as_dict(bbs[1]) == {F1: [bbs[4]]}
+    assert table.incoming_as_dict(bbs[5]) == {F2: [bbs[3]]}
+
+    # Restricting the scope of F1 does not change the static edges of F2
+    table.set_reachable(F1, [bbs[1], bbs[4]])
+    assert names(table.outgoing(F2, bbs[2])) == ["bb3"]
+    assert names(table.all_outgoing(bbs[2])) == ["bb3"]
+
+
+def test_remove_edges(table: EdgeTable, bbs: List[BasicBlock]) -> None:
+    table.open_scope(F1)
+    table.add_edge(F1, bbs[1], bbs[4])
+    table.add_edge(F1, bbs[3], bbs[5])
+
+    # The dynamic edges out of the reachable basic blocks are removed
+    table.set_reachable(F1, [bbs[0], bbs[1], bbs[4]])
+    assert names(table.outgoing(F1, bbs[1])) == ["bb4"]
+    assert not table.outgoing(F1, bbs[3])
+    assert not table.incoming(F1, bbs[5])
+    assert not table.all_outgoing(bbs[3])
+
+    table.remove_key(F1)
+    assert not table.outgoing(F1, bbs[0])
+    assert not table.outgoing(F1, bbs[1])
+    assert not table.all_incoming(bbs[4])
+    assert not table.outgoing_as_dict(bbs[1])
+    # The static layer is kept
+    assert table.static_successor(bbs[0]) is bbs[1]
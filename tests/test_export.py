@@ -0,0 +1,172 @@
+"""
+Export of the CFGs: formats, gzip, single file, and files written by a pool of processes
+"""
+import gzip
+import json
+import multiprocessing
+import os
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, Set, Tuple
+
+import pytest
+
+from evm_cfg_builder.cfg import cfg as cfg_module
+from evm_cfg_builder.cfg.cfg import CFG
+from evm_cfg_builder.cfg.export import GraphExporter, export_cfg
+
+GRAPHML = "{http://graphml.graphdrawing.org/xmlns}"
+
+EXPECTED_FOMO3D = os.path.join(os.path.dirname(os.path.abspath(__file__)), "expected-fomo3d-output")
+
+# Signatures of the functions of tests/fomo3d.sol, used to name the expected files
+FOMO3D_SIGNATURES = {
+    0x0065318B: "dividendsOf(address)",
+    0x06FDDE03: "name()",
+    0x10D0FFDD: "calculateTokensReceived(uint256)",
+    0x18160DDD: "totalSupply()",
+    0x22609373: "calculateEthereumReceived(uint256)",
+    0x27DEFA1F: "onlyAmbassadors()",
+    0x313CE567: "decimals()",
+    0x392EFB52: "administrators(bytes32)",
+    0x3CCFD60B: "withdraw()",
+    0x4B750334: "sellPrice()",
+    0x56D399E8: "stakingRequirement()",
+    0x688ABBF7: "myDividends(bool)",
+    0x6B2F4632: "totalEthereumBalance()",
+    0x70A08231: "balanceOf(address)",
+    0x8328B610: "setStakingRequirement(uint256)",
+    0x8620410B: "buyPrice()",
+    0x89135AE9: "setAdministrator(bytes32,bool)",
+    0x8FEA64BD: "Hourglass()",
+    0x949E8ACD: "myTokens()",
+    0x95D89B41: "symbol()",
+    0xA8E04F34: "disableInitialStage()",
+    0xA9059CBB: "transfer(address,uint256)",
+    0xB84C8246: "setSymbol(string)",
+    0xC47F0027: "setName(string)",
+    0xE4849B32: "sell(uint256)",
+    0xE9FAD8EE: "exit()",
+    0xF088D547: "buy(address)",
+    0xFDB5A03E: "reinvest()",
+}
+
+
+@pytest.fixture(name="recurse_cfg", scope="module")
+def fixture_recurse_cfg(recurse: str) -> CFG:
+    return CFG(recurse)
+
+
+def expected_graphs(cfg: CFG) -> Dict[str, Tuple[Set[int], Set[Tuple[int, int]]]]:
+    """
+    Nodes and edges of the full graph and of each function
+    The nodes of the dispatcher include the entries of the functions called
+    """
+    graphs = {
+        "FULL_GRAPH": (
+            {bb.start_pc for bb in cfg.basic_blocks},
+            {
+                (bb.start_pc, son.start_pc)
+                for bb in cfg.basic_blocks
+                for son in bb.all_outgoing_basic_blocks
+            },
+        )
+    }
+    for function in cfg.functions:
+        nodes = {bb.start_pc for bb in function.basic_blocks}
+        if function.name == "_dispatcher":
+            nodes |= {f.start_addr for f in cfg.functions if f != function}
+        graphs[function.name] = (
+            nodes,
+            {
+                (bb.start_pc, son.start_pc)
+                for bb in function.basic_blocks
+                for son in bb.outgoing_basic_blocks(function.key)
+            },
+        )
+    return graphs
+
+
+def test_exporter_is_abstract() -> None:
+    with pytest.raises(TypeError):
+        GraphExporter()  # type: ignore[abstract] # pylint: disable=abstract-class-instantiated
+
+
+def test_jsonl(recurse_cfg: CFG, tmp_path: Path) -> None:
+    (path,) = export_cfg(
+        recurse_cfg, str(tmp_path / "recurse_"), exporter="jsonl", single_file=True
+    )
+    assert os.path.basename(path) == "recurse_-ALL_GRAPHS.jsonl"
+
+    graphs: Dict[str, Tuple[Set[int], Set[Tuple[int, int]]]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if "key" in record:
+                graphs[record["graph"]] = (set(), set())
+            elif "node" in record:
+                assert record["label"]
+                graphs[record["graph"]][0].add(record["node"])
+            else:
+                src, dst = record["edge"]
+                graphs[record["graph"]][1].add((src, dst))
+    assert graphs == expected_graphs(recurse_cfg)
+
+
+def test_graphml_gzip(recurse_cfg: CFG, tmp_path: Path) -> None:
+    paths = export_cfg(recurse_cfg, str(tmp_path / "recurse_"), exporter="graphml", compress=True)
+    expected = expected_graphs(recurse_cfg)
+    assert sorted(os.path.basename(path) for path in paths) == sorted(
+        f"recurse_{'-' if name == 'FULL_GRAPH' else ''}{name}.graphml.gz" for name in expected
+    )
+
+    for path in paths:
+        with gzip.open(path) as f:
+            root = ET.parse(f).getroot()
+        (graph,) = root.iter(f"{GRAPHML}graph")
+        name = graph.get("id")
+        assert name is not None
+
+        def node_id(attr: str, name: str = name) -> int:
+            prefix, addr = attr.rsplit(":", 1)
+            assert prefix == name
+            return int(addr)
+
+        nodes = {node_id(node.get("id", "")) for node in graph.iter(f"{GRAPHML}node")}
+        edges = {
+            (node_id(edge.get("source", "")), node_id(edge.get("target", "")))
+            for edge in graph.iter(f"{GRAPHML}edge")
+        }
+        assert (nodes, edges) == expected[name]
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="the export needs fork"
+)
+@pytest.mark.parametrize("exporter", ["dot", "jsonl", "graphml"])
+def test_workers_match_sequential(fomo3d: str, tmp_path: Path, exporter: str) -> None:
+    cfg = CFG(fomo3d)
+    os.makedirs(tmp_path / "sequential")
+    os.makedirs(tmp_path / "parallel")
+    sequential = export_cfg(cfg, str(tmp_path / "sequential" / "fomo3d_"), exporter=exporter)
+    parallel = export_cfg(cfg, str(tmp_path / "parallel" / "fomo3d_"), exporter=exporter, workers=2)
+    assert len(parallel) == len(cfg.functions) + 1
+    assert [os.path.basename(path) for path in parallel] == [
+        os.path.basename(path) for path in sequential
+    ]
+    for sequential_path, parallel_path in zip(sequential, parallel):
+        assert Path(parallel_path).read_bytes() == Path(sequential_path).read_bytes()
+
+
+def test_expected_fomo3d_output(
+    monkeypatch: pytest.MonkeyPatch, fomo3d: str, tmp_path: Path
+) -> None:
+    """
+    The CFGs of fomo3d are the expected ones (tests/expected-fomo3d-output)
+    """
+    monkeypatch.setattr(cfg_module, "known_hashes", FOMO3D_SIGNATURES)
+    paths = export_cfg(CFG(fomo3d), str(tmp_path / "fomo3d.evm_"))
+    assert sorted(os.path.basename(path) for path in paths) == sorted(os.listdir(EXPECTED_FOMO3D))
+    for path in paths:
+        expected = Path(EXPECTED_FOMO3D, os.path.basename(path)).read_text(encoding="utf-8")
+        assert Path(path).read_text(encoding="utf-8") == expected, os.path.basename(path)
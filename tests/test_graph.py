@@ -0,0 +1,113 @@
+"""
+Dominators, post-dominators and natural loops of hand-built graphs
+"""
+from typing import Dict, List, cast
+
+from evm_cfg_builder.cfg.basic_block import BasicBlock
+from evm_cfg_builder.cfg.graph import FunctionGraph
+
+KEY = 1
+
+
+# pylint: disable=too-few-public-methods
+class Node:
+    """Stand-in for a basic block: the graph only queries the outgoing edges and the address"""
+
+    def __init__(self, start_pc: int) -> None:
+        self.start_pc = start_pc
+        self.sons: List["Node"] = []
+
+    def __repr__(self) -> str:
+        return f"bb{self.start_pc}"
+
+    def outgoing_basic_blocks(self, key: int) -> List["Node"]:
+        assert key == KEY
+        return self.sons
+
+
+def build(edges: Dict[int, List[int]]) -> Dict[int, BasicBlock]:
+    """
+    Build the nodes of the graph, numbered by their address
+    """
+    nodes: Dict[int, Node] = {}
+    for src, dsts in edges.items():
+        for pc in [src] + dsts:
+            nodes.setdefault(pc, Node(pc))
+    for src, dsts in edges.items():
+        nodes[src].sons = [nodes[dst] for dst in dsts]
+    return {pc: cast(BasicBlock, node) for pc, node in nodes.items()}
+
+
+def graph_of(bbs: Dict[int, BasicBlock]) -> FunctionGraph:
+    return FunctionGraph(bbs[0], list(bbs.values()), KEY)
+
+
+def pcs(bbs: List[BasicBlock]) -> List[int]:
+    return [bb.start_pc for bb in bbs]
+
+
+def test_diamond() -> None:
+    # 0 -> 1 | 2 -> 3
+    bbs = build({0: [1, 2], 1: [3], 2: [3], 3: []})
+    graph = graph_of(bbs)
+
+    assert pcs(graph.dominators(bbs[3])) == [0, 3]
+    assert graph.immediate_dominator(bbs[3]) is bbs[0]
+    assert graph.immediate_dominator(bbs[0]) is None
+    assert not graph.dominates(bbs[1], bbs[3])
+
+    assert pcs(graph.post_dominators(bbs[0])) == [0, 3]
+    assert graph.immediate_post_dominator(bbs[1]) is bbs[3]
+    assert graph.immediate_post_dominator(bbs[3]) is None
+
+    assert pcs(graph.reachable(bbs[1])) == [1, 3]
+    assert not graph.is_reachable(bbs[1], bbs[2])
+    assert not graph.loops
+
+
+def test_nested_loops() -> None:
+    # 0 -> 1 (outer header) -> 2 (inner header) -> 3 -> 2, 3 -> 4 -> 1, 1 -> 5
+    bbs = build({0: [1], 1: [2, 5], 2: [3], 3: [2, 4], 4: [1], 5: []})
+    graph = graph_of(bbs)
+
+    assert pcs(graph.loop_headers()) == [1, 2]
+    outer, inner = graph.loops
+    assert pcs(outer.basic_blocks) == [1, 2, 3, 4]
+    assert pcs(outer.back_edges) == [4]
+    assert pcs(inner.basic_blocks) == [2, 3]
+    assert pcs(inner.back_edges) == [3]
+
+    assert pcs(graph.dominators(bbs[4])) == [0, 1, 2, 3, 4]
+    assert graph.immediate_dominator(bbs[5]) is bbs[1]
+    # The inner loop is only left through 4
+    assert pcs(graph.post_dominators(bbs[2])) == [1, 2, 3, 4, 5]
+    assert graph.immediate_post_dominator(bbs[2]) is bbs[3]
+    assert graph.immediate_post_dominator(bbs[4]) is bbs[1]
+    assert graph.is_reachable(bbs[4], bbs[3])
+
+
+def test_two_exits() -> None:
+    # 0 -> 1 -> 2 (exit), 0 -> 3 (exit), 1 -> 4 -> 4 (never exits)
+    bbs = build({0: [1, 3], 1: [2, 4], 2: [], 3: [], 4: [4]})
+    graph = graph_of(bbs)
+
+    # Both exits are roots of the post-dominators
+    assert pcs(graph.post_dominators(bbs[2])) == [2]
+    assert pcs(graph.post_dominators(bbs[3])) == [3]
+    assert pcs(graph.post_dominators(bbs[1])) == [1, 2]
+    # No common post-dominator of the two exits
+    assert pcs(graph.post_dominators(bbs[0])) == [0]
+    assert graph.immediate_post_dominator(bbs[0]) is None
+    # A basic block not reaching an exit is only post-dominated by itself
+    assert pcs(graph.post_dominators(bbs[4])) == [4]
+
+    assert pcs(graph.dominators(bbs[4])) == [0, 1, 4]
+    assert [pcs(loop.basic_blocks) for loop in graph.loops] == [[4]]
+
+
+def test_unreachable_from_entry() -> None:
+    bbs = build({0: [1], 1: [], 2: [1]})
+    graph = graph_of(bbs)
+    assert pcs(graph.dominators(bbs[2])) == [2]
+    assert pcs(graph.dominators(bbs[1])) == [0, 1]
+    assert pcs(graph.reachable(bbs[0])) == [0, 1]
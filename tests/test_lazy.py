@@ -0,0 +1,42 @@
+"""
+CFGs computed on demand (compute_cfgs=False): reading the results does not analyze the functions
+"""
+import os
+from pathlib import Path
+from typing import List
+
+from evm_cfg_builder.batch import _cfg_to_json
+from evm_cfg_builder.cfg.cfg import CFG
+from evm_cfg_builder.cfg.export import export_cfg
+
+
+def test_read_only_paths(fomo3d: str, analyses: List[int], tmp_path: Path) -> None:
+    cfg = CFG(fomo3d, compute_cfgs=False)
+    assert all(str(function).endswith(", 0 #bbs ") for function in cfg.functions)
+    output = _cfg_to_json(cfg)
+    assert all(function["basic_blocks"] == 0 for function in output["functions"])
+    paths = export_cfg(cfg, os.path.join(tmp_path, "fomo3d_"))
+    assert [os.path.basename(path) for path in paths] == ["fomo3d_-FULL_GRAPH.dot"]
+    assert not analyses
+
+
+def test_query_analyzes_one_function(fomo3d: str, analyses: List[int]) -> None:
+    cfg = CFG(fomo3d, compute_cfgs=False)
+    function = cfg.get_function_by_key(0x70A08231)
+    assert function is not None
+    assert function.basic_blocks
+    assert analyses == [function.key]
+    assert str(function) == f"{function.name}, {len(function.basic_blocks)} #bbs , view"
+
+
+def test_functions_reaching_analyzes_all(fomo3d: str, analyses: List[int]) -> None:
+    eager = CFG(fomo3d)
+    analyses.clear()
+    cfg = CFG(fomo3d, compute_cfgs=False)
+    assert not analyses
+
+    for bb, eager_bb in zip(cfg.basic_blocks, eager.basic_blocks):
+        assert [function.key for function in cfg.get_functions_reaching(bb)] == [
+            function.key for function in eager.get_functions_reaching(eager_bb)
+        ]
+    assert sorted(analyses) == sorted(function.key for function in cfg.functions)
@@ -0,0 +1,31 @@
+"""
+Lookups of the basic block covering an address, and of the functions reaching a basic block
+"""
+from evm_cfg_builder.cfg.cfg import CFG
+
+
+def test_get_basic_block_at(fomo3d: str) -> None:
+    cfg = CFG(fomo3d, compute_cfgs=False)
+    store = cfg.instruction_store
+    for bb in cfg.basic_blocks:
+        assert cfg.get_basic_block_at(bb.start_pc) is bb
+        assert cfg.get_basic_block_at(bb.end_pc) is bb
+        # Every address covered by the block, including the operands of the PUSHs
+        for pc in range(bb.start_pc, bb.end_pc + 1):
+            assert cfg.get_basic_block_at(pc) is bb
+    last = cfg.basic_blocks[-1]
+    assert cfg.get_basic_block_at(store.code_end - 1) is last
+    assert cfg.get_basic_block_at(store.code_end) is None
+    assert cfg.get_basic_block_at(store.code_end + 100) is None
+    assert cfg.get_basic_block_at(-1) is None
+
+
+def test_get_functions_reaching(fomo3d: str) -> None:
+    cfg = CFG(fomo3d)
+    reached = 0
+    for bb in cfg.basic_blocks:
+        functions = cfg.get_functions_reaching(bb)
+        assert [function.key for function in functions] == bb.reacheable
+        assert all(cfg.get_function_by_key(function.key) is function for function in functions)
+        reached += bool(functions)
+    assert reached
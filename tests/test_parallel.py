@@ -0,0 +1,23 @@
+"""
+Analysis of the functions in a pool of processes
+"""
+from typing import Any, Callable, Dict, List
+
+from evm_cfg_builder.cfg.cfg import CFG
+from evm_cfg_builder.cfg.function import Function
+
+
+def test_workers_match_sequential(
+    fomo3d: str, analyses: List[int], results: Callable[[CFG], Dict[int, Any]]
+) -> None:
+    sequential = CFG(fomo3d)
+    analyses.clear()
+    parallel = CFG(fomo3d, workers=2)
+    # Only the dispatcher is analyzed in the current process
+    assert analyses == [Function.DISPATCHER_ID]
+
+    assert all(function.cfg_computed for function in parallel.functions)
+    assert results(parallel) == results(sequential)
+    assert sorted(bb.start_pc for bb in parallel.basic_blocks) == sorted(
+        bb.start_pc for bb in sequential.basic_blocks
+    )
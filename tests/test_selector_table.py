@@ -0,0 +1,107 @@
+"""
+Selector table: binary format, lookups and overlay
+"""
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from evm_cfg_builder.known_hashes.selector_table import SelectorTable, write_selector_table
+
+SIGNATURES = {
+    0x00000000: "lowest()",
+    0x06FDDE03: "name()",
+    0x18160DDD: "totalSupply()",
+    0x70A08231: "balanceOf(address)",
+    0xA9059CBB: "transfer(address,uint256)",
+    0xFFFFFFFF: "highest(string)",
+}
+
+
+@pytest.fixture(name="table_path")
+def fixture_table_path(tmp_path: Path) -> str:
+    path = str(tmp_path / "selectors.bin")
+    write_selector_table(path, SIGNATURES)
+    return path
+
+
+def test_round_trip(table_path: str) -> None:
+    table = SelectorTable(table_path)
+    assert len(table) == len(SIGNATURES)
+    assert dict(table.items()) == SIGNATURES
+    assert list(table) == sorted(SIGNATURES)
+    assert not (Path(table_path).parent / "selectors.bin.tmp").exists()
+
+
+def test_lookups(table_path: str) -> None:
+    table = SelectorTable(table_path)
+    for key, signature in SIGNATURES.items():
+        assert key in table
+        assert table[key] == signature
+        assert table.get(key) == signature
+    # Lowest and highest keys
+    assert table[0x00000000] == "lowest()"
+    assert table[0xFFFFFFFF] == "highest(string)"
+
+    for key in (0x00000001, 0x70A08230, 0x70A08232, 0xFFFFFFFE, -1, 0x100000000):
+        assert key not in table
+        assert table.get(key) is None
+        assert table.get(key, "default") == "default"
+        with pytest.raises(KeyError):
+            _ = table[key]
+    assert "name()" not in table
+
+
+def test_overlay(table_path: str) -> None:
+    table = SelectorTable(table_path)
+    table[0x70A08231] = "balanceOf(address,bool)"
+    table[0x12345678] = "added()"
+    assert table[0x70A08231] == "balanceOf(address,bool)"
+    assert table[0x12345678] == "added()"
+    assert 0x12345678 in table
+    assert len(table) == len(SIGNATURES) + 1
+
+    items = list(table.items())
+    # The overlay first
+    assert items[:2] == [(0x70A08231, "balanceOf(address,bool)"), (0x12345678, "added()")]
+    assert dict(items) == {
+        **SIGNATURES,
+        0x70A08231: "balanceOf(address,bool)",
+        0x12345678: "added()",
+    }
+    assert len(items) == len(table)
+
+
+def _truncate(path: str, size: int) -> None:
+    with open(path, "r+b") as f:
+        f.truncate(size)
+
+
+def _bad_magic(path: str) -> None:
+    with open(path, "r+b") as f:
+        f.write(b"EVMSEL00")
+
+
+@pytest.mark.parametrize(
+    "corrupt",
+    [
+        lambda path: Path(path).unlink(),
+        lambda path: _truncate(path, 4),
+        lambda path: _truncate(path, 20),
+        lambda path: _truncate(path, Path(path).stat().st_size - 1),
+        _bad_magic,
+    ],
+    ids=["missing", "no-header", "no-keys", "no-blob", "magic"],
+)
+def test_invalid_file(table_path: str, corrupt: Callable[[str], None]) -> None:
+    corrupt(table_path)
+    table = SelectorTable(table_path)
+    assert len(table) == 0
+    assert 0x70A08231 not in table
+    assert table.get(0x70A08231) is None
+    assert not list(table.items())
+
+    # The overlay still works
+    table[0x70A08231] = "balanceOf(address)"
+    assert table[0x70A08231] == "balanceOf(address)"
+    assert len(table) == 1
@@ -0,0 +1,73 @@
+"""
+Timers of the phases, callback, and counters of the value-set analysis
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from evm_cfg_builder.cfg.cfg import CFG
+from evm_cfg_builder.cfg.function import Function
+from evm_cfg_builder.cfg.stats import stats_report
+
+
+def _analyze(bytecode: str, workers: int) -> Tuple[CFG, List[Tuple[str, Optional[int]]]]:
+    calls: List[Tuple[str, Optional[int]]] = []
+
+    def callback(phase: str, function: Optional[Function], elapsed: float) -> None:
+        assert elapsed >= 0
+        calls.append((phase, function.key if function is not None else None))
+
+    return CFG(bytecode, workers=workers, stats_callback=callback), calls
+
+
+def _counters(report: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: value for name, value in report.items() if name != "time"}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_callback(fomo3d: str, workers: int) -> None:
+    cfg, calls = _analyze(fomo3d, workers)
+    # One call per phase, and one per function for the value-set analysis
+    assert calls[:3] == [("convert", None), ("basic_blocks", None), ("functions", None)]
+    assert all(phase == "vsa" and key is not None for phase, key in calls[3:])
+    assert sorted(key for _, key in calls[3:] if key is not None) == sorted(
+        f.key for f in cfg.functions
+    )
+    # The dispatcher is analyzed last
+    assert calls[-1] == ("vsa", Function.DISPATCHER_ID)
+
+    phases = cfg.stats.phases
+    assert sorted(phases) == ["basic_blocks", "convert", "functions", "vsa"]
+    assert phases["vsa"] == pytest.approx(sum(f.stats.time for f in cfg.functions if f.stats))
+
+
+def test_report(fomo3d: str) -> None:
+    cfg, _ = _analyze(fomo3d, 1)
+    report = stats_report(cfg)
+    json.dumps(report)
+    assert len(report["functions"]) == len(cfg.functions)
+    for function_report in report["functions"]:
+        stats = function_report["stats"]
+        assert stats["transfers"] > 0
+        assert stats["explorations"] > 0
+        assert stats["peak_stack_depth"] > 0
+        assert function_report["incomplete"] is None
+
+    total = report["total"]
+    for name in ("transfers", "explorations", "edges_found", "merges", "summaries"):
+        assert total[name] == sum(f["stats"][name] for f in report["functions"])
+    assert total["peak_stack_depth"] == max(
+        f["stats"]["peak_stack_depth"] for f in report["functions"]
+    )
+
+
+def test_workers_totals_match_sequential(fomo3d: str) -> None:
+    sequential, _ = _analyze(fomo3d, 1)
+    parallel, _ = _analyze(fomo3d, 2)
+    sequential_report = stats_report(sequential)
+    parallel_report = stats_report(parallel)
+    assert _counters(parallel_report["total"]) == _counters(sequential_report["total"])
+    assert {f["hash_id"]: _counters(f["stats"]) for f in parallel_report["functions"]} == {
+        f["hash_id"]: _counters(f["stats"]) for f in sequential_report["functions"]
+    }
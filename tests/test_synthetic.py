@@ -0,0 +1,64 @@
+"""
+Comparison of the CFGs recovered with the ground truth of synthetic contracts
+"""
+import pytest
+
+from evm_cfg_builder.cfg.cfg import CFG
+from evm_cfg_builder.synthetic import SyntheticParameters, compare_to_cfg, generate
+from evm_cfg_builder.value_analysis.value_set_analysis import StackValueAnalysis
+
+PARAMETERS = [
+    SyntheticParameters(selectors=8, call_depth=3, fan_in=2, call_sites=2, loop_nesting=2),
+    SyntheticParameters(selectors=12, call_depth=3, fan_in=3, call_sites=2, loop_nesting=3, seed=1),
+    SyntheticParameters(selectors=3, call_depth=2, fan_in=3, call_sites=2, loop_nesting=1),
+]
+
+# The subroutines are shared by several callers, and called several times by each caller
+SHARED_SUBROUTINES = [
+    SyntheticParameters(selectors=4, call_depth=2, fan_in=2, call_sites=2),
+    SyntheticParameters(selectors=12, call_depth=4, fan_in=3, call_sites=3, seed=2),
+    SyntheticParameters(selectors=8, call_depth=3, fan_in=2, call_sites=2, loop_nesting=2),
+]
+
+
+@pytest.mark.parametrize("parameters", PARAMETERS)
+def test_exploration_without_summaries(
+    monkeypatch: pytest.MonkeyPatch, parameters: SyntheticParameters
+) -> None:
+    """
+    The subroutines are explored at each call site: the widening at their entry must keep
+    the return addresses
+    """
+    monkeypatch.setattr(StackValueAnalysis, "_summary", lambda self, bb: None)
+    contract = generate(parameters)
+    differences = compare_to_cfg(contract, CFG(contract.bytecode))
+    assert not differences
+
+
+@pytest.mark.parametrize("parameters", SHARED_SUBROUTINES)
+def test_summaries_match_exploration(
+    monkeypatch: pytest.MonkeyPatch, parameters: SyntheticParameters
+) -> None:
+    """
+    The summaries of the subroutines and their exploration at each call site find the CFG
+    of the ground truth
+    """
+    contract = generate(parameters)
+    cfg = CFG(contract.bytecode)
+    assert cfg.subroutines.summaries
+    summarized = compare_to_cfg(contract, cfg)
+
+    monkeypatch.setattr(StackValueAnalysis, "_summary", lambda self, bb: None)
+    explored = compare_to_cfg(contract, CFG(contract.bytecode))
+    assert not summarized
+    assert not explored
+
+
+def test_deep_call_chain() -> None:
+    """
+    The summaries of a long chain of internal calls are built without recursion
+    """
+    contract = generate(SyntheticParameters(selectors=2, call_depth=400))
+    cfg = CFG(contract.bytecode)
+    assert len(cfg.subroutines.summaries) == 800
+    assert not compare_to_cfg(contract, cfg)